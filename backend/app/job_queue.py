@@ -0,0 +1,227 @@
+# backend/app/job_queue.py
+from __future__ import annotations
+
+import heapq
+import itertools
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class QueuedJob:
+    """
+    落盘的排队记录（runtime/jobs/<job_id>.json），job 执行结束后删除。
+    服务重启时残留的记录 = 尚未跑完的 job（排队中或运行到一半），重新入队。
+    """
+    job_id: str
+    priority: int
+    seq: int
+    enqueued_at: float
+
+    def sort_key(self) -> Tuple[int, int]:
+        # priority 大的先跑；同优先级按入队顺序（FIFO）
+        return (-self.priority, self.seq)
+
+
+class JobQueue:
+    """
+    有界的批量任务调度：固定数量的 worker 线程按 (priority, FIFO) 取 job 执行。
+    runner(job_id) 负责实际执行和写 job state；异常只影响该 job。
+    """
+
+    def __init__(self, jobs_dir: Path, runner: Callable[[str], None], workers: int = 1):
+        self.jobs_dir = jobs_dir
+        self.runner = runner
+        self.workers = max(1, int(workers))
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[Tuple[int, int], QueuedJob]] = []
+        self._running: Dict[str, QueuedJob] = {}
+        self._seq = itertools.count()
+        self._threads: List[threading.Thread] = []
+
+    def _entry_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _persist(self, job: QueuedJob) -> None:
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        p = self._entry_path(job.job_id)
+        tmp = p.with_suffix(".tmp")
+        tmp.write_text(json.dumps(asdict(job), ensure_ascii=False), encoding="utf-8")
+        tmp.replace(p)
+
+    def _forget(self, job_id: str) -> None:
+        try:
+            self._entry_path(job_id).unlink()
+        except FileNotFoundError:
+            pass
+
+    def recover(self) -> List[str]:
+        """
+        读取上次残留的排队记录并按原顺序入队（start 之前调用）。
+        返回恢复的 job_id 列表，调用方据此把 job state 重置为 queued。
+        """
+        found: List[QueuedJob] = []
+        if self.jobs_dir.exists():
+            for p in self.jobs_dir.glob("*.json"):
+                try:
+                    raw = json.loads(p.read_text(encoding="utf-8"))
+                    found.append(
+                        QueuedJob(
+                            job_id=str(raw["job_id"]),
+                            priority=int(raw.get("priority") or 0),
+                            seq=int(raw.get("seq") or 0),
+                            enqueued_at=float(raw.get("enqueued_at") or 0.0),
+                        )
+                    )
+                except Exception:  # noqa: BLE001
+                    continue  # 损坏的记录直接忽略
+
+        found.sort(key=QueuedJob.sort_key)
+        with self._cond:
+            for job in found:
+                heapq.heappush(self._heap, (job.sort_key(), job))
+            next_seq = max((j.seq for j in found), default=-1) + 1
+            self._seq = itertools.count(next_seq)
+            self._cond.notify_all()
+        return [j.job_id for j in found]
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        for n in range(self.workers):
+            t = threading.Thread(target=self._worker, daemon=True, name=f"batch-worker-{n}")
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, job_id: str, priority: int = 0) -> int:
+        """入队并落盘；返回当前排队位置（1 = 下一个执行）。"""
+        with self._cond:
+            job = QueuedJob(job_id=job_id, priority=int(priority), seq=next(self._seq), enqueued_at=time.time())
+            self._persist(job)
+            heapq.heappush(self._heap, (job.sort_key(), job))
+            self._cond.notify()
+            return self._position_locked(job_id) or 0
+
+    def _position_locked(self, job_id: str) -> Optional[int]:
+        for i, (_, job) in enumerate(sorted(self._heap, key=lambda x: x[0]), start=1):
+            if job.job_id == job_id:
+                return i
+        return None
+
+    def position(self, job_id: str) -> Optional[int]:
+        """排队位置（1 起）；正在执行或不在队列中返回 None。"""
+        with self._cond:
+            return self._position_locked(job_id)
+
+    def is_running(self, job_id: str) -> bool:
+        with self._cond:
+            return job_id in self._running
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "queued": len(self._heap),
+                "running": len(self._running),
+                "running_jobs": sorted(self._running),
+            }
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, job = heapq.heappop(self._heap)
+                self._running[job.job_id] = job
+            try:
+                self.runner(job.job_id)
+            except Exception:  # noqa: BLE001
+                pass  # runner 自己负责把失败写进 job state；这里只保证 worker 不退出
+            finally:
+                with self._cond:
+                    self._running.pop(job.job_id, None)
+                self._forget(job.job_id)
+
+
+class JobStateStore:
+    """
+    job state 的内存登记表：/api/jobs 直接读内存，落盘做合并节流。
+      - write(..., flush=False)：只更新内存；距上次落盘超过 flush_interval_ms 或累计 flush_every 次更新才写文件
+      - write(..., flush=True)：立即落盘（状态切换 / 结束时用）
+    结束态（done / failed）落盘后从内存移除，之后按需从文件读取。
+    序列化与写文件不占 _lock（read() / SSE 轮询不等磁盘 I/O）；同一 job 的写盘按 _io_locks 串行，
+    按序号丢弃已被更新版本覆盖的旧快照。
+    """
+
+    _FINAL_STATUSES = ("done", "failed")
+
+    def __init__(
+        self,
+        path_for: Callable[[str], Path],
+        flush_interval_ms: int = 1000,
+        flush_every: int = 500,
+    ):
+        self.path_for = path_for
+        self.flush_interval = max(0, int(flush_interval_ms)) / 1000.0
+        self.flush_every = max(1, int(flush_every))
+        self._lock = threading.Lock()
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, int] = {}
+        self._flushed_at: Dict[str, float] = {}
+        self._flush_seq: Dict[str, int] = {}
+        self._written_seq: Dict[str, int] = {}
+        self._io_locks: Dict[str, threading.Lock] = {}
+
+    def _flush(self, job_id: str, state: Dict[str, Any]) -> None:
+        p = self.path_for(job_id)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(p)
+
+    def write(self, job_id: str, state: Dict[str, Any], *, flush: bool = True) -> None:
+        snap = dict(state)
+        now = time.monotonic()
+        with self._lock:
+            self._states[job_id] = snap
+            pending = self._pending.get(job_id, 0) + 1
+            due = (
+                flush
+                or pending >= self.flush_every
+                or now - self._flushed_at.get(job_id, 0.0) >= self.flush_interval
+            )
+            if not due:
+                self._pending[job_id] = pending
+                return
+            self._pending[job_id] = 0
+            self._flushed_at[job_id] = now
+            seq = self._flush_seq[job_id] = self._flush_seq.get(job_id, 0) + 1
+            io_lock = self._io_locks.setdefault(job_id, threading.Lock())
+
+        with io_lock:
+            if seq > self._written_seq.get(job_id, 0):
+                self._flush(job_id, snap)
+                self._written_seq[job_id] = seq
+
+        if str(snap.get("status") or "") in self._FINAL_STATUSES:
+            with self._lock:
+                # 文件已是结束态后才从内存移除，read() 不会读到更旧的文件；
+                # 序号保留，仍在排队写盘的旧快照据此跳过
+                if self._states.get(job_id) is snap:
+                    for d in (self._states, self._pending, self._flushed_at, self._io_locks):
+                        d.pop(job_id, None)
+
+    def read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """返回 state 的浅拷贝；内存和文件都没有时返回 None。"""
+        with self._lock:
+            snap = self._states.get(job_id)
+            if snap is not None:
+                return dict(snap)
+        p = self.path_for(job_id)
+        if not p.exists():
+            return None
+        return json.loads(p.read_text(encoding="utf-8"))
@@ -1,39 +1,83 @@
 # backend/app/main.py
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import copy
 import json
 import math
+import multiprocessing
 import os
-import re
 import shutil
 import threading
+import time
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set, Tuple
-from collections import Counter, defaultdict
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from fastapi import Body, FastAPI, File, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import Body, FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
+from backend.app.job_queue import JobQueue, JobStateStore
 from backend.engine.engine import EngineConfig, PricingEngine
 from backend.engine.core import pricing_engine as pricing_engine_mod
-from backend.engine.core import pricing_rules as pricing_rules_mod
 from backend.engine.core.formatter import build_export_frames, write_export_xlsx
-from backend.engine.core.loader import normalize_pn_raw, parse_pn_list_file
+from backend.engine.core.keyword_index import build_keyword_candidate_index
+from backend.engine.core import metrics as metrics_mod
+from backend.engine.core.rule_set import RuleSet, thaw
+from backend.engine.core.loader import DataBundle, normalize_pn_raw, parse_pn_list_file
+from backend.engine.core.search_index import (
+    ExternalModelIndex,
+    build_external_model_index,
+    build_model_search_index,
+    normalize_model_text,
+)
 
 
 APP_ROOT = Path(__file__).resolve().parents[2]  # .../backend
 REPO_ROOT = APP_ROOT.parent  # repo root
 RUNTIME_DIR = Path(os.getenv("DAHUA_PRICING_RUNTIME_DIR", "/data/dahua_pricing_runtime"))
+# 1/true/yes：启用整表预计算价格簿（见 PricingEngine.price_book）
+PRICE_BOOK_ENABLED = os.getenv("DAHUA_PRICING_PRICE_BOOK", "").strip().lower() in ("1", "true", "yes", "on")
+# query_one 结果 LRU：最多缓存条数 / 内存上限（MB）；任一设为 0 关闭
+QUERY_CACHE_SIZE = int(os.getenv("DAHUA_PRICING_QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_MAX_MB = int(os.getenv("DAHUA_PRICING_QUERY_CACHE_MB", "64"))
+# 轮询 runtime/data、runtime/mapping 的间隔（秒），文件变化后自动后台 reload；0 关闭（仍可 POST /api/admin/reload-data）
+DATA_WATCH_SECONDS = float(os.getenv("DAHUA_PRICING_DATA_WATCH_SECONDS", "0"))
+# 0/false：reload 时总是整份重建；默认与当前数据逐行对比，只重算变化的行并只失效受影响 PN 的缓存
+DELTA_RELOAD_ENABLED = os.getenv("DAHUA_PRICING_DELTA_RELOAD", "1").strip().lower() not in ("0", "false", "no", "off")
+# 冷启动（无快照）时 FrancePrice / SysPrice 并行解析的进程数；1 为顺序解析（需要 fork）
+LOAD_WORKERS = max(1, int(os.getenv("DAHUA_PRICING_LOAD_WORKERS", str(min(2, os.cpu_count() or 1)))))
+BATCH_COMPUTE_CHUNK = max(1, int(os.getenv("DAHUA_PRICING_BATCH_CHUNK", "2000")))
+# 大批量分片多进程：PN 数 >= BATCH_SHARD_MIN_PNS 时启用（<=0 关闭；需要 fork，Linux 部署默认可用）
+BATCH_SHARD_MIN_PNS = int(os.getenv("DAHUA_PRICING_BATCH_SHARD_MIN", "20000"))
+BATCH_SHARD_SIZE = max(1, int(os.getenv("DAHUA_PRICING_BATCH_SHARD_SIZE", "2000")))
+BATCH_SHARD_WORKERS = max(1, int(os.getenv("DAHUA_PRICING_BATCH_WORKERS", str(os.cpu_count() or 1))))
+# 同时执行的批量 job 数；其余按优先级 + FIFO 排队（持久化在 runtime/jobs）
+BATCH_JOB_WORKERS = max(1, int(os.getenv("DAHUA_PRICING_JOB_WORKERS", "2")))
+# job 进度落盘节流：至多每 N 毫秒或每 N 次进度更新写一次 state.json（状态切换 / 结束时立即写）
+JOB_STATE_FLUSH_MS = int(os.getenv("DAHUA_PRICING_STATE_FLUSH_MS", "1000"))
+JOB_STATE_FLUSH_ITEMS = int(os.getenv("DAHUA_PRICING_STATE_FLUSH_ITEMS", "500"))
+# /api/jobs/{job_id}/events：检查内存进度的间隔与心跳间隔（秒）
+JOB_EVENTS_POLL_SECONDS = 0.25
+JOB_EVENTS_HEARTBEAT_SECONDS = 15.0
+# 启动后数据加载完成前，查询类接口返回 503 时建议的重试间隔（秒，Retry-After）
+NOT_READY_RETRY_AFTER_SECONDS = 5
+# 启动时恢复 / 加载期间入队的 job 最多等首份数据这么久（秒），超时或加载失败则 job 失败
+JOB_WAIT_READY_SECONDS = float(os.getenv("DAHUA_PRICING_JOB_WAIT_READY_SECONDS", "600"))
+# KEYWORD Preview base 侧 FOB 的缓存条数（按 数据 + rules_generation + 关键词）
+KEYWORD_PREVIEW_CACHE_SIZE = 16
 UPLOADS_DIR = RUNTIME_DIR / "uploads"
 OUTPUTS_DIR = RUNTIME_DIR / "outputs"
 LOGS_DIR = RUNTIME_DIR / "logs"
 DATA_DIR = RUNTIME_DIR / "data"
 ADMIN_DIR = RUNTIME_DIR / "admin"
 MAPPING_DIR = RUNTIME_DIR / "mapping"
+JOBS_DIR = RUNTIME_DIR / "jobs"
 
 OUT_COUNTRY = "Country_import_upload_Model.xlsx"
 OUT_COUNTRY_CUSTOMER = "Country&Customer_import_upload_Model.xlsx"  # backward-compat symbol only
@@ -50,7 +94,7 @@ def _utc_now_iso() -> str:
 
 
 def _ensure_dirs() -> None:
-    for d in (UPLOADS_DIR, OUTPUTS_DIR, DATA_DIR, ADMIN_DIR, MAPPING_DIR):
+    for d in (UPLOADS_DIR, OUTPUTS_DIR, DATA_DIR, ADMIN_DIR, MAPPING_DIR, JOBS_DIR):
         d.mkdir(parents=True, exist_ok=True)
 
 
@@ -67,19 +111,28 @@ def _state_path(job_id: str) -> Path:
     return (OUTPUTS_DIR / job_id) / STATE_NAME
 
 
+_job_states = JobStateStore(
+    _state_path,
+    flush_interval_ms=JOB_STATE_FLUSH_MS,
+    flush_every=JOB_STATE_FLUSH_ITEMS,
+)
+
+
 def _write_state(job_id: str, state: Dict[str, Any]) -> None:
-    p = _state_path(job_id)
-    p.parent.mkdir(parents=True, exist_ok=True)
-    tmp = p.with_suffix(".tmp")
-    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
-    tmp.replace(p)
+    """立即落盘（状态切换 / 结束）。"""
+    _job_states.write(job_id, state, flush=True)
+
+
+def _update_state(job_id: str, state: Dict[str, Any]) -> None:
+    """进度更新：只改内存，按 JOB_STATE_FLUSH_MS / JOB_STATE_FLUSH_ITEMS 合并落盘。"""
+    _job_states.write(job_id, state, flush=False)
 
 
 def _read_state(job_id: str) -> Dict[str, Any]:
-    p = _state_path(job_id)
-    if not p.exists():
+    state = _job_states.read(job_id)
+    if state is None:
         raise HTTPException(status_code=404, detail="job_id not found")
-    return json.loads(p.read_text(encoding="utf-8"))
+    return state
 
 
 def _read_json_file(path: Path) -> Any:
@@ -211,7 +264,7 @@ def _normalize_price_rules_payload(payload: Any) -> Dict[str, Dict[str, Dict[str
 
 
 def _sorted_uplift_dict() -> Dict[str, float]:
-    return dict(sorted(pricing_engine_mod.UPLIFT_PCT_BY_LINE.items(), key=lambda kv: kv[0]))
+    return dict(sorted(thaw(pricing_engine_mod.current_rules().uplift_pct_by_line).items(), key=lambda kv: kv[0]))
 
 
 def _sorted_keyword_uplift_rows() -> list[Dict[str, Any]]:
@@ -221,7 +274,7 @@ def _sorted_keyword_uplift_rows() -> list[Dict[str, Any]]:
             "pct": float(r.get("pct") or 0.0),
             "enabled": bool(r.get("enabled", True)),
         }
-        for r in (pricing_engine_mod.KEYWORD_UPLIFT_RULES or [])
+        for r in thaw(pricing_engine_mod.current_rules().keyword_uplift_rules)
         if isinstance(r, dict)
     ]
     rows = [r for r in rows if r["keyword"]]
@@ -232,34 +285,31 @@ def _sorted_keyword_uplift_rows() -> list[Dict[str, Any]]:
 def _sorted_ddp_rules_dict() -> Dict[str, list[float]]:
     return {
         k: [float(x) for x in v]
-        for k, v in sorted(pricing_rules_mod.DDP_RULES.items(), key=lambda kv: kv[0])
+        for k, v in sorted(pricing_engine_mod.current_rules().ddp_rules.items(), key=lambda kv: kv[0])
     }
 
 
 def _sorted_price_rules_dict() -> Dict[str, Any]:
-    return dict(sorted(_deep_jsonable(pricing_rules_mod.PRICE_RULES).items(), key=lambda kv: kv[0]))
+    return dict(sorted(_deep_jsonable(thaw(pricing_engine_mod.current_rules().price_rules)).items(), key=lambda kv: kv[0]))
 
 
 def _apply_rule_overrides_if_exist() -> None:
+    """读取 runtime/admin 下的规则覆盖文件，存在的几类一次性整版替换（一个新 generation）。"""
+    changes: Dict[str, Any] = {}
     if UPLIFT_CFG.exists():
-        data = _normalize_uplift_payload(_read_json_file(UPLIFT_CFG))
-        pricing_engine_mod.UPLIFT_PCT_BY_LINE.clear()
-        pricing_engine_mod.UPLIFT_PCT_BY_LINE.update(data)
+        changes["uplift_pct_by_line"] = _normalize_uplift_payload(_read_json_file(UPLIFT_CFG))
 
     if KEYWORD_UPLIFT_CFG.exists():
-        data = _normalize_keyword_uplift_payload(_read_json_file(KEYWORD_UPLIFT_CFG))
-        pricing_engine_mod.KEYWORD_UPLIFT_RULES.clear()
-        pricing_engine_mod.KEYWORD_UPLIFT_RULES.extend(data)
+        changes["keyword_uplift_rules"] = _normalize_keyword_uplift_payload(_read_json_file(KEYWORD_UPLIFT_CFG))
 
     if DDP_RULES_CFG.exists():
-        data = _normalize_ddp_rules_payload(_read_json_file(DDP_RULES_CFG))
-        pricing_rules_mod.DDP_RULES.clear()
-        pricing_rules_mod.DDP_RULES.update(data)
+        changes["ddp_rules"] = _normalize_ddp_rules_payload(_read_json_file(DDP_RULES_CFG))
 
     if PRICE_RULES_CFG.exists():
-        data = _normalize_price_rules_payload(_read_json_file(PRICE_RULES_CFG))
-        pricing_rules_mod.PRICE_RULES.clear()
-        pricing_rules_mod.PRICE_RULES.update(data)
+        changes["price_rules"] = _normalize_price_rules_payload(_read_json_file(PRICE_RULES_CFG))
+
+    if changes:
+        pricing_engine_mod.RULES.update(**changes)
 
 
 class QueryReq(BaseModel):
@@ -327,20 +377,21 @@ def _validate_query_overrides(
     if require_any and not force_category and not force_price_group:
         raise HTTPException(status_code=400, detail="force_category or force_price_group is required")
 
-    if force_category and force_category not in pricing_rules_mod.DDP_RULES:
+    rules = pricing_engine_mod.current_rules()
+    if force_category and force_category not in rules.ddp_rules:
         raise HTTPException(
             status_code=400,
             detail=f"force_category not found in DDP_RULES: {force_category!r}",
         )
 
-    if force_price_group and force_price_group not in pricing_rules_mod.PRICE_RULES:
+    if force_price_group and force_price_group not in rules.price_rules:
         raise HTTPException(
             status_code=400,
             detail=f"force_price_group not found in PRICE_RULES: {force_price_group!r}",
         )
 
     if force_series_key and force_price_group:
-        group_rules = pricing_rules_mod.PRICE_RULES.get(force_price_group) or {}
+        group_rules = rules.price_rules.get(force_price_group) or {}
         if force_series_key not in group_rules:
             raise HTTPException(
                 status_code=400,
@@ -385,11 +436,13 @@ def _validate_manual_recompute_inputs(
 
 def _build_category_price_groups() -> Dict[str, list[str]]:
     out: Dict[str, list[str]] = {}
-    if _engine is None or _engine.data is None:
+    data = _engine.data if _engine is not None else None
+    if data is None:
         return out
 
+    rules = pricing_engine_mod.current_rules()
     cnt: Dict[str, Counter[str]] = defaultdict(Counter)
-    for df in (_engine.data.map_fr, _engine.data.map_sys):
+    for df in (data.map_fr, data.map_sys):
         if df is None or df.empty:
             continue
         for _, row in df.iterrows():
@@ -397,43 +450,27 @@ def _build_category_price_groups() -> Dict[str, list[str]]:
             pg = _norm_optional_text(row.get("price_group_hint"))
             if not cat or not pg:
                 continue
-            if pg not in pricing_rules_mod.PRICE_RULES:
+            if pg not in rules.price_rules:
                 continue
             cnt[cat][pg] += 1
 
     for cat in sorted(cnt.keys()):
-        ranked = [k for k, _ in cnt[cat].most_common() if k in pricing_rules_mod.PRICE_RULES]
-        if cat in pricing_rules_mod.PRICE_RULES and cat in ranked:
+        ranked = [k for k, _ in cnt[cat].most_common() if k in rules.price_rules]
+        if cat in rules.price_rules and cat in ranked:
             ranked = [cat] + [x for x in ranked if x != cat]
-        elif cat in pricing_rules_mod.PRICE_RULES:
+        elif cat in rules.price_rules:
             ranked = [cat] + ranked
         out[cat] = ranked
 
-    for cat in sorted(pricing_rules_mod.DDP_RULES.keys()):
+    for cat in sorted(rules.ddp_rules.keys()):
         if cat in out:
             continue
-        if cat in pricing_rules_mod.PRICE_RULES:
+        if cat in rules.price_rules:
             out[cat] = [cat]
 
     return out
 
 
-def _pick_col(df: Any, candidates: tuple[str, ...]) -> Optional[str]:
-    if df is None:
-        return None
-    cols = [str(c) for c in getattr(df, "columns", [])]
-    if not cols:
-        return None
-    low_map = {str(c).strip().lower(): c for c in cols}
-    for c in candidates:
-        if c in cols:
-            return c
-        k = c.strip().lower()
-        if k in low_map:
-            return low_map[k]
-    return None
-
-
 def _to_float_soft(v: Any) -> Optional[float]:
     try:
         if v is None:
@@ -446,9 +483,9 @@ def _to_float_soft(v: Any) -> Optional[float]:
         return None
 
 
-def _collect_external_model_cluster_pns(pn: str) -> tuple[str, list[str]]:
-    assert _engine is not None and _engine.data is not None
-    base = _engine.query_one(pn)
+def _collect_external_model_cluster_pns(pn: str, data: DataBundle) -> tuple[str, list[str]]:
+    assert _engine is not None
+    base = _engine.query_one(pn, data=data)
     if str(base.get("status", "")).lower() != "ok":
         raise HTTPException(status_code=404, detail=f"pn not found: {pn}")
 
@@ -456,30 +493,8 @@ def _collect_external_model_cluster_pns(pn: str) -> tuple[str, list[str]]:
     if not ext_model:
         raise HTTPException(status_code=400, detail=f"external model is empty for pn: {pn}")
 
-    ext_up = ext_model.upper()
-    pns: list[str] = []
-    seen: set[str] = set()
-
-    for df in (_engine.data.france_df, _engine.data.sys_df):
-        pn_col = _pick_col(
-            df,
-            ("Part No.", "Part No", "Part Num", "PN", "P/N", "Part Number", "PartNumber"),
-        )
-        ext_col = _pick_col(df, ("External Model", "ExternalModel"))
-        if not pn_col or not ext_col:
-            continue
-        for _, row in df.iterrows():
-            em = _norm_optional_text(row.get(ext_col))
-            part = _norm_optional_text(row.get(pn_col))
-            if not em or not part:
-                continue
-            if em.upper() != ext_up:
-                continue
-            key = normalize_pn_raw(part)
-            if not key or key in seen:
-                continue
-            seen.add(key)
-            pns.append(part)
+    pns = _external_model_index(data).cluster_pns(ext_model)
+    seen = {normalize_pn_raw(p) for p in pns}
 
     input_key = normalize_pn_raw(pn)
     if input_key and input_key not in seen:
@@ -487,109 +502,22 @@ def _collect_external_model_cluster_pns(pn: str) -> tuple[str, list[str]]:
     return ext_model, pns
 
 
-def _normalize_model_match_text(v: Any) -> str:
-    s = str(v or "").strip().upper()
-    if not s:
-        return ""
-    return re.sub(r"[^A-Z0-9]+", "", s)
-
-
-def _score_model_match(query_norm: str, value: Any) -> tuple[int, str]:
-    target = _normalize_model_match_text(value)
-    if not query_norm or not target:
-        return 0, ""
-    if target == query_norm:
-        return 300, "exact"
-    if target.startswith(query_norm):
-        return 200, "prefix"
-    if query_norm in target:
-        return 100, "contains"
-    return 0, ""
-
-
-def _collect_model_search_candidates(
-    df: Any,
-    *,
-    source: str,
-    query_norm: str,
-    seen: Dict[str, Dict[str, Any]],
-) -> None:
-    if df is None or getattr(df, "empty", True):
-        return
-
-    pn_col = _pick_col(df, ("Part No.", "Part No", "Part Num", "PN", "P/N", "Part Number", "PartNumber"))
-    internal_col = _pick_col(df, ("Internal Model",))
-    external_col = _pick_col(df, ("External Model", "ExternalModel"))
-    if not pn_col or (not internal_col and not external_col):
-        return
-
-    for _, row in df.iterrows():
-        pn = _norm_optional_text(row.get(pn_col))
-        if not pn:
-            continue
-
-        matches: List[tuple[str, int, str, Optional[str]]] = []
-        for field_name, col_name in (("internal_model", internal_col), ("external_model", external_col)):
-            if not col_name:
-                continue
-            raw_val = _norm_optional_text(row.get(col_name))
-            score, match_type = _score_model_match(query_norm, raw_val)
-            if score > 0:
-                matches.append((field_name, score, match_type, raw_val))
-        if not matches:
-            continue
-
-        best_field, best_score, best_type, _raw_val = max(matches, key=lambda x: (x[1], x[0]))
-        _ = best_field
-        item = seen.get(pn)
-        if item is None:
-            item = {
-                "pn": pn,
-                "score": best_score,
-                "match_type": best_type,
-                "matched_fields": set(),
-                "sources": set(),
-                "internal_model_raw": None,
-                "external_model_raw": None,
-            }
-            seen[pn] = item
-        if best_score > int(item.get("score") or 0):
-            item["score"] = best_score
-            item["match_type"] = best_type
-
-        cast_fields: Set[str] = item["matched_fields"]
-        cast_sources: Set[str] = item["sources"]
-        cast_sources.add(source)
-        for field_name, _score, _match_type, raw_val in matches:
-            cast_fields.add(field_name)
-            key = "internal_model_raw" if field_name == "internal_model" else "external_model_raw"
-            if raw_val and not item.get(key):
-                item[key] = raw_val
-
-
 def _search_models(req: ModelSearchReq) -> Dict[str, Any]:
     assert _engine is not None and _engine.data is not None
+    data = _engine.data
     query = (req.query or "").strip()
     if not query:
         raise HTTPException(status_code=400, detail="query is empty")
 
-    query_norm = _normalize_model_match_text(query)
+    query_norm = normalize_model_text(query)
     if not query_norm:
         raise HTTPException(status_code=400, detail="query has no searchable characters")
 
-    seen: Dict[str, Dict[str, Any]] = {}
-    _collect_model_search_candidates(
-        _engine.data.france_df,
-        source="france",
-        query_norm=query_norm,
-        seen=seen,
-    )
-    _collect_model_search_candidates(
-        _engine.data.sys_df,
-        source="sys",
-        query_norm=query_norm,
-        seen=seen,
-    )
+    index = data.model_search
+    if index is None:
+        index = build_model_search_index([("france", data.france_df), ("sys", data.sys_df)])
+        data.model_search = index
+    seen = index.search(query_norm)
 
     ranked = sorted(
         seen.values(),
@@ -602,8 +530,9 @@ def _search_models(req: ModelSearchReq) -> Dict[str, Any]:
     )
 
     items: List[Dict[str, Any]] = []
-    for idx, matched in enumerate(ranked[: int(req.limit)], start=1):
-        row = _engine.query_one(str(matched.get("pn") or ""))
+    top = ranked[: int(req.limit)]
+    rows = _engine.query_many([str(matched.get("pn") or "") for matched in top], data=data)
+    for idx, (matched, row) in enumerate(zip(top, rows), start=1):
         review = _build_batch_review_item(idx, row)
         review["match_type"] = matched.get("match_type")
         review["match_score"] = matched.get("score")
@@ -623,39 +552,29 @@ def _search_models(req: ModelSearchReq) -> Dict[str, Any]:
     }
 
 
-def _pick_france_anchor_prices(external_model: str) -> tuple[Optional[str], Optional[Dict[str, float]]]:
-    assert _engine is not None and _engine.data is not None
-    df = _engine.data.france_df
-    pn_col = _pick_col(
-        df,
-        ("Part No.", "Part No", "Part Num", "PN", "P/N", "Part Number", "PartNumber"),
-    )
-    ext_col = _pick_col(df, ("External Model", "ExternalModel"))
-    if not pn_col or not ext_col:
-        return None, None
-
-    ext_up = str(external_model).strip().upper()
-    price_cols = list(pricing_engine_mod.PRICE_COLS)
-    for _, row in df.iterrows():
-        em = _norm_optional_text(row.get(ext_col))
-        if not em or em.upper() != ext_up:
-            continue
-        prices: Dict[str, float] = {}
-        ok = True
-        for c in price_cols:
-            f = _to_float_soft(row.get(c))
-            if f is None or f <= 0:
-                ok = False
-                break
-            prices[c] = f
-        if ok:
-            return _norm_optional_text(row.get(pn_col)), prices
-    return None, None
+def _external_model_index(data: DataBundle) -> ExternalModelIndex:
+    index = data.external_models
+    if index is None:
+        index = build_external_model_index(
+            data.france_df,
+            data.sys_df,
+            price_cols=pricing_engine_mod.PRICE_COLS,
+            pn_key=normalize_pn_raw,
+        )
+        data.external_models = index
+    return index
+
+
+def _pick_france_anchor_prices(
+    external_model: str, data: DataBundle
+) -> tuple[Optional[str], Optional[Dict[str, float]]]:
+    return _external_model_index(data).anchor(external_model)
 
 
 def _apply_external_model_anchor_to_row(
     row: Dict[str, Any],
     *,
+    data: DataBundle,
     apply_france_anchor: bool,
     anchor_cache: Optional[Dict[str, tuple[Optional[str], Optional[Dict[str, float]]]]] = None,
 ) -> bool:
@@ -684,7 +603,7 @@ def _apply_external_model_anchor_to_row(
     if anchor_cache is not None and key in anchor_cache:
         anchor = anchor_cache[key]
     else:
-        anchor = _pick_france_anchor_prices(ext_model)
+        anchor = _pick_france_anchor_prices(ext_model, data)
         if anchor_cache is not None:
             anchor_cache[key] = anchor
     anchor_pn, anchor_prices = anchor
@@ -721,8 +640,10 @@ def _query_cluster_by_external_model(
     *,
     apply_france_anchor: bool,
 ) -> Dict[str, Any]:
-    assert _engine is not None
-    external_model, pns = _collect_external_model_cluster_pns(pn)
+    assert _engine is not None and _engine.data is not None
+    # 整个聚类（基准 PN、同型号 PN、锚定价）用同一份数据
+    data = _engine.data
+    external_model, pns = _collect_external_model_cluster_pns(pn, data)
     if not pns:
         raise HTTPException(status_code=404, detail=f"no rows found for external model: {external_model}")
 
@@ -731,10 +652,10 @@ def _query_cluster_by_external_model(
     changed_pns: list[str] = []
     anchor_pn: Optional[str] = None
     anchor_applied = False
-    for item_pn in pns:
-        r = _engine.query_one(item_pn)
+    for item_pn, r in zip(pns, _engine.query_many(pns, data=data)):
         row_changed = _apply_external_model_anchor_to_row(
             r,
+            data=data,
             apply_france_anchor=apply_france_anchor,
             anchor_cache=anchor_cache,
         )
@@ -759,71 +680,55 @@ def _query_cluster_by_external_model(
     }
 
 
-def _pick_col(df, candidates: list[str]) -> str:
-    cols = list(df.columns)
-    low_map = {str(c).strip().lower(): c for c in cols}
-    for c in candidates:
-        if c in cols:
-            return c
-    for c in candidates:
-        cc = str(c).strip().lower()
-        if cc in low_map:
-            return low_map[cc]
-    return cols[0]
-
-
-def _keyword_matches_model_text(keyword: str, model_text: Any) -> bool:
-    kw = str(keyword or "").strip().upper()
-    if not kw:
-        return False
-    text = str(model_text or "").strip().upper()
-    if not text:
-        return False
+def _collect_keyword_candidate_pns(keyword: str, data: DataBundle) -> list[str]:
+    """Internal / External Model 型号段前缀命中 keyword 的 PN（France + Sys，升序）。"""
+    if data.keyword_candidates is None:
+        data.keyword_candidates = build_keyword_candidate_index(data.france_df, data.sys_df)
+    return data.keyword_candidates.candidate_pns(keyword)
 
-    for segment in re.split(r"[^A-Z0-9]+", text):
-        if not segment:
-            continue
-        if segment.startswith(kw):
-            return True
-        if segment.startswith(f"DHI{kw}") or segment.startswith(f"DH{kw}"):
-            return True
-    return False
 
+# key = (data.generation, rules_generation, keyword)；只存 FOB，不持有 DataBundle（reload 后旧数据可释放）
+_keyword_preview_base_cache: "OrderedDict[Tuple[int, int, str], Dict[str, Optional[float]]]" = OrderedDict()
+_keyword_preview_cache_lock = threading.Lock()
+_keyword_preview_cache_lookups = metrics_mod.Counter(
+    "dahua_pricing_keyword_preview_cache_lookups_total",
+    "KEYWORD Preview base-FOB cache lookups.",
+    ("result",),
+)
 
-def _row_matches_keyword_models(row: Any, keyword: str, fields: list[str]) -> bool:
-    for f in fields:
-        if f in row and _keyword_matches_model_text(keyword, row.get(f)):
-            return True
-    return False
 
+def _keyword_preview_base_fobs(
+    data: DataBundle,
+    generation: int,
+    kw_up: str,
+    candidate_pns: list[str],
+    base_rules: RuleSet,
+) -> Dict[str, Optional[float]]:
+    """
+    KEYWORD Preview 的 base 侧（去掉该关键词后的规则）FOB。
+    只依赖 (data.generation, rules_generation, keyword)，同一关键词换 pct 反复预览时直接复用。
+    """
+    key = (data.generation, generation, kw_up)
+    with _keyword_preview_cache_lock:
+        hit = _keyword_preview_base_cache.get(key)
+        if hit is not None:
+            _keyword_preview_base_cache.move_to_end(key)
+            _keyword_preview_cache_lookups.inc("hit")
+            return hit
+    _keyword_preview_cache_lookups.inc("miss")
+
+    results = pricing_engine_mod.compute_batch(data, candidate_pns, rules=base_rules)
+    fobs = {
+        pn: _to_float_soft((r.get("final_values") or {}).get("FOB C(EUR)"))
+        for pn, r in zip(candidate_pns, results)
+    }
+    with _keyword_preview_cache_lock:
+        _keyword_preview_base_cache[key] = fobs
+        _keyword_preview_base_cache.move_to_end(key)
+        while len(_keyword_preview_base_cache) > KEYWORD_PREVIEW_CACHE_SIZE:
+            _keyword_preview_base_cache.popitem(last=False)
+    return fobs
 
-def _collect_keyword_candidate_pns(keyword: str) -> list[str]:
-    assert _engine is not None and _engine.data is not None
-    data = _engine.data
-    kw = str(keyword or "").strip().upper()
-    if not kw:
-        return []
-
-    fr = data.france_df
-    sy = data.sys_df
-    fr_pn_col = _pick_col(fr, ["Part No.", "Part No", "Part Num", "PN", "P/N", "Part Number"])
-    sy_pn_col = _pick_col(sy, ["Part Num", "Part No.", "Part No", "PN", "P/N", "Part Number"])
-
-    fr_fields = ["Internal Model", "External Model"]
-    sy_fields = ["Internal Model", "External Model"]
-
-    pns: set[str] = set()
-    for _, r in fr.iterrows():
-        if _row_matches_keyword_models(r, kw, fr_fields):
-            pn = str(r.get(fr_pn_col) or "").strip()
-            if pn:
-                pns.add(pn)
-    for _, r in sy.iterrows():
-        if _row_matches_keyword_models(r, kw, sy_fields):
-            pn = str(r.get(sy_pn_col) or "").strip()
-            if pn:
-                pns.add(pn)
-    return sorted(pns)
 
 def _keyword_preview_all_sources(keyword: str, pct: float, enabled: bool) -> Dict[str, Any]:
     assert _engine is not None and _engine.data is not None
@@ -848,7 +753,9 @@ def _keyword_preview_all_sources(keyword: str, pct: float, enabled: bool) -> Dic
     if not math.isfinite(float(pct)):
         raise HTTPException(status_code=400, detail="pct must be finite")
 
-    candidate_pns = _collect_keyword_candidate_pns(kw)
+    # 候选 PN 与 base / preview 计算用同一份数据
+    data = _engine.data
+    candidate_pns = _collect_keyword_candidate_pns(kw, data)
     if not candidate_pns:
         return {
             "ok": True,
@@ -864,33 +771,33 @@ def _keyword_preview_all_sources(keyword: str, pct: float, enabled: bool) -> Dic
             "rows": [],
         }
 
-    origin_rules = copy.deepcopy(pricing_engine_mod.KEYWORD_UPLIFT_RULES)
+    kw_up = kw.upper()
+    impacted_rows: list[Dict[str, Any]] = []
+    # 在当前规则快照上派生 base / preview 两份 RuleSet 传给 compute_batch，不改生效规则
+    rules = pricing_engine_mod.current_rules()
     base_rules = [
-        r for r in copy.deepcopy(pricing_engine_mod.KEYWORD_UPLIFT_RULES)
-        if str(r.get("keyword") or "").strip().upper() != kw.upper()
+        r for r in thaw(rules.keyword_uplift_rules)
+        if str(r.get("keyword") or "").strip().upper() != kw_up
     ]
     preview_rules = copy.deepcopy(base_rules)
     preview_rules.append({"keyword": kw, "pct": float(pct), "enabled": True})
 
-    impacted_rows: list[Dict[str, Any]] = []
-    try:
-        pricing_engine_mod.KEYWORD_UPLIFT_RULES.clear()
-        pricing_engine_mod.KEYWORD_UPLIFT_RULES.extend(base_rules)
-        base_results = {pn: pricing_engine_mod.compute_one(_engine.data, pn) for pn in candidate_pns}
-
-        pricing_engine_mod.KEYWORD_UPLIFT_RULES.clear()
-        pricing_engine_mod.KEYWORD_UPLIFT_RULES.extend(preview_rules)
-        new_results = {pn: pricing_engine_mod.compute_one(_engine.data, pn) for pn in candidate_pns}
-    finally:
-        pricing_engine_mod.KEYWORD_UPLIFT_RULES.clear()
-        pricing_engine_mod.KEYWORD_UPLIFT_RULES.extend(origin_rules)
+    base_fobs = _keyword_preview_base_fobs(
+        data, rules.generation, kw_up, candidate_pns, rules.replace(keyword_uplift_rules=base_rules)
+    )
+    new_results = dict(
+        zip(
+            candidate_pns,
+            pricing_engine_mod.compute_batch(
+                data, candidate_pns, rules=rules.replace(keyword_uplift_rules=preview_rules)
+            ),
+        )
+    )
 
     for pn in candidate_pns:
-        b = base_results.get(pn) or {}
         n = new_results.get(pn) or {}
-        bfv = b.get("final_values") or {}
         nfv = n.get("final_values") or {}
-        bfob = _to_float_soft(bfv.get("FOB C(EUR)"))
+        bfob = base_fobs.get(pn)
         nfob = _to_float_soft(nfv.get("FOB C(EUR)"))
         if bfob is None or nfob is None:
             continue
@@ -936,27 +843,174 @@ def _keyword_preview_all_sources(keyword: str, pct: float, enabled: bool) -> Dic
 app = FastAPI(title="Dahua Pricing Auto (Deploy Server)", version="0.2.0")
 
 _engine: Optional[PricingEngine] = None
+_job_queue: Optional[JobQueue] = None
+
+# /metrics：接口耗时（按路由模板，不按实际路径，避免 job_id 撑爆 label）与批量 job 吞吐
+_http_request_seconds = metrics_mod.Histogram(
+    "dahua_pricing_http_request_seconds",
+    "HTTP request latency until response start, by route template.",
+    ("method", "route", "status"),
+)
+_batch_jobs = metrics_mod.Counter("dahua_pricing_batch_jobs_total", "Finished batch jobs.", ("status",))
+_batch_pns = metrics_mod.Counter("dahua_pricing_batch_pns_total", "PNs priced by finished batch jobs.")
+_batch_compute_seconds = metrics_mod.Counter(
+    "dahua_pricing_batch_compute_seconds_total",
+    "Pricing time of finished batch jobs (excluding export).",
+)
+_batch_job_seconds = metrics_mod.Histogram(
+    "dahua_pricing_batch_job_seconds",
+    "Batch job run time from start to finish, including export.",
+)
+_batch_throughput = metrics_mod.Histogram(
+    "dahua_pricing_batch_throughput_pns_per_second",
+    "Pricing throughput of each finished batch job.",
+    buckets=(50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000),
+)
+
+
+@app.middleware("http")
+async def _observe_request_latency(request: Request, call_next: Any) -> Any:
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        _http_request_seconds.observe(
+            time.perf_counter() - t0,
+            request.method,
+            getattr(route, "path", None) or "<unmatched>",
+            str(status),
+        )
+
+
+def _rules_lock() -> Any:
+    """
+    admin 改规则时持有的锁：串行化 “RULES.update 换入新 RuleSet -> 写 runtime/admin JSON”，
+    保证落盘内容与最新快照一致。读规则不加锁（RuleSet 为只读快照）；
+    价格簿重建由之后的 _notify_rules_changed 触发，在锁外按新快照进行。engine 未创建时退化为空上下文。
+    """
+    if _engine is None:
+        return contextlib.nullcontext()
+    return _engine.rules_lock
+
+
+def _notify_rules_changed() -> None:
+    if _engine is not None:
+        _engine.notify_rules_changed()
+
+
+def _require_ready() -> None:
+    """
+    依赖价格数据的接口入口先调用：启动后台加载尚未完成（或加载失败）时立即 503 + Retry-After，不排队等待。
+    """
+    if _engine is not None and _engine.ready:
+        return
+    detail = "pricing data is loading, retry later"
+    if _engine is not None:
+        readiness = _engine.readiness()
+        if readiness["stage"] == "failed":
+            detail = f"pricing data failed to load: {readiness['last_error']}"
+    raise HTTPException(
+        status_code=503,
+        detail=detail,
+        headers={"Retry-After": str(NOT_READY_RETRY_AFTER_SECONDS)},
+    )
 
 
 @app.on_event("startup")
 def _startup() -> None:
     _ensure_dirs()
     _apply_rule_overrides_if_exist()
-    global _engine
-    cfg = EngineConfig(runtime_dir=RUNTIME_DIR)
+    global _engine, _job_queue
+    cfg = EngineConfig(
+        runtime_dir=RUNTIME_DIR,
+        price_book=PRICE_BOOK_ENABLED,
+        query_cache_size=QUERY_CACHE_SIZE,
+        query_cache_max_bytes=QUERY_CACHE_MAX_MB * 1024 * 1024,
+        data_watch_seconds=DATA_WATCH_SECONDS,
+        delta_reload=DELTA_RELOAD_ENABLED,
+        load_workers=LOAD_WORKERS,
+    )
     _engine = PricingEngine(cfg)
-    _engine.load()
+    # 后台加载：uvicorn 立即开始接受连接，/api/healthz 可用，/api/readyz 报告加载进度
+    _engine.start_load()
+
+    # 恢复的 job 在 _run_batch_job 里等数据就绪后再执行
+    _job_queue = JobQueue(JOBS_DIR, _run_batch_job, workers=BATCH_JOB_WORKERS)
+    for job_id in _job_queue.recover():
+        _mark_job_resumed(job_id)
+    _job_queue.start()
+
+
+@app.get("/api/healthz")
+def healthz() -> Dict[str, Any]:
+    """存活检查：进程能响应即 ok，不看数据是否加载完成。"""
+    return {"ok": True}
+
+
+@app.get("/api/readyz")
+def readyz() -> JSONResponse:
+    """就绪检查：数据加载完成返回 200，否则 503（含当前加载阶段与进度）。"""
+    if _engine is None:
+        return JSONResponse(
+            status_code=503,
+            content={"ready": False, "stage": "starting"},
+            headers={"Retry-After": str(NOT_READY_RETRY_AFTER_SECONDS)},
+        )
+    readiness = _engine.readiness()
+    if readiness["ready"]:
+        return JSONResponse(content=readiness)
+    return JSONResponse(
+        status_code=503,
+        content=readiness,
+        headers={"Retry-After": str(NOT_READY_RETRY_AFTER_SECONDS)},
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> PlainTextResponse:
+    """Prometheus 文本格式：接口耗时、批量吞吐、队列深度、缓存命中、数据规模与 compute_one 分阶段耗时。"""
+    lines = _http_request_seconds.render()
+    lines += _batch_jobs.render()
+    lines += _batch_pns.render()
+    lines += _batch_compute_seconds.render()
+    lines += _batch_job_seconds.render()
+    lines += _batch_throughput.render()
+    if _job_queue is not None:
+        stats = _job_queue.stats()
+        lines += metrics_mod.metric_lines(
+            "dahua_pricing_job_queue_depth", "gauge", "Batch jobs waiting in the queue.",
+            [({}, stats["queued"])],
+        )
+        lines += metrics_mod.metric_lines(
+            "dahua_pricing_job_queue_running", "gauge", "Batch jobs currently running.",
+            [({}, stats["running"])],
+        )
+        lines += metrics_mod.metric_lines(
+            "dahua_pricing_job_queue_workers", "gauge", "Batch job worker threads.",
+            [({}, stats["workers"])],
+        )
+    lines += _keyword_preview_cache_lookups.render()
+    if _engine is not None:
+        lines += _engine.metrics_lines()
+    return PlainTextResponse("\n".join(lines) + "\n", media_type=metrics_mod.CONTENT_TYPE)
 
 
 @app.get("/api/meta")
 def meta() -> Dict[str, Any]:
     assert _engine is not None
-    return _engine.meta()
+    out = _engine.meta()
+    if _job_queue is not None:
+        out["job_queue"] = _job_queue.stats()
+    return out
 
 
 @app.post("/api/query")
 def query_one(req: QueryReq) -> Dict[str, Any]:
-    assert _engine is not None
+    _require_ready()
     pn = (req.pn or "").strip()
     if not pn:
         raise HTTPException(status_code=400, detail="pn is empty")
@@ -965,14 +1019,17 @@ def query_one(req: QueryReq) -> Dict[str, Any]:
 
 @app.get("/api/query/options")
 def query_options() -> Dict[str, Any]:
+    # category_price_groups 来自 mapping：数据未就绪时返回 503，避免前端缓存一份空选项
+    _require_ready()
     category_price_groups = _build_category_price_groups()
+    rules = pricing_engine_mod.current_rules()
     group_rule_keys = {
-        str(g): sorted([str(k) for k in (v.keys() if isinstance(v, dict) else [])])
-        for g, v in pricing_rules_mod.PRICE_RULES.items()
+        str(g): sorted([str(k) for k in (v.keys() if isinstance(v, Mapping) else [])])
+        for g, v in rules.price_rules.items()
     }
     return {
-        "categories": sorted([str(k) for k in pricing_rules_mod.DDP_RULES.keys()]),
-        "price_groups": sorted([str(k) for k in pricing_rules_mod.PRICE_RULES.keys()]),
+        "categories": sorted([str(k) for k in rules.ddp_rules.keys()]),
+        "price_groups": sorted([str(k) for k in rules.price_rules.keys()]),
         "category_price_groups": category_price_groups,
         "group_rule_keys": group_rule_keys,
     }
@@ -980,7 +1037,7 @@ def query_options() -> Dict[str, Any]:
 
 @app.post("/api/query/recompute")
 def query_recompute(req: QueryRecomputeReq) -> Dict[str, Any]:
-    assert _engine is not None
+    _require_ready()
     pn = (req.pn or "").strip()
     if not pn:
         raise HTTPException(status_code=400, detail="pn is empty")
@@ -1014,7 +1071,7 @@ def query_recompute(req: QueryRecomputeReq) -> Dict[str, Any]:
 
 @app.post("/api/query/export")
 def query_export(req: QueryExportReq) -> FileResponse:
-    assert _engine is not None
+    _require_ready()
     pn = (req.pn or "").strip()
     if not pn:
         raise HTTPException(status_code=400, detail="pn is empty")
@@ -1066,7 +1123,7 @@ def query_export(req: QueryExportReq) -> FileResponse:
 
 @app.post("/api/query/external-model-index")
 def query_external_model_index(req: ExternalModelReq) -> Dict[str, Any]:
-    assert _engine is not None
+    _require_ready()
     pn = (req.pn or "").strip()
     if not pn:
         raise HTTPException(status_code=400, detail="pn is empty")
@@ -1075,12 +1132,13 @@ def query_external_model_index(req: ExternalModelReq) -> Dict[str, Any]:
 
 @app.post("/api/models/search")
 def model_search(req: ModelSearchReq) -> Dict[str, Any]:
+    _require_ready()
     return _search_models(req)
 
 
 @app.post("/api/query/external-model-export")
 def query_external_model_export(req: ExternalModelReq) -> FileResponse:
-    assert _engine is not None
+    _require_ready()
     pn = (req.pn or "").strip()
     if not pn:
         raise HTTPException(status_code=400, detail="pn is empty")
@@ -1144,17 +1202,179 @@ def _build_batch_review_item(idx: int, row: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+def _mark_job_resumed(job_id: str) -> None:
+    """服务重启后恢复的 job：state 重置为 queued，重新从头执行。"""
+    try:
+        state = _read_state(job_id)
+    except HTTPException:
+        return
+    state["status"] = "queued"
+    state["resumed_count"] = int(state.get("resumed_count") or 0) + 1
+    state["started_at"] = None
+    state["finished_at"] = None
+    state["error"] = None
+    _write_state(job_id, state)
+
+
+def _compute_batch_rows(
+    pns: list[str],
+    anchor_cache: Dict[str, tuple[Optional[str], Optional[Dict[str, float]]]],
+    data: DataBundle,
+) -> list[Dict[str, Any]]:
+    """批量定价一块 PN（compute_batch）并套用 France External Model 锚定价。"""
+    assert _engine is not None
+    rows = _engine.query_many(pns, data=data)
+    for row in rows:
+        _apply_external_model_anchor_to_row(
+            row,
+            data=data,
+            apply_france_anchor=True,
+            anchor_cache=anchor_cache,
+        )
+    return rows
+
+
+# 分片进程池：每个分片 job 新建一个，job 结束即关闭（子进程不常驻：不长期持有 fork 时继承的
+# 监听 socket / 连接 fd，也不在 reload 后拖住旧 DataBundle）。fork 时设好 _shard_data 由子进程继承；
+# 子进程只跑 compute_batch + 锚定价，不碰 engine / 锁 / metrics。
+_shard_data: Optional[DataBundle] = None
+_shard_fork_lock = threading.Lock()
+
+
+def _shard_pool_ready() -> int:
+    """fork 后的预热任务：确认子进程已继承 _shard_data。"""
+    assert _shard_data is not None
+    return _shard_data.generation
+
+
+def _batch_shard_worker(pns: list[str], rules: RuleSet, data_generation: int) -> list[Dict[str, Any]]:
+    """
+    分片子进程入口：在 fork 时继承的 _shard_data 上用父进程传入的规则快照算价并套锚定价。
+    不经过 _engine（价格簿 / 结果缓存 / metrics 计数器都带锁，父进程 fork 时可能正被其他线程持有）。
+    """
+    data = _shard_data
+    assert data is not None and data.generation == data_generation
+    rows = pricing_engine_mod.compute_batch(data, pns, rules=rules)
+    anchor_cache: Dict[str, tuple[Optional[str], Optional[Dict[str, float]]]] = {}
+    for row in rows:
+        _apply_external_model_anchor_to_row(
+            row,
+            data=data,
+            apply_france_anchor=True,
+            anchor_cache=anchor_cache,
+        )
+    return rows
+
+
+def _new_shard_pool(data: DataBundle) -> ProcessPoolExecutor:
+    """新建继承了 data 的进程池；调用方用 with 保证 job 结束时关闭。"""
+    global _shard_data
+    pool = ProcessPoolExecutor(
+        max_workers=BATCH_SHARD_WORKERS,
+        mp_context=multiprocessing.get_context("fork"),
+    )
+    # fork 模式下首次 submit 即创建全部 worker：此刻的 _shard_data 即子进程里的数据；
+    # 同时跑的分片 job 按 _shard_fork_lock 依次 fork，互不串数据
+    with _shard_fork_lock:
+        _shard_data = data
+        try:
+            pool.submit(_shard_pool_ready).result()
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            _shard_data = None
+    return pool
+
+
+def _use_sharded_batch(total: int) -> bool:
+    return bool(
+        BATCH_SHARD_MIN_PNS > 0
+        and total >= BATCH_SHARD_MIN_PNS
+        and BATCH_SHARD_WORKERS > 1
+        and "fork" in multiprocessing.get_all_start_methods()
+    )
+
+
+def _compute_batch_rows_sharded(
+    job_id: str, state: Dict[str, Any], pns: list[str], data: DataBundle
+) -> list[Dict[str, Any]]:
+    """
+    大批量：按 BATCH_SHARD_SIZE 切片交给进程池，按输入顺序合并；
+    每完成一片就把累计进度写回 job state。整个 job 用开始时的规则快照。
+    """
+    total = len(pns)
+    shards = [pns[i:i + BATCH_SHARD_SIZE] for i in range(0, total, BATCH_SHARD_SIZE)]
+    shard_rows: list[Optional[list[Dict[str, Any]]]] = [None] * len(shards)
+    state["progress_shards_total"] = len(shards)
+    state["progress_shards_done"] = 0
+    _write_state(job_id, state)
+
+    rules = pricing_engine_mod.current_rules()
+    done = 0
+    with _new_shard_pool(data) as pool:
+        futures = {
+            pool.submit(_batch_shard_worker, shard, rules, data.generation): k for k, shard in enumerate(shards)
+        }
+        try:
+            for fut in as_completed(futures):
+                k = futures[fut]
+                shard_rows[k] = fut.result()
+                done += len(shards[k])
+                state["progress_shards_done"] += 1
+                state["progress_done"] = done
+                state["progress_percent"] = round((done * 100.0 / total), 2) if total > 0 else 100.0
+                state["progress_current_pn"] = shards[k][-1]
+                _update_state(job_id, state)
+        finally:
+            for fut in futures:
+                fut.cancel()
+
+    return [row for rows in shard_rows for row in (rows or [])]
+
+
+def _wait_ready_for_job() -> Optional[str]:
+    """
+    等首份数据就绪；返回 None 表示就绪，否则返回错误信息（加载失败 / 超过 JOB_WAIT_READY_SECONDS）。
+    加载失败后不再等：job worker 不能一直卡住，后面排队的 job 也会逐个失败而不是挂起。
+    """
+    assert _engine is not None
+    deadline = time.monotonic() + JOB_WAIT_READY_SECONDS
+    while not _engine.wait_ready(timeout=1.0):
+        readiness = _engine.readiness()
+        if readiness["stage"] == "failed":
+            return f"pricing data failed to load: {readiness['last_error']}"
+        if time.monotonic() >= deadline:
+            return f"pricing data not ready after {JOB_WAIT_READY_SECONDS:g}s"
+    return None
+
+
 def _run_batch_job(job_id: str) -> None:
     assert _engine is not None
     state = _read_state(job_id)
+    # 启动时恢复的 job 可能先于数据加载完成被取出：等首份数据就绪
+    not_ready = _wait_ready_for_job()
+    if not_ready is not None:
+        state["status"] = "failed"
+        state["finished_at"] = _utc_now_iso()
+        state["error"] = f"RuntimeError: {not_ready}"
+        _write_state(job_id, state)
+        _batch_jobs.inc("failed")
+        return
+    # 整个 job 固定用开始时的数据；期间 reload 换入的新数据从下一个 job 起生效
+    data = _engine.data
     input_path = Path(state.get("input_path") or "")
     level_norm = str(state.get("level") or "country").strip().lower() or "country"
     out_dir = OUTPUTS_DIR / job_id
+    t_start = time.perf_counter()
 
     try:
         state["status"] = "running"
         state["started_at"] = _utc_now_iso()
+        state["data_generation"] = data.generation if data is not None else None
         _write_state(job_id, state)
+        if data is None:
+            raise RuntimeError("engine not loaded")
 
         pns_raw = parse_pn_list_file(input_path)
         pns = [str(x).strip() for x in pns_raw if str(x).strip()]
@@ -1176,14 +1396,8 @@ def _run_batch_job(job_id: str) -> None:
         anchor_changed_count = 0
         anchor_cache: Dict[str, tuple[Optional[str], Optional[Dict[str, float]]]] = {}
 
-        for i, pn in enumerate(pns, start=1):
-            row = _engine.query_one(pn)
-            _apply_external_model_anchor_to_row(
-                row,
-                apply_france_anchor=True,
-                anchor_cache=anchor_cache,
-            )
-
+        def _collect(i: int, pn: str, row: Dict[str, Any]) -> None:
+            nonlocal anchor_applied_count, anchor_changed_count
             results.append(row)
             items.append(_build_batch_review_item(i, row))
 
@@ -1197,13 +1411,30 @@ def _run_batch_job(job_id: str) -> None:
             for w in (row.get("warnings") or []):
                 warnings.append({"pn": row.get("pn"), "w": w})
 
-            state["progress_done"] = i
-            state["progress_percent"] = round((i * 100.0 / total), 2) if total > 0 else 100.0
-            state["progress_current_pn"] = pn
+        t_compute = time.perf_counter()
+        if _use_sharded_batch(total):
+            rows_all = _compute_batch_rows_sharded(job_id, state, pns, data)
+            for i, (pn, row) in enumerate(zip(pns, rows_all), start=1):
+                _collect(i, pn, row)
             state["progress_anchor_applied"] = anchor_applied_count
             state["progress_anchor_changed"] = anchor_changed_count
             state["progress_not_found"] = len(not_found)
-            _write_state(job_id, state)
+        else:
+            # 按块批量计算（compute_batch 向量化算价），逐行统计 / 写进度
+            for start in range(0, total, BATCH_COMPUTE_CHUNK):
+                chunk = pns[start:start + BATCH_COMPUTE_CHUNK]
+                rows_chunk = _compute_batch_rows(chunk, anchor_cache, data)
+                for i, (pn, row) in enumerate(zip(chunk, rows_chunk), start=start + 1):
+                    _collect(i, pn, row)
+
+                    state["progress_done"] = i
+                    state["progress_percent"] = round((i * 100.0 / total), 2) if total > 0 else 100.0
+                    state["progress_current_pn"] = pn
+                    state["progress_anchor_applied"] = anchor_applied_count
+                    state["progress_anchor_changed"] = anchor_changed_count
+                    state["progress_not_found"] = len(not_found)
+                    _update_state(job_id, state)
+        compute_seconds = time.perf_counter() - t_compute
 
         frames = build_export_frames(results)
         out_dir.mkdir(parents=True, exist_ok=True)
@@ -1231,24 +1462,33 @@ def _run_batch_job(job_id: str) -> None:
         state["progress_current_pn"] = None
         state["error"] = None
         _write_state(job_id, state)
+
+        _batch_jobs.inc("done")
+        _batch_pns.inc(amount=total)
+        _batch_compute_seconds.inc(amount=compute_seconds)
+        _batch_job_seconds.observe(time.perf_counter() - t_start)
+        if total > 0 and compute_seconds > 0:
+            _batch_throughput.observe(total / compute_seconds)
     except Exception as e:
         state["status"] = "failed"
         state["finished_at"] = _utc_now_iso()
         state["error"] = f"{type(e).__name__}: {e}"
         _write_state(job_id, state)
+        _batch_jobs.inc("failed")
 
 
 @app.post("/api/batch")
 def batch(
     level: str = Form(..., description="country | country_customer"),
     file: UploadFile = File(...),
+    priority: int = Form(0, description="排队优先级，越大越先执行"),
 ) -> Dict[str, Any]:
     """
     批量导出（已统一为 country 导出结构）：
     - 兼容接收 country / country_customer
     - 实际导出文件统一为 Country_import_upload_Model.xlsx
     """
-    assert _engine is not None
+    _require_ready()
     level_input = (level or "").strip().lower()
     if level_input not in ("country", "country_customer"):
         raise HTTPException(status_code=400, detail="level must be country or country_customer")
@@ -1291,22 +1531,109 @@ def batch(
         "progress_anchor_applied": 0,
         "progress_anchor_changed": 0,
         "progress_not_found": 0,
+        "priority": int(priority),
+        "resumed_count": 0,
     }
     _write_state(job_id, state)
 
-    worker = threading.Thread(
-        target=_run_batch_job,
-        args=(job_id,),
-        daemon=True,
-        name=f"batch-job-{job_id}",
-    )
-    worker.start()
-    return {"job_id": job_id, "status": "queued", "export_layout": "country"}
+    assert _job_queue is not None
+    position = _job_queue.submit(job_id, priority=priority)
+    return {"job_id": job_id, "status": "queued", "export_layout": "country", "queue_position": position}
 
 
 @app.get("/api/jobs/{job_id}")
 def job_status(job_id: str) -> Dict[str, Any]:
-    return _read_state(job_id)
+    state = _read_state(job_id)
+    state["queue_position"] = _job_queue.position(job_id) if _job_queue is not None else None
+    return state
+
+
+# SSE progress 事件里推送的字段（只推有变化的）
+_JOB_PROGRESS_FIELDS = (
+    "status",
+    "queue_position",
+    "progress_total",
+    "progress_done",
+    "progress_percent",
+    "progress_not_found",
+    "progress_anchor_applied",
+    "progress_anchor_changed",
+    "progress_current_pn",
+    "progress_shards_total",
+    "progress_shards_done",
+)
+
+
+def _job_progress_view(job_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    view = {k: state.get(k) for k in _JOB_PROGRESS_FIELDS}
+    view["queue_position"] = _job_queue.position(job_id) if _job_queue is not None else None
+    return view
+
+
+def _job_summary_view(state: Dict[str, Any]) -> Dict[str, Any]:
+    """结束事件：只给计数和结果位置，不带 report.items。"""
+    report = state.get("report") or {}
+    return {
+        "job_id": state.get("job_id"),
+        "status": state.get("status"),
+        "started_at": state.get("started_at"),
+        "finished_at": state.get("finished_at"),
+        "error": state.get("error"),
+        "progress_total": state.get("progress_total"),
+        "progress_done": state.get("progress_done"),
+        "count_total": report.get("count_total"),
+        "count_not_found": report.get("count_not_found"),
+        "count_anchor_applied": report.get("count_anchor_applied"),
+        "count_anchor_changed": report.get("count_anchor_changed"),
+        "count_warnings": len(report.get("warnings") or []),
+        "has_output": bool(state.get("output_files")),
+    }
+
+
+def _sse_event(event: str, payload: Dict[str, Any]) -> str:
+    data = json.dumps(_deep_jsonable(payload), ensure_ascii=False, separators=(",", ":"))
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str) -> StreamingResponse:
+    """
+    Server-Sent Events：
+      - progress：首条为完整进度，之后只推变化的字段
+      - done：job 结束（done / failed）时推一次汇总并关闭连接
+    进度直接读内存登记表，不读 state.json。
+    """
+    _read_state(job_id)  # 不存在则 404
+
+    async def _stream():
+        last: Dict[str, Any] = {}
+        idle = 0.0
+        while True:
+            try:
+                state = _read_state(job_id)
+            except HTTPException:
+                yield _sse_event("done", {"job_id": job_id, "status": "missing"})
+                return
+            if str(state.get("status") or "").lower() in ("done", "failed"):
+                yield _sse_event("done", _job_summary_view(state))
+                return
+            view = _job_progress_view(job_id, state)
+            delta = {k: v for k, v in view.items() if k not in last or last[k] != v}
+            if delta:
+                last.update(delta)
+                idle = 0.0
+                yield _sse_event("progress", delta)
+            if idle >= JOB_EVENTS_HEARTBEAT_SECONDS:
+                idle = 0.0
+                yield ": ping\n\n"
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+            idle += JOB_EVENTS_POLL_SECONDS
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/api/jobs/{job_id}/download")
@@ -1349,14 +1676,16 @@ def admin_get_keyword_uplift() -> list[Dict[str, Any]]:
 @app.put("/api/admin/keyword-uplift")
 def admin_put_keyword_uplift(payload: Any = Body(...)) -> Dict[str, Any]:
     data = _normalize_keyword_uplift_payload(payload)
-    pricing_engine_mod.KEYWORD_UPLIFT_RULES.clear()
-    pricing_engine_mod.KEYWORD_UPLIFT_RULES.extend(data)
-    _write_json_file(KEYWORD_UPLIFT_CFG, _sorted_keyword_uplift_rows())
-    return {"ok": True, "count": len(pricing_engine_mod.KEYWORD_UPLIFT_RULES)}
+    with _rules_lock():
+        rules = pricing_engine_mod.RULES.update(keyword_uplift_rules=data)
+        _write_json_file(KEYWORD_UPLIFT_CFG, _sorted_keyword_uplift_rows())
+    _notify_rules_changed()
+    return {"ok": True, "count": len(rules.keyword_uplift_rules)}
 
 
 @app.post("/api/admin/keyword-uplift/preview")
 def admin_preview_keyword_uplift(req: KeywordUpliftPreviewReq) -> Dict[str, Any]:
+    _require_ready()
     keyword = (req.keyword or "").strip()
     pct = _normalize_number(req.pct, "pct")
     return _keyword_preview_all_sources(keyword, pct, bool(req.enabled))
@@ -1365,10 +1694,11 @@ def admin_preview_keyword_uplift(req: KeywordUpliftPreviewReq) -> Dict[str, Any]
 @app.put("/api/admin/uplift")
 def admin_put_uplift(payload: Dict[str, Any]) -> Dict[str, Any]:
     data = _normalize_uplift_payload(payload)
-    pricing_engine_mod.UPLIFT_PCT_BY_LINE.clear()
-    pricing_engine_mod.UPLIFT_PCT_BY_LINE.update(data)
-    _write_json_file(UPLIFT_CFG, _sorted_uplift_dict())
-    return {"ok": True, "count": len(pricing_engine_mod.UPLIFT_PCT_BY_LINE)}
+    with _rules_lock():
+        rules = pricing_engine_mod.RULES.update(uplift_pct_by_line=data)
+        _write_json_file(UPLIFT_CFG, _sorted_uplift_dict())
+    _notify_rules_changed()
+    return {"ok": True, "count": len(rules.uplift_pct_by_line)}
 
 
 @app.get("/api/admin/ddp-rules")
@@ -1379,10 +1709,11 @@ def admin_get_ddp_rules() -> Dict[str, list[float]]:
 @app.put("/api/admin/ddp-rules")
 def admin_put_ddp_rules(payload: Dict[str, Any]) -> Dict[str, Any]:
     data = _normalize_ddp_rules_payload(payload)
-    pricing_rules_mod.DDP_RULES.clear()
-    pricing_rules_mod.DDP_RULES.update(data)
-    _write_json_file(DDP_RULES_CFG, _sorted_ddp_rules_dict())
-    return {"ok": True, "count": len(pricing_rules_mod.DDP_RULES)}
+    with _rules_lock():
+        rules = pricing_engine_mod.RULES.update(ddp_rules=data)
+        _write_json_file(DDP_RULES_CFG, _sorted_ddp_rules_dict())
+    _notify_rules_changed()
+    return {"ok": True, "count": len(rules.ddp_rules)}
 
 
 @app.get("/api/admin/pricing-rules")
@@ -1393,20 +1724,50 @@ def admin_get_price_rules() -> Dict[str, Any]:
 @app.put("/api/admin/pricing-rules")
 def admin_put_price_rules(payload: Dict[str, Any]) -> Dict[str, Any]:
     data = _normalize_price_rules_payload(payload)
-    pricing_rules_mod.PRICE_RULES.clear()
-    pricing_rules_mod.PRICE_RULES.update(copy.deepcopy(data))
-    _write_json_file(PRICE_RULES_CFG, _sorted_price_rules_dict())
-    return {"ok": True, "count_groups": len(pricing_rules_mod.PRICE_RULES)}
+    with _rules_lock():
+        rules = pricing_engine_mod.RULES.update(price_rules=data)
+        _write_json_file(PRICE_RULES_CFG, _sorted_price_rules_dict())
+    _notify_rules_changed()
+    return {"ok": True, "count_groups": len(rules.price_rules)}
 
 
 @app.post("/api/admin/reload-rules")
 def admin_reload_rules() -> Dict[str, Any]:
-    _apply_rule_overrides_if_exist()
+    with _rules_lock():
+        _apply_rule_overrides_if_exist()
+    _notify_rules_changed()
+    rules = pricing_engine_mod.current_rules()
+    return {
+        "ok": True,
+        "rules_generation": rules.generation,
+        "uplift_count": len(rules.uplift_pct_by_line),
+        "keyword_uplift_count": len(rules.keyword_uplift_rules),
+        "ddp_count": len(rules.ddp_rules),
+        "price_group_count": len(rules.price_rules),
+        "uplift_keys": sorted([str(k) for k in rules.uplift_pct_by_line.keys()]),
+    }
+
+
+@app.post("/api/admin/reload-data")
+def admin_reload_data(wait: bool = False, full: bool = False) -> Dict[str, Any]:
+    """
+    重新读取 runtime/data 价格表与 runtime/mapping：后台构建新数据后原子替换，
+    进行中的查询 / 批量 job 继续用各自开始时的数据。wait=true 时等构建结束再返回。
+    默认按行增量更新（差异见 /api/admin/data-diff）；full=true 强制整份重建。
+    """
+    assert _engine is not None
+    status = _engine.reload_data(wait=bool(wait), full=bool(full))
+    if wait and status.get("last_error"):
+        raise HTTPException(status_code=500, detail=f"reload failed: {status['last_error']}")
+    return {"ok": True, **status}
+
+
+@app.get("/api/admin/data-diff")
+def admin_data_diff(limit: int = 200) -> Dict[str, Any]:
+    """最近一次数据 reload 的差异：France / Sys 新增、删除、变化的行数与 PN（各至多 limit 个）。"""
+    assert _engine is not None
     return {
         "ok": True,
-        "uplift_count": len(pricing_engine_mod.UPLIFT_PCT_BY_LINE),
-        "keyword_uplift_count": len(pricing_engine_mod.KEYWORD_UPLIFT_RULES),
-        "ddp_count": len(pricing_rules_mod.DDP_RULES),
-        "price_group_count": len(pricing_rules_mod.PRICE_RULES),
-        "uplift_keys": sorted([str(k) for k in pricing_engine_mod.UPLIFT_PCT_BY_LINE.keys()]),
+        "data_generation": _engine.data_generation,
+        "diff": _engine.last_data_diff(limit=max(0, int(limit))),
     }
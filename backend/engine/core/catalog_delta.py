@@ -0,0 +1,272 @@
+# backend/engine/core/catalog_delta.py
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+import pandas as pd
+
+from backend.engine.core.keyword_index import FRANCE_PN_COLS, KEYWORD_MODEL_COLS, SYS_PN_COLS
+from backend.engine.core.search_index import PN_COL_CANDIDATES, pick_col
+
+
+# 摘要里每类最多列出的 PN 数
+DIFF_PN_LIMIT = 50
+
+_MODEL_COL_CANDIDATES = (("Internal Model",), ("External Model", "ExternalModel"))
+_EXTERNAL_COL_CANDIDATES = ("External Model", "ExternalModel")
+
+
+def _same_value(a: Any, b: Any) -> bool:
+    if a is b:
+        return True
+    try:
+        if pd.isna(a) and pd.isna(b):
+            return True
+    except (TypeError, ValueError):
+        pass
+    try:
+        return bool(a == b) and type(a) is type(b)
+    except Exception:  # noqa: BLE001
+        return False
+
+
+def row_identity_keys(pn_texts: Sequence[str]) -> List[Tuple[str, int]]:
+    """
+    行身份：(strip + upper 后的 PN, 该 PN 第几次出现)。
+    重复 PN 按出现顺序一一对应，空 PN 同理。
+    """
+    seen: Dict[str, int] = {}
+    out: List[Tuple[str, int]] = []
+    for t in pn_texts:
+        k = t.strip().upper()
+        n = seen.get(k, 0)
+        seen[k] = n + 1
+        out.append((k, n))
+    return out
+
+
+def row_hashes(df: pd.DataFrame) -> List[int]:
+    """整行内容哈希（列顺序相关，不含 index）。"""
+    if not len(df.columns):
+        return [0] * len(df)
+    return pd.util.hash_pandas_object(df, index=False).tolist()
+
+
+@dataclass(frozen=True)
+class TableDiff:
+    """
+    一张价格表新旧两版的逐行差异（按 row_identity_keys 对齐）：
+      - added / removed / changed：PN 原文（changed 为同一 PN 行内容有变化）
+      - changed_columns：changed 行里实际变化过的列
+      - reordered：PN 列顺序变化（行号整体移动）
+      - prev_pos[i]：新表第 i 行内容未变时对应的旧行号，否则 None
+    """
+    source: str
+    rows_before: int
+    rows_after: int
+    added: Tuple[str, ...]
+    removed: Tuple[str, ...]
+    changed: Tuple[str, ...]
+    changed_columns: FrozenSet[str]
+    reordered: bool
+    prev_pos: Tuple[Optional[int], ...]
+
+    @property
+    def structural(self) -> bool:
+        """行数 / 行号有变化（增删或重排）。"""
+        return bool(self.added or self.removed or self.reordered)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.structural or self.changed)
+
+    def touched_pns(self) -> Iterable[str]:
+        yield from self.added
+        yield from self.removed
+        yield from self.changed
+
+    def columns_touched(self, cols: Iterable[Optional[str]]) -> bool:
+        """增删 / 重排，或 changed 行在 cols 中任一列有变化。"""
+        if self.structural:
+            return True
+        return any(c in self.changed_columns for c in cols if c is not None)
+
+    def summary(self, limit: int = DIFF_PN_LIMIT) -> Dict[str, Any]:
+        return {
+            "rows_before": self.rows_before,
+            "rows_after": self.rows_after,
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "changed": len(self.changed),
+            "reordered": self.reordered,
+            "changed_columns": sorted(str(c) for c in self.changed_columns),
+            "added_pns": list(self.added[:limit]),
+            "removed_pns": list(self.removed[:limit]),
+            "changed_pns": list(self.changed[:limit]),
+        }
+
+
+def unchanged_table_diff(source: str, rows: int) -> TableDiff:
+    """源文件内容未变（sha256 一致）时的空 diff。"""
+    return TableDiff(
+        source=source,
+        rows_before=rows,
+        rows_after=rows,
+        added=(),
+        removed=(),
+        changed=(),
+        changed_columns=frozenset(),
+        reordered=False,
+        prev_pos=tuple(range(rows)),
+    )
+
+
+def diff_price_table(
+    source: str,
+    old_df: pd.DataFrame,
+    old_pn_texts: Sequence[str],
+    new_df: pd.DataFrame,
+    new_pn_texts: Sequence[str],
+) -> TableDiff:
+    """
+    old_pn_texts / new_pn_texts：两版 PN 列的 str 值（空值为 ""，见 loader._pn_texts）。
+    调用方保证两版列完全一致。
+    """
+    old_keys = row_identity_keys(old_pn_texts)
+    new_keys = row_identity_keys(new_pn_texts)
+    old_hash = row_hashes(old_df)
+    new_hash = row_hashes(new_df)
+    old_pos = {k: i for i, k in enumerate(old_keys)}
+
+    added: List[str] = []
+    changed: List[str] = []
+    changed_pairs: List[Tuple[int, int]] = []
+    prev_pos: List[Optional[int]] = []
+    matched: Set[int] = set()
+    for i, k in enumerate(new_keys):
+        o = old_pos.get(k)
+        if o is None:
+            added.append(new_pn_texts[i])
+            prev_pos.append(None)
+            continue
+        matched.add(o)
+        if old_hash[o] == new_hash[i]:
+            prev_pos.append(o)
+        else:
+            changed.append(new_pn_texts[i])
+            changed_pairs.append((o, i))
+            prev_pos.append(None)
+    removed = [old_pn_texts[o] for o in range(len(old_keys)) if o not in matched]
+
+    changed_columns: Set[str] = set()
+    if changed_pairs:
+        old_rows = old_df.iloc[[o for o, _ in changed_pairs]].to_numpy(dtype=object).tolist()
+        new_rows = new_df.iloc[[i for _, i in changed_pairs]].to_numpy(dtype=object).tolist()
+        cols = list(new_df.columns)
+        for a, b in zip(old_rows, new_rows):
+            for c, va, vb in zip(cols, a, b):
+                if c not in changed_columns and not _same_value(va, vb):
+                    changed_columns.add(c)
+
+    return TableDiff(
+        source=source,
+        rows_before=len(old_keys),
+        rows_after=len(new_keys),
+        added=tuple(added),
+        removed=tuple(removed),
+        changed=tuple(changed),
+        changed_columns=frozenset(changed_columns),
+        reordered=not added and not removed and old_keys != new_keys,
+        prev_pos=tuple(prev_pos),
+    )
+
+
+def _first_row_changes(
+    old_idx: Dict[str, int],
+    new_idx: Dict[str, int],
+    prev_pos: Sequence[Optional[int]],
+) -> List[str]:
+    """PN 索引（key -> 首行号）里指向的不再是同一行（未变化的旧行）的 key。"""
+    out: List[str] = []
+    for k in set(old_idx) | set(new_idx):
+        o = old_idx.get(k)
+        n = new_idx.get(k)
+        if o is None or n is None or prev_pos[n] != o:
+            out.append(k)
+    return out
+
+
+def affected_base_keys(
+    diff: TableDiff,
+    *,
+    normalize_base: Callable[[str], str],
+    old_indexes: Tuple[Dict[str, int], Dict[str, int], Dict[str, int]],
+    new_indexes: Tuple[Dict[str, int], Dict[str, int], Dict[str, int]],
+) -> Set[str]:
+    """
+    结果可能变化的查询（按 normalize_pn_base(输入 PN) 归组）：
+      - 增 / 删 / 改行的 PN：base key，以及 strip + upper 原文（去后缀补价按 lower PN 查行）
+      - 有增删 / 重排时，raw / base / lower 索引里首行换了的 key（“第一次出现”换了行）
+    indexes 为 (idx_raw, idx_base, idx_lower)。
+    """
+    out: Set[str] = set()
+    for t in diff.touched_pns():
+        out.add(normalize_base(t))
+        out.add(t.strip().upper())
+    if diff.structural:
+        (old_raw, old_base, old_lower), (new_raw, new_base, new_lower) = old_indexes, new_indexes
+        for k in _first_row_changes(old_raw, new_raw, diff.prev_pos):
+            out.add(normalize_base(k))
+        out.update(_first_row_changes(old_base, new_base, diff.prev_pos))
+        for k in _first_row_changes(old_lower, new_lower, diff.prev_pos):
+            out.add(k.upper())
+    out.discard("")
+    return out
+
+
+def model_index_columns(df: pd.DataFrame, *, source: str) -> Tuple[Optional[str], ...]:
+    """型号检索 / 关键词候选索引读取的列（PN + Internal / External Model）。"""
+    pn_cols = FRANCE_PN_COLS if source == "france" else SYS_PN_COLS
+    return (
+        pick_col(df, PN_COL_CANDIDATES),
+        pick_col(df, pn_cols),
+        *(pick_col(df, cands) for cands in _MODEL_COL_CANDIDATES),
+        *KEYWORD_MODEL_COLS,
+    )
+
+
+def external_index_columns(df: pd.DataFrame, *, source: str, price_cols: Sequence[str]) -> Tuple[Optional[str], ...]:
+    """External Model 聚类索引读取的列（France 另含价格列，锚定价用）。"""
+    cols = (pick_col(df, PN_COL_CANDIDATES), pick_col(df, _EXTERNAL_COL_CANDIDATES))
+    return cols + tuple(price_cols) if source == "france" else cols
+
+
+@dataclass(frozen=True)
+class CatalogDiff:
+    """
+    一次数据 reload 的差异：
+      - mode：delta（增量更新）| full（整份重建；reason 为原因）
+      - affected_bases：结果可能变化的查询 base key（normalize_pn_base），缓存 / 价格簿按它失效
+      - reused：沿用旧版本的派生索引
+    """
+    mode: str
+    reason: Optional[str]
+    france: Optional[TableDiff]
+    sys: Optional[TableDiff]
+    affected_bases: FrozenSet[str]
+    reused: Tuple[str, ...] = ()
+
+    def summary(self, limit: int = DIFF_PN_LIMIT) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "reason": self.reason,
+            "france": self.france.summary(limit) if self.france is not None else None,
+            "sys": self.sys.summary(limit) if self.sys is not None else None,
+            "affected_keys": len(self.affected_bases) if self.mode == "delta" else None,
+            "reused": list(self.reused),
+        }
+
+
+def full_reload_diff(reason: str) -> CatalogDiff:
+    return CatalogDiff(mode="full", reason=reason, france=None, sys=None, affected_bases=frozenset())
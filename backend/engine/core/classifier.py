@@ -1,9 +1,12 @@
 # core/classifier.py
 import re
-from typing import Optional, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
 
 import pandas as pd
 
+from backend.engine.core.row_store import RowLike, row_text
+
 
 def safe_upper(v) -> str:
     if v is None:
@@ -25,52 +28,120 @@ def _normalize_field_name(f) -> str:
     return f
 
 
-def apply_mapping(row: pd.Series, mapping: pd.DataFrame) -> Tuple[str, Optional[str]]:
+def _match_field(match_type: str, pattern: str, value: str) -> bool:
+    if match_type == "equals":
+        return value == pattern
+    if match_type == "contains":
+        return pattern in value
+    return False
+
+
+@dataclass(frozen=True)
+class _CompiledRule:
     """
-    通用映射逻辑：
-      - 按 priority 从小到大匹配
-      - 支持 equals / contains 两种模式
-      - 返回 (category, price_group_hint)
+    mapping 的一行规则（field1 条件已经进入 MappingProgram 的索引，这里只保留 field2 条件与结果）。
     """
-    if mapping is None or mapping.empty:
+    field2: str
+    match_type2: str
+    pattern2: str
+    category: str
+    price_group_hint: Optional[str]
+
+
+@dataclass(frozen=True)
+class MappingProgram:
+    """
+    编译后的 mapping（加载时构建一次，之后只读）：
+      - rules：按 priority 从小到大排好的规则，下标即优先级名次
+      - equals_index：field1 -> pattern1 -> 命中的规则名次
+      - contains_index：field1 -> ((pattern1, 规则名次), ...)
+    匹配时每个字段只取值/归一化一次，按名次取第一个 field2 也满足的规则，
+    结果与逐行 iterrows 的 apply_mapping 完全一致。
+    """
+    rules: Tuple[_CompiledRule, ...] = ()
+    fields: Tuple[str, ...] = ()
+    equals_index: Dict[str, Dict[str, Tuple[int, ...]]] = field(default_factory=dict)
+    contains_index: Dict[str, Tuple[Tuple[str, Tuple[int, ...]], ...]] = field(default_factory=dict)
+
+    def referenced_fields(self) -> Tuple[str, ...]:
+        """规则读取的全部列名（field1 + field2），价格表按列投影时需要保留。"""
+        out: Dict[str, None] = dict.fromkeys(self.fields)
+        for rule in self.rules:
+            if rule.field2:
+                out[rule.field2] = None
+        return tuple(out)
+
+    def match(self, row) -> Tuple[str, Optional[str]]:
+        if not self.rules:
+            return "UNKNOWN", None
+
+        hits: List[int] = []
+        for f in self.fields:
+            value = safe_upper(row.get(f))
+            eq = self.equals_index.get(f)
+            if eq:
+                ranks = eq.get(value)
+                if ranks:
+                    hits.extend(ranks)
+            for pattern, ranks in self.contains_index.get(f, ()):
+                if pattern in value:
+                    hits.extend(ranks)
+        if not hits:
+            return "UNKNOWN", None
+
+        hits.sort()
+        values2: Dict[str, str] = {}
+        for rank in hits:
+            rule = self.rules[rank]
+            if rule.field2:
+                value2 = values2.get(rule.field2)
+                if value2 is None:
+                    value2 = safe_upper(row.get(rule.field2))
+                    values2[rule.field2] = value2
+                if not _match_field(rule.match_type2, rule.pattern2, value2):
+                    continue
+            return rule.category, rule.price_group_hint
+
         return "UNKNOWN", None
 
+
+def compile_mapping(mapping: Optional[pd.DataFrame]) -> MappingProgram:
+    """
+    把 productline_map_*.csv 编译成 MappingProgram。
+    规则语义与原 apply_mapping 逐行匹配保持一致：
+      - 按 priority 从小到大（同 priority 保持 sort_values 的顺序）
+      - field1 为空、match_type 非 equals/contains 的规则永远不命中，直接丢弃
+    """
+    if mapping is None or mapping.empty:
+        return MappingProgram()
+
     if "priority" in mapping.columns:
         iter_rules = mapping.sort_values("priority", ascending=True).iterrows()
     else:
         iter_rules = mapping.iterrows()
 
+    rules: List[_CompiledRule] = []
+    fields: List[str] = []
+    equals_index: Dict[str, Dict[str, List[int]]] = {}
+    contains_index: Dict[str, Dict[str, List[int]]] = {}
+
     for _, rule in iter_rules:
         field1 = _normalize_field_name(rule.get("field1"))
         if not field1:
             continue
         match_type1 = str(rule.get("match_type1") or "").strip().lower()
-        pattern1 = safe_upper(rule.get("pattern1"))
-        value1 = safe_upper(row.get(field1))
-
-        if match_type1 == "equals":
-            if value1 != pattern1:
-                continue
-        elif match_type1 == "contains":
-            if pattern1 not in value1:
-                continue
-        else:
+        if match_type1 not in ("equals", "contains"):
             continue
+        pattern1 = safe_upper(rule.get("pattern1"))
 
         field2 = _normalize_field_name(rule.get("field2"))
+        match_type2 = ""
+        pattern2 = ""
         if field2:
             match_type2 = str(rule.get("match_type2") or "").strip().lower()
-            pattern2 = safe_upper(rule.get("pattern2"))
-            value2 = safe_upper(row.get(field2))
-
-            if match_type2 == "equals":
-                if value2 != pattern2:
-                    continue
-            elif match_type2 == "contains":
-                if pattern2 not in value2:
-                    continue
-            else:
+            if match_type2 not in ("equals", "contains"):
                 continue
+            pattern2 = safe_upper(rule.get("pattern2"))
 
         category = str(rule.get("category") or "").strip()
         if not category:
@@ -78,9 +149,44 @@ def apply_mapping(row: pd.Series, mapping: pd.DataFrame) -> Tuple[str, Optional[
 
         price_group_hint = rule.get("price_group_hint")
         price_group_hint = str(price_group_hint).strip() if price_group_hint else None
-        return category, price_group_hint
 
-    return "UNKNOWN", None
+        rank = len(rules)
+        rules.append(
+            _CompiledRule(
+                field2=field2,
+                match_type2=match_type2,
+                pattern2=pattern2,
+                category=category,
+                price_group_hint=price_group_hint,
+            )
+        )
+        if field1 not in fields:
+            fields.append(field1)
+        target = equals_index if match_type1 == "equals" else contains_index
+        target.setdefault(field1, {}).setdefault(pattern1, []).append(rank)
+
+    return MappingProgram(
+        rules=tuple(rules),
+        fields=tuple(fields),
+        equals_index={f: {p: tuple(r) for p, r in m.items()} for f, m in equals_index.items()},
+        contains_index={f: tuple((p, tuple(r)) for p, r in m.items()) for f, m in contains_index.items()},
+    )
+
+
+def apply_mapping(
+    row: pd.Series,
+    mapping: Union[pd.DataFrame, MappingProgram, None],
+) -> Tuple[str, Optional[str]]:
+    """
+    通用映射逻辑：
+      - 按 priority 从小到大匹配
+      - 支持 equals / contains 两种模式
+      - 返回 (category, price_group_hint)
+    mapping 可以是原始 DataFrame（每次调用现编译），也可以是 compile_mapping 的结果（推荐）。
+    """
+    if not isinstance(mapping, MappingProgram):
+        mapping = compile_mapping(mapping)
+    return mapping.match(row)
 
 
 def _heuristic_detect_category_for_recorder(big: str) -> Tuple[str, Optional[str]]:
@@ -107,18 +213,20 @@ def _heuristic_detect_category_for_recorder(big: str) -> Tuple[str, Optional[str
     return "UNKNOWN", None
 
 
-def _build_big_text(france_row: Optional[pd.Series], sys_row: Optional[pd.Series]) -> str:
+def _build_big_text(france_row: Optional[RowLike], sys_row: Optional[RowLike]) -> str:
     parts = []
 
     if france_row is not None:
         for col in ("Internal Model", "External Model", "Series", "系列", "Description", "Second Product Line"):
-            if col in france_row and pd.notna(france_row[col]):
-                parts.append(str(france_row[col]))
+            v = row_text(france_row, col)
+            if v is not None:
+                parts.append(v)
 
     if sys_row is not None:
         for col in ("Internal Model", "External Model", "Second Product Line", "Catelog Name", "First Product Line"):
-            if col in sys_row and pd.notna(sys_row[col]):
-                parts.append(str(sys_row[col]))
+            v = row_text(sys_row, col)
+            if v is not None:
+                parts.append(v)
 
     return " ".join(parts)
 
@@ -143,8 +251,8 @@ def _is_turnstile_text(v) -> bool:
 
 
 def _forced_category_override(
-    france_row: Optional[pd.Series],
-    sys_row: Optional[pd.Series],
+    france_row: Optional[RowLike],
+    sys_row: Optional[RowLike],
 ) -> Optional[Tuple[str, str]]:
     """
     高优先级业务修正：
@@ -170,8 +278,9 @@ def _forced_category_override(
             "External Model",
             "Internal Model",
         ):
-            if col in france_row and pd.notna(france_row[col]):
-                fields.append(france_row[col])
+            v = row_text(france_row, col)
+            if v is not None:
+                fields.append(v)
 
     if sys_row is not None:
         for col in (
@@ -184,8 +293,9 @@ def _forced_category_override(
             "External Model",
             "Internal Model",
         ):
-            if col in sys_row and pd.notna(sys_row[col]):
-                fields.append(sys_row[col])
+            v = row_text(sys_row, col)
+            if v is not None:
+                fields.append(v)
 
     if any(_is_turnstile_text(v) for v in fields):
         return ("ACCESS CONTROL", "ACCESS CONTROL")
@@ -297,8 +407,8 @@ def _detect_nvr_pricing_group(big: str) -> str:
 
 
 def detect_series(
-    france_row: Optional[pd.Series],
-    sys_row: Optional[pd.Series],
+    france_row: Optional[RowLike],
+    sys_row: Optional[RowLike],
     price_group: Optional[str],
 ) -> Tuple[str, str]:
     """
@@ -307,13 +417,15 @@ def detect_series(
     series_display = ""
     if france_row is not None:
         for col in ("Series", "系列"):
-            if col in france_row and pd.notna(france_row[col]):
-                series_display = str(france_row[col]).strip()
+            v = row_text(france_row, col)
+            if v is not None:
+                series_display = v.strip()
                 break
     if not series_display and sys_row is not None:
         for col in ("Second Product Line", "Catelog Name"):
-            if col in sys_row and pd.notna(sys_row[col]):
-                series_display = str(sys_row[col]).strip()
+            v = row_text(sys_row, col)
+            if v is not None:
+                series_display = v.strip()
                 break
 
     series_key = ""
@@ -323,12 +435,14 @@ def detect_series(
         pieces = []
         if france_row is not None:
             for col in ("Series", "系列", "External Model", "Internal Model", "Description"):
-                if col in france_row and pd.notna(france_row[col]):
-                    pieces.append(str(france_row[col]))
+                v = row_text(france_row, col)
+                if v is not None:
+                    pieces.append(v)
         if sys_row is not None:
             for col in ("Internal Model", "External Model", "Second Product Line", "Catelog Name"):
-                if col in sys_row and pd.notna(sys_row[col]):
-                    pieces.append(str(sys_row[col]))
+                v = row_text(sys_row, col)
+                if v is not None:
+                    pieces.append(v)
         big = safe_upper(" ".join(pieces))
         series_key = _detect_ipc_series_key(big)
 
@@ -336,12 +450,14 @@ def detect_series(
         pieces = []
         if france_row is not None:
             for col in ("Internal Model", "External Model", "Series", "系列", "Description"):
-                if col in france_row and pd.notna(france_row[col]):
-                    pieces.append(str(france_row[col]))
+                v = row_text(france_row, col)
+                if v is not None:
+                    pieces.append(v)
         if sys_row is not None:
             for col in ("Internal Model", "External Model", "Second Product Line", "Catelog Name"):
-                if col in sys_row and pd.notna(sys_row[col]):
-                    pieces.append(str(sys_row[col]))
+                v = row_text(sys_row, col)
+                if v is not None:
+                    pieces.append(v)
         big = safe_upper(" ".join(pieces))
         series_key = _detect_ptz_series_key(big)
 
@@ -349,12 +465,14 @@ def detect_series(
         pieces = []
         if france_row is not None:
             for col in ("Internal Model", "External Model", "Series", "系列", "Description"):
-                if col in france_row and pd.notna(france_row[col]):
-                    pieces.append(str(france_row[col]))
+                v = row_text(france_row, col)
+                if v is not None:
+                    pieces.append(v)
         if sys_row is not None:
             for col in ("Internal Model", "External Model", "Second Product Line", "Catelog Name"):
-                if col in sys_row and pd.notna(sys_row[col]):
-                    pieces.append(str(sys_row[col]))
+                v = row_text(sys_row, col)
+                if v is not None:
+                    pieces.append(v)
         big = safe_upper(" ".join(pieces))
         series_key = _detect_nvr_pricing_group(big) or series_key
 
@@ -370,10 +488,10 @@ def detect_series(
 
 
 def classify_category_and_price_group(
-    france_row: Optional[pd.Series],
-    sys_row: Optional[pd.Series],
-    france_map: pd.DataFrame,
-    sys_map: pd.DataFrame,
+    france_row: Optional[RowLike],
+    sys_row: Optional[RowLike],
+    france_map: Union[pd.DataFrame, MappingProgram],
+    sys_map: Union[pd.DataFrame, MappingProgram],
 ) -> Tuple[str, Optional[str]]:
     """
     综合 France + Sys 两侧信息确定 category & price_group_hint。
@@ -0,0 +1,211 @@
+# backend/engine/core/keyword_index.py
+from __future__ import annotations
+
+import bisect
+import math
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+import pandas as pd
+
+from backend.engine.core.row_store import row_text
+from backend.engine.core.search_index import pick_col
+
+
+KEYWORD_MODEL_COLS = ("External Model", "Internal Model")
+# 预览候选 PN 的取列顺序（France / Sys 表头不同）
+FRANCE_PN_COLS = ("Part No.", "Part No", "Part Num", "PN", "P/N", "Part Number")
+SYS_PN_COLS = ("Part Num", "Part No.", "Part No", "PN", "P/N", "Part Number")
+
+_SEGMENT_SPLIT = re.compile(r"[^A-Z0-9]+")
+_END = ""  # trie 终止标记（单字符 key 不会与之冲突）
+
+
+@lru_cache(maxsize=65536)
+def model_text_keys(text: str) -> Tuple[str, ...]:
+    """
+    型号文本 -> 关键词前缀匹配用的 key：
+    每个 A-Z0-9 段本身，以及去掉 DHI / DH 前缀后的剩余部分。
+    关键词 kw 命中该文本 <=> 某个 key 以 kw 开头。
+    """
+    s = str(text or "").strip().upper()
+    keys: Dict[str, None] = {}
+    for segment in _SEGMENT_SPLIT.split(s):
+        if not segment:
+            continue
+        keys[segment] = None
+        if segment.startswith("DHI") and len(segment) > 3:
+            keys[segment[3:]] = None
+        if segment.startswith("DH") and len(segment) > 2:
+            keys[segment[2:]] = None
+    return tuple(keys)
+
+
+def merge_model_keys(parts: Iterable[Tuple[str, ...]]) -> Tuple[str, ...]:
+    keys: Dict[str, None] = {}
+    for p in parts:
+        for k in p:
+            keys[k] = None
+    return tuple(keys)
+
+
+def row_model_keys(row: Any) -> Tuple[str, ...]:
+    """单行（RowRecord / Series / dict）的 Internal / External Model key；NaN 不参与匹配。"""
+    if row is None:
+        return ()
+    texts = (row_text(row, c) for c in KEYWORD_MODEL_COLS)
+    return merge_model_keys(model_text_keys(t) for t in texts if t is not None)
+
+
+def build_row_model_keys(
+    df: pd.DataFrame,
+    previous: Optional[Sequence[Tuple[str, ...]]] = None,
+    prev_pos: Optional[Sequence[Optional[int]]] = None,
+) -> List[Tuple[str, ...]]:
+    """
+    load 时对每一行预先切好型号 key（与 row_model_keys 一致），相同结果共用同一个 tuple。
+    previous / prev_pos：增量 reload 时沿用内容未变行（prev_pos[i] 非 None）的旧结果。
+    """
+    if previous is not None and prev_pos is not None:
+        todo = [i for i, o in enumerate(prev_pos) if o is None]
+        fresh = iter(build_row_model_keys(df.iloc[todo])) if todo else iter(())
+        return [previous[o] if o is not None else next(fresh) for o in prev_pos]
+
+    cols = [df[c].tolist() for c in KEYWORD_MODEL_COLS if c in df.columns]
+    interned: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+    out: List[Tuple[str, ...]] = []
+    for r in range(len(df)):
+        keys = merge_model_keys(model_text_keys(str(vals[r])) for vals in cols if pd.notna(vals[r]))
+        out.append(interned.setdefault(keys, keys))
+    return out
+
+
+def _to_pct(v: Any) -> Optional[float]:
+    if v is None:
+        return None
+    try:
+        if isinstance(v, str):
+            v = v.strip()
+            if not v:
+                return None
+        f = float(v)
+        if math.isnan(f):
+            return None
+        return f
+    except Exception:  # noqa: BLE001
+        return None
+
+
+class KeywordMatcher:
+    """
+    编译后的关键词规则：rules 为已过滤的 (keyword, pct)，保持原规则顺序。
+    关键词按大写建 trie；每个型号 key 沿 trie 走一遍即可拿到它命中的全部关键词。
+    """
+
+    def __init__(self, rules: Sequence[Tuple[str, float]]):
+        self.rules: Tuple[Tuple[str, float], ...] = tuple(rules)
+        self._trie: Dict[str, Any] = {}
+        for kw, _pct in self.rules:
+            node = self._trie
+            for ch in kw.upper():
+                node = node.setdefault(ch, {})
+            node[_END] = kw.upper()
+
+    def hits(self, keys: Iterable[str]) -> Set[str]:
+        """命中的关键词（大写）集合。"""
+        found: Set[str] = set()
+        for key in keys:
+            node = self._trie
+            for ch in key:
+                node = node.get(ch)
+                if node is None:
+                    break
+                kw_up = node.get(_END)
+                if kw_up is not None:
+                    found.add(kw_up)
+        return found
+
+    def pick(self, keys: Iterable[str]) -> Tuple[List[str], float]:
+        """
+        返回 (hits, total_pct)：按规则顺序列出命中的关键词（大写去重，保留原写法），pct 相加。
+        """
+        if not self.rules:
+            return [], 0.0
+        matched = self.hits(keys)
+        hits: List[str] = []
+        total_pct = 0.0
+        seen: Set[str] = set()
+        for kw, pct in self.rules:
+            kw_up = kw.upper()
+            if kw_up not in matched or kw_up in seen:
+                continue
+            seen.add(kw_up)
+            total_pct += pct
+            hits.append(kw)
+        return hits, total_pct
+
+
+def compile_keyword_rules(rules: Iterable[Any]) -> KeywordMatcher:
+    """
+    关键词涨价规则 [{"keyword", "pct", "enabled"}] -> KeywordMatcher；
+    跳过 disabled / 空关键词 / pct <= 0 的规则，保持原顺序。
+    """
+    items: List[Tuple[str, float]] = []
+    for rule in rules:
+        if not isinstance(rule, Mapping):
+            continue
+        if rule.get("enabled", True) is False:
+            continue
+        kw = str(rule.get("keyword") or "").strip()
+        pct = _to_pct(rule.get("pct"))
+        if not kw or pct is None or pct <= 0:
+            continue
+        items.append((kw, pct))
+    return KeywordMatcher(items)
+
+
+@dataclass(frozen=True)
+class KeywordCandidateIndex:
+    """
+    关键词预览的候选 PN 索引：型号 key 升序（前缀用 bisect 取区间），postings[i] 为 keys[i] 所在行的 PN。
+    等价于按 key 前缀组织的 trie，但只存一份有序数组。
+    """
+    keys: List[str]
+    postings: List[Tuple[str, ...]]
+
+    def candidate_pns(self, keyword: str) -> List[str]:
+        kw = str(keyword or "").strip().upper()
+        if not kw:
+            return []
+        pns: Set[str] = set()
+        lo = bisect.bisect_left(self.keys, kw)
+        for i in range(lo, len(self.keys)):
+            if not self.keys[i].startswith(kw):
+                break
+            pns.update(self.postings[i])
+        return sorted(pns)
+
+
+def build_keyword_candidate_index(france_df: pd.DataFrame, sys_df: pd.DataFrame) -> KeywordCandidateIndex:
+    """
+    与逐行扫描的预览口径一致：型号单元格按 str(v or "") 取文本，PN 为 str(v or "").strip()，空 PN 跳过。
+    """
+    by_key: Dict[str, Set[str]] = {}
+    for df, pn_candidates in ((france_df, FRANCE_PN_COLS), (sys_df, SYS_PN_COLS)):
+        if df is None or not len(df.columns):
+            continue
+        pn_col = pick_col(df, pn_candidates)
+        pn_values = df[pn_col].tolist()
+        model_values = [df[c].tolist() for c in ("Internal Model", "External Model") if c in df.columns]
+        for r, pn_v in enumerate(pn_values):
+            pn = str(pn_v or "").strip()
+            if not pn:
+                continue
+            for values in model_values:
+                for key in model_text_keys(str(values[r] or "")):
+                    by_key.setdefault(key, set()).add(pn)
+
+    keys = sorted(by_key)
+    return KeywordCandidateIndex(keys=keys, postings=[tuple(by_key[k]) for k in keys])
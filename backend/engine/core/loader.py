@@ -1,13 +1,44 @@
 # backend/engine/core/loader.py
 from __future__ import annotations
 
+import hashlib
+import multiprocessing
+import pickle
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass
+from functools import cached_property
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Sequence, Set, Tuple
 
+import numpy as np
 import pandas as pd
 
+from backend.engine.core.catalog_delta import (
+    CatalogDiff,
+    TableDiff,
+    affected_base_keys,
+    diff_price_table,
+    external_index_columns,
+    full_reload_diff,
+    model_index_columns,
+    unchanged_table_diff,
+)
+from backend.engine.core.classifier import MappingProgram, compile_mapping
+from backend.engine.core.keyword_index import (
+    KeywordCandidateIndex,
+    build_keyword_candidate_index,
+    build_row_model_keys,
+)
+from backend.engine.core.row_store import RowTable, build_row_table, parse_price
+from backend.engine.core.search_index import (
+    ExternalModelIndex,
+    ModelSearchIndex,
+    build_external_model_index,
+    build_model_search_index,
+)
+
 
 def safe_upper(v) -> str:
     if v is None:
@@ -50,7 +81,7 @@ def normalize_pn_base(pn: str) -> str:
     return s
 
 
-def _read_excel_any(path: Path) -> pd.DataFrame:
+def _read_excel_any(path: Path, usecols: Optional[Callable[[Any], bool]] = None) -> pd.DataFrame:
     """
     按后缀选择引擎：
     - .xlsx / .xlsm -> openpyxl
@@ -58,20 +89,138 @@ def _read_excel_any(path: Path) -> pd.DataFrame:
     说明：
     - openpyxl 不支持 .xls（BIFF8 老格式）
     - xlrd 2.x 不支持 .xlsx
+    usecols：按表头名过滤列（见 PriceSheetSchema.wants），None 为全部列。
     """
     path = Path(path)
     suffix = path.suffix.lower()
 
     if suffix == ".xls":
         # 需要 xlrd（仅 .xls）
-        return pd.read_excel(path, engine="xlrd")
+        return pd.read_excel(path, engine="xlrd", usecols=usecols)
 
     if suffix in (".xlsx", ".xlsm"):
         # 强制使用 openpyxl（你的目标）
-        return pd.read_excel(path, engine="openpyxl")
+        return pd.read_excel(path, engine="openpyxl", usecols=usecols)
 
     # 兜底（理论上当前业务不会走到这里）
-    return pd.read_excel(path)
+    return pd.read_excel(path, usecols=usecols)
+
+
+# =========================
+# 价格表读取 schema：列投影 + 列类型
+# =========================
+# 定价 / 分类 / 检索按列名读取的文本列（两张表共用；PN 列另按 _is_pn_header 保留）
+_SHEET_TEXT_COLUMNS = (
+    "Internal Model",
+    "External Model",
+    "ExternalModel",
+    "Series",
+    "系列",
+    "Description",
+    "Sales Status",
+    "Release Status",
+    "Sales Type",
+    "First Product Line",
+    "Second Product Line",
+    "Catelog Name",
+    "Product Line",
+    "Product Line(CN)",
+    "First Level Product Category",
+    "Second Level Product Category",
+    "Product Name",
+    "Product Name(CN)",
+)
+_SYS_BASIS_PRICE_COLUMNS = ("Min Price", "Area Price")
+# 低基数文本列：转 categorical（tolist() 取回的仍是原来的 str / NaN）
+_SHEET_CATEGORY_COLUMNS = ("Sales Type", "First Product Line", "Second Product Line", "Series")
+# 列投影 / 类型规则变化时 +1（价格表快照随之失效）
+_SCHEMA_VERSION = 1
+
+
+def _is_pn_header(c: Any) -> bool:
+    """_pick_pn_column 可能选中的表头（精确 / 不区分大小写候选都满足这里的包含匹配）。"""
+    uc = str(c).strip().upper()
+    return ("PART" in uc and ("NO" in uc or "NUM" in uc)) or uc in ("PN", "P/N")
+
+
+@dataclass(frozen=True)
+class PriceSheetSchema:
+    """
+    一张价格表读入时的 schema：
+      - columns：保留的列（另加 PN 列）；按 strip + lower 匹配表头，与 pick_col 的不区分大小写一致
+      - price_columns：转 float64，取值与 pricing_engine._to_float 一致（无法解析为 NaN）
+      - category_columns：转 pandas categorical
+    其余列读表时直接丢弃。
+    """
+    source: str
+    columns: Tuple[str, ...]
+    price_columns: Tuple[str, ...]
+    category_columns: Tuple[str, ...]
+
+    def wants(self, col: Any) -> bool:
+        return str(col).strip().lower() in self._wanted or _is_pn_header(col)
+
+    @cached_property
+    def _wanted(self) -> FrozenSet[str]:
+        # 首次 wants() 时算一次，写进实例 __dict__（frozen dataclass 不拦截 cached_property）
+        return frozenset(str(c).strip().lower() for c in self.columns + self.price_columns)
+
+    def key(self) -> Dict[str, Any]:
+        """写进价格表快照指纹：列投影或类型规则变化时快照失效。"""
+        return {
+            "version": _SCHEMA_VERSION,
+            "columns": sorted(set(self.columns)),
+            "price_columns": list(self.price_columns),
+            "category_columns": list(self.category_columns),
+        }
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """已投影的 DataFrame 按列类型转换（原地替换列，返回同一个 df）。"""
+        for i, c in enumerate(df.columns):
+            if c in self.price_columns:
+                df.isetitem(i, _as_price_column(df.iloc[:, i]))
+            elif c in self.category_columns and not pd.api.types.is_numeric_dtype(df.iloc[:, i].dtype):
+                df.isetitem(i, df.iloc[:, i].astype("category"))
+        return df
+
+
+def _as_price_column(values: pd.Series) -> pd.Series:
+    if values.dtype == np.float64:
+        return values
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+        return values.astype(np.float64)
+    parsed = [parse_price(v) for v in values.tolist()]
+    return pd.Series([np.nan if f is None else f for f in parsed], index=values.index, dtype=np.float64)
+
+
+def price_sheet_schema(source: str, mapping_fields: Sequence[str] = ()) -> PriceSheetSchema:
+    """
+    source：france | sys。mapping_fields：两份 mapping 规则读取的列（MappingProgram.referenced_fields），
+    任一表都保留，mapping 改了列名也不会读不到。
+    """
+    # 延迟 import：pricing_engine 依赖 loader
+    from backend.engine.core.pricing_engine import PRICE_COLS
+
+    if source == "france":
+        price_columns: Tuple[str, ...] = tuple(PRICE_COLS)
+        columns = _SHEET_TEXT_COLUMNS + _SYS_BASIS_PRICE_COLUMNS
+    else:
+        price_columns = _SYS_BASIS_PRICE_COLUMNS
+        columns = _SHEET_TEXT_COLUMNS + tuple(PRICE_COLS)
+    extra = tuple(f for f in mapping_fields if f not in columns and f not in price_columns)
+    return PriceSheetSchema(
+        source=source,
+        columns=columns + extra,
+        price_columns=price_columns,
+        category_columns=_SHEET_CATEGORY_COLUMNS,
+    )
+
+
+def _mapping_fields(*programs: MappingProgram) -> Tuple[str, ...]:
+    out: Dict[str, None] = {}
+    for program in programs:
+        out.update(dict.fromkeys(program.referenced_fields()))
+    return tuple(out)
 
 
 def _pick_existing(*paths: Path) -> Path:
@@ -131,21 +280,281 @@ def _pick_pn_column(df: pd.DataFrame) -> str:
     raise ValueError("cannot find PN column in dataframe")
 
 
-def _build_index(df: pd.DataFrame) -> Tuple[Dict[str, int], Dict[str, int]]:
+def _pn_texts(values: pd.Series) -> Tuple[List[str], np.ndarray]:
+    """整列 PN -> (texts, na)：空值判断整列做一次，texts[i] = str(v)（空值为 ""）。"""
+    obj = values.to_numpy(dtype=object)
+    na = pd.isna(obj)
+    texts = ["" if n else str(v) for v, n in zip(obj.tolist(), na.tolist())]
+    return texts, na
+
+
+def _first_positions(
+    keys: List[str],
+    skip: Optional[np.ndarray] = None,
+    drop_empty: bool = False,
+) -> Dict[str, int]:
+    """key -> 首次出现的行号（按首次出现顺序）；skip 为 True 的行、drop_empty 时的空 key 不参与。"""
+    ser = pd.Series(keys, dtype=object)
+    if skip is not None:
+        ser = ser[~skip]
+    if drop_empty:
+        ser = ser[ser != ""]
+    ser = ser.drop_duplicates(keep="first")
+    return dict(zip(ser.tolist(), ser.index.tolist()))
+
+
+def _strip_base_suffix(s: str) -> str:
+    """_BASE_SUFFIX_RE 的等价写法：末尾 -xxxx（四位数字）截断。"""
+    if len(s) >= 5 and s[-5] == "-" and s[-4:].isdecimal() and "\n" not in s:
+        return s[:-5]
+    return s
+
+
+def _build_index(df: pd.DataFrame, pn_col: Optional[str] = None) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    raw / base PN -> 首次出现的行号，结果与逐个 normalize_pn_raw / normalize_pn_base 一致：
+    空值整列判断，去重交给 drop_duplicates(keep="first")。
+    """
+    if pn_col is None:
+        pn_col = _pick_pn_column(df)
+    texts, _na = _pn_texts(df[pn_col])
+    raw = [t.strip().upper() for t in texts]
+    base = [_strip_base_suffix(r.replace(" ", "")) for r in raw]
+    # 保留第一次出现的位置（避免重复 PN 乱跳）；空 key 不入索引
+    return _first_positions(raw, drop_empty=True), _first_positions(base, drop_empty=True)
+
+
+def _build_lower_pn_index(df: pd.DataFrame, pn_col: Optional[str] = None) -> Dict[str, int]:
+    """
+    lower PN -> 首次出现的行号，用于 base PN 补价（pricing_engine._fill_missing_prices_from_base）。
+    归一化方式与原先的整列比较保持一致：str(v).strip().lower()；空值不入索引。
+    """
+    if pn_col is None:
+        try:
+            pn_col = _pick_pn_column(df)
+        except ValueError:
+            return {}
+    texts, na = _pn_texts(df[pn_col])
+    return _first_positions([t.strip().lower() for t in texts], na)
+
+
+# =========================
+# 价格表二进制快照（跳过 openpyxl / xlrd 重新解析）
+# =========================
+# 快照放在价格表旁边：runtime/data/.FrancePrice.xlsx.snapshot.pkl
+# key = 文件大小 + mtime + 内容 sha256（+ 快照格式版本 / pandas 版本 / 读表 schema），任一变化即重建。
+_SNAPSHOT_VERSION = 3
+
+
+def _snapshot_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.snapshot.pkl")
+
+
+def _file_fingerprint(path: Path) -> Dict[str, Any]:
+    st = path.stat()
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return {
+        "snapshot_version": _SNAPSHOT_VERSION,
+        "pandas_version": pd.__version__,
+        "size": int(st.st_size),
+        "mtime_ns": int(st.st_mtime_ns),
+        "sha256": h.hexdigest(),
+    }
+
+
+def _read_snapshot(snap: Path, fingerprint: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if not snap.exists():
+        return None
+    try:
+        with snap.open("rb") as f:
+            payload = pickle.load(f)
+    except Exception:  # noqa: BLE001
+        # 快照损坏 / pandas 升级后不兼容：当作未命中，重新解析源文件
+        return None
+    if not isinstance(payload, dict) or payload.get("fingerprint") != fingerprint:
+        return None
+    return payload
+
+
+def _write_snapshot(snap: Path, payload: Dict[str, Any]) -> None:
+    tmp = snap.with_suffix(snap.suffix + ".tmp")
+    try:
+        with tmp.open("wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(snap)
+    except Exception:  # noqa: BLE001
+        # 只读目录等情况：快照只是加速手段，写失败不影响加载
+        try:
+            tmp.unlink()
+        except Exception:  # noqa: BLE001
+            pass
+
+
+def _price_table_fingerprint(path: Path, schema: PriceSheetSchema) -> Dict[str, Any]:
+    """价格表指纹 = 文件指纹 + 读表 schema（同一文件换了投影列也要重读）。"""
+    return {**_file_fingerprint(path), "schema": schema.key()}
+
+
+# _load_price_table 的返回：(df, idx_raw, idx_base, idx_lower, fingerprint, snapshot_hit)
+PriceTableLoad = Tuple[pd.DataFrame, Dict[str, int], Dict[str, int], Dict[str, int], Dict[str, Any], bool]
+
+
+def _parse_price_table(path: Path, schema: PriceSheetSchema, fingerprint: Dict[str, Any]) -> PriceTableLoad:
+    """解析 Excel + 建索引 + 写快照（快照未命中时）。"""
+    df = schema.apply(_read_excel_any(path, usecols=schema.wants))
     pn_col = _pick_pn_column(df)
-    raw_map: Dict[str, int] = {}
-    base_map: Dict[str, int] = {}
+    idx_raw, idx_base = _build_index(df, pn_col)
+    idx_lower = _build_lower_pn_index(df, pn_col)
+    _write_snapshot(
+        _snapshot_path(path),
+        {
+            "fingerprint": fingerprint,
+            "df": df,
+            "idx_raw": idx_raw,
+            "idx_base": idx_base,
+            "idx_lower": idx_lower,
+        },
+    )
+    return df, idx_raw, idx_base, idx_lower, fingerprint, False
+
+
+def _snapshot_load(cached: Dict[str, Any], fingerprint: Dict[str, Any]) -> PriceTableLoad:
+    return cached["df"], cached["idx_raw"], cached["idx_base"], cached["idx_lower"], fingerprint, True
 
-    for i, v in enumerate(df[pn_col].tolist()):
-        r = normalize_pn_raw(v)
-        b = normalize_pn_base(v)
-        # 保留第一次出现的位置（避免重复 PN 乱跳）
-        if r and r not in raw_map:
-            raw_map[r] = i
-        if b and b not in base_map:
-            base_map[b] = i
 
-    return raw_map, base_map
+def _load_price_table(
+    path: Path,
+    schema: PriceSheetSchema,
+    fingerprint: Optional[Dict[str, Any]] = None,
+) -> PriceTableLoad:
+    """
+    按 schema 读取价格表（只读需要的列并转好类型）+ 建索引；源文件未变化时直接复用快照。
+    fingerprint：调用方已算好的 _price_table_fingerprint(path, schema)。
+    """
+    if fingerprint is None:
+        fingerprint = _price_table_fingerprint(path, schema)
+    cached = _read_snapshot(_snapshot_path(path), fingerprint)
+    if cached is not None:
+        return _snapshot_load(cached, fingerprint)
+    return _parse_price_table(path, schema, fingerprint)
+
+
+def _timed_parse_price_table(
+    path: Path, schema: PriceSheetSchema, fingerprint: Dict[str, Any]
+) -> Tuple[PriceTableLoad, float]:
+    """进程池入口：返回 (_parse_price_table 结果, 子进程内耗时秒)。"""
+    t0 = time.perf_counter()
+    out = _parse_price_table(path, schema, fingerprint)
+    return out, time.perf_counter() - t0
+
+
+def _load_price_tables(
+    jobs: Sequence[Tuple[str, Path, PriceSheetSchema, Dict[str, Any]]],
+    workers: int = 1,
+) -> Iterator[Tuple[str, PriceTableLoad, float]]:
+    """
+    jobs：(source, path, schema, fingerprint)。按完成顺序产出 (source, _load_price_table 结果, 耗时秒)，
+    调用方可以先处理先到的表。
+    快照命中的表在本进程直接读；需要解析 Excel 的表有两张以上且 workers > 1 时交给进程池并行解析
+    （openpyxl / xlrd 解析持有 GIL，线程池并行不了）。与批量分片一致用 fork，子进程不重新 import。
+    """
+    hits: List[Tuple[str, PriceTableLoad, float]] = []
+    misses: List[Tuple[str, Path, PriceSheetSchema, Dict[str, Any]]] = []
+    for source, path, schema, fingerprint in jobs:
+        t0 = time.perf_counter()
+        cached = _read_snapshot(_snapshot_path(path), fingerprint)
+        if cached is None:
+            misses.append((source, path, schema, fingerprint))
+        else:
+            hits.append((source, _snapshot_load(cached, fingerprint), time.perf_counter() - t0))
+
+    if len(misses) < 2 or workers < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        yield from hits
+        for source, path, schema, fingerprint in misses:
+            out, seconds = _timed_parse_price_table(path, schema, fingerprint)
+            yield source, out, seconds
+        return
+
+    # 先把解析交给子进程，再在本进程处理快照命中的表
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(misses)),
+        mp_context=multiprocessing.get_context("fork"),
+    ) as pool:
+        futures = {
+            pool.submit(_timed_parse_price_table, path, schema, fingerprint): source
+            for source, path, schema, fingerprint in misses
+        }
+        yield from hits
+        for fut in as_completed(futures):
+            out, seconds = fut.result()
+            yield futures[fut], out, seconds
+
+
+# =========================
+# 逐行预计算的自动分类列（category / price_group / series_display / series_key）
+# =========================
+# 只依赖价格表行 + mapping + 分类代码本身；快照 key 包含这几者的指纹，
+# mapping 或价格表变化时才重新计算。
+_CLASSIFICATION_SNAPSHOT_NAME = ".classification.snapshot.pkl"
+
+
+def _code_fingerprint() -> str:
+    """
+    分类链路代码（classifier / pricing_engine）的内容哈希：代码升级后旧快照自动失效。
+    """
+    core_dir = Path(__file__).resolve().parent
+    h = hashlib.sha256()
+    for name in ("classifier.py", "pricing_engine.py", "row_store.py"):
+        try:
+            h.update((core_dir / name).read_bytes())
+        except Exception:  # noqa: BLE001
+            h.update(name.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _attach_auto_classification(
+    bundle: "DataBundle",
+    data_dir: Path,
+    price_fingerprints: Dict[str, Any],
+    previous: Optional["DataBundle"] = None,
+    prev_pos: Optional[Tuple[Sequence[Optional[int]], Sequence[Optional[int]]]] = None,
+) -> None:
+    """previous / prev_pos：增量 reload 时沿用旧 bundle 中未变化行的结果（见 build_auto_classification）。"""
+    # 延迟 import：pricing_engine 依赖本模块的 DataBundle
+    from backend.engine.core.pricing_engine import build_auto_classification
+
+    fingerprint = {
+        "code": _code_fingerprint(),
+        "prices": price_fingerprints,
+        "map_fr": _file_fingerprint(bundle.map_fr_path),
+        "map_sys": _file_fingerprint(bundle.map_sys_path),
+    }
+    snap = data_dir / _CLASSIFICATION_SNAPSHOT_NAME
+    cached = _read_snapshot(snap, fingerprint)
+    if cached is not None:
+        bundle.fr_auto_class = cached["fr_auto_class"]
+        bundle.fr_auto_class_sys_pos = cached["fr_auto_class_sys_pos"]
+        bundle.sys_auto_class = cached["sys_auto_class"]
+        return
+
+    fr_auto_class, fr_auto_class_sys_pos, sys_auto_class = build_auto_classification(
+        bundle, previous=previous, prev_pos=prev_pos
+    )
+    bundle.fr_auto_class = fr_auto_class
+    bundle.fr_auto_class_sys_pos = fr_auto_class_sys_pos
+    bundle.sys_auto_class = sys_auto_class
+    _write_snapshot(
+        snap,
+        {
+            "fingerprint": fingerprint,
+            "fr_auto_class": fr_auto_class,
+            "fr_auto_class_sys_pos": fr_auto_class_sys_pos,
+            "sys_auto_class": sys_auto_class,
+        },
+    )
 
 
 @dataclass
@@ -154,6 +563,9 @@ class DataBundle:
     sys_df: pd.DataFrame
     map_fr: pd.DataFrame
     map_sys: pd.DataFrame
+    # 编译后的 mapping（classifier.compile_mapping），分类时使用
+    map_fr_program: Optional[MappingProgram] = None
+    map_sys_program: Optional[MappingProgram] = None
 
     france_price_path: Optional[Path] = None
     sys_price_path: Optional[Path] = None
@@ -164,50 +576,339 @@ class DataBundle:
     fr_idx_base: Dict[str, int] = None
     sys_idx_raw: Dict[str, int] = None
     sys_idx_base: Dict[str, int] = None
+    # lower PN -> 行号（base PN 补价用）
+    fr_idx_lower: Dict[str, int] = None
+    sys_idx_lower: Dict[str, int] = None
+
+    # 自动分类结果（无 force_* 时直接读取）：
+    #   fr_auto_class[i]         = France 第 i 行与其同 PN 的 Sys 行（fr_auto_class_sys_pos[i]）配对时的结果
+    #   sys_auto_class[j]        = 仅命中 Sys 第 j 行（France 无行）时的结果
+    # 元素为 (category, price_group, series_display, series_key)
+    fr_auto_class: Optional[List[Tuple[str, Optional[str], str, str]]] = None
+    fr_auto_class_sys_pos: Optional[List[Optional[int]]] = None
+    sys_auto_class: Optional[List[Tuple[str, Optional[str], str, str]]] = None
+
+    fr_snapshot_hit: bool = False
+    sys_snapshot_hit: bool = False
+
+    # Internal / External Model 检索索引（/api/models/search）
+    model_search: Optional[ModelSearchIndex] = None
+    # External Model -> 同型号 PN 列表 / France 锚定价（cluster 接口与批量锚定）
+    external_models: Optional[ExternalModelIndex] = None
+    # 关键词涨价：每行预切好的型号 key（定价匹配用）/ 型号 key -> PN（预览候选）
+    fr_model_keys: Optional[List[Tuple[str, ...]]] = None
+    sys_model_keys: Optional[List[Tuple[str, ...]]] = None
+    keyword_candidates: Optional[KeywordCandidateIndex] = None
+    # 按行的紧凑记录（定价 / 分类热路径读这里，不再 df.iloc）
+    fr_rows: Optional[RowTable] = None
+    sys_rows: Optional[RowTable] = None
+
+    # 价格表指纹（_price_table_fingerprint），增量 reload 时判断文件是否变化
+    fr_fingerprint: Optional[Dict[str, Any]] = None
+    sys_fingerprint: Optional[Dict[str, Any]] = None
+
+    # 各阶段耗时（秒）：mapping / france / sys（读快照或解析）/ *_rows / indexes / classification
+    load_timings: Optional[Dict[str, float]] = None
+
+    # engine 换入时写入：数据版本号（每换一份 +1）/ 构建完成时间 / 构建耗时
+    generation: int = 0
+    loaded_at: Optional[float] = None
+    load_seconds: Optional[float] = None
+
+
+def attach_row_tables(
+    bundle: DataBundle,
+    previous: Optional[DataBundle] = None,
+    prev_pos: Optional[Tuple[Sequence[Optional[int]], Sequence[Optional[int]]]] = None,
+) -> None:
+    # 延迟 import：pricing_engine 依赖 loader
+    from backend.engine.core.pricing_engine import PRICE_COLS
+
+    if previous is None or prev_pos is None:
+        bundle.fr_rows = build_row_table(bundle.france_df, PRICE_COLS)
+        bundle.sys_rows = build_row_table(bundle.sys_df, PRICE_COLS)
+        return
+    bundle.fr_rows = build_row_table(bundle.france_df, PRICE_COLS, previous=previous.fr_rows, prev_pos=prev_pos[0])
+    bundle.sys_rows = build_row_table(bundle.sys_df, PRICE_COLS, previous=previous.sys_rows, prev_pos=prev_pos[1])
+
+
+def _attach_external_model_index(bundle: DataBundle) -> None:
+    # 延迟 import：pricing_engine 依赖 loader
+    from backend.engine.core.pricing_engine import PRICE_COLS
+
+    bundle.external_models = build_external_model_index(
+        bundle.france_df,
+        bundle.sys_df,
+        price_cols=PRICE_COLS,
+        pn_key=normalize_pn_raw,
+    )
+
+
+_FRANCE_PRICE_NAMES = ("FrancePrice.xlsx", "FrancePrice.xls")
+_SYS_PRICE_NAMES = ("SysPrice.xls", "SysPrice.xlsx")
+_MAP_FR_NAME = "productline_map_france_full.csv"
+_MAP_SYS_NAME = "productline_map_sys_full.csv"
 
 
-def load_all_data(data_dir: Path) -> DataBundle:
+def source_signature(data_dir: Path) -> Tuple[Tuple[str, Optional[int], Optional[int]], ...]:
+    """
+    load_all_data 会读取的全部候选文件的 (路径, 大小, mtime_ns)，不存在为 (路径, None, None)。
+    只做 stat，用于轮询发现价格表 / mapping 被替换。
+    """
+    data_dir = Path(data_dir)
+    mapping_dir = data_dir.parent / "mapping"
+    paths = [data_dir / n for n in _FRANCE_PRICE_NAMES + _SYS_PRICE_NAMES]
+    paths += [mapping_dir / _MAP_FR_NAME, mapping_dir / _MAP_SYS_NAME]
+    out = []
+    for p in paths:
+        try:
+            st = p.stat()
+            out.append((str(p), int(st.st_size), int(st.st_mtime_ns)))
+        except OSError:
+            out.append((str(p), None, None))
+    return tuple(out)
+
+
+def _source_paths(data_dir: Path) -> Tuple[Path, Path, Path, Path]:
+    """(France 价格表, Sys 价格表, France mapping, Sys mapping)；缺文件时抛 FileNotFoundError。"""
+    mapping_dir = data_dir.parent / "mapping"
+
+    france_path = _pick_existing(*(data_dir / n for n in _FRANCE_PRICE_NAMES))
+    sys_path = _pick_existing(*(data_dir / n for n in _SYS_PRICE_NAMES))
+
+    map_fr_path = mapping_dir / _MAP_FR_NAME
+    map_sys_path = mapping_dir / _MAP_SYS_NAME
+    if not map_fr_path.exists():
+        raise FileNotFoundError(f"mapping file missing: {map_fr_path}")
+    if not map_sys_path.exists():
+        raise FileNotFoundError(f"mapping file missing: {map_sys_path}")
+    return france_path, sys_path, map_fr_path, map_sys_path
+
+
+# load_all_data 的阶段（progress 回调在每个阶段完成时收到其名字；france / sys 按解析完成的先后）
+LOAD_STAGES = ("mapping", "france", "sys", "indexes", "classification")
+
+
+def load_all_data(
+    data_dir: Path,
+    workers: int = 1,
+    progress: Optional[Callable[[str], None]] = None,
+) -> DataBundle:
     """
     约定（你当前 runtime 结构）：
       runtime_dir/data/FrancePrice.xlsx 或 FrancePrice.xls
       runtime_dir/data/SysPrice.xls 或 SysPrice.xlsx
       runtime_dir/mapping/productline_map_france_full.csv
       runtime_dir/mapping/productline_map_sys_full.csv
+
+    价格表解析结果会缓存为同目录下的快照（见 _load_price_table），
+    源文件未变化时重启不再走 openpyxl / xlrd。
+    workers > 1 时两张表的 Excel 解析在进程池里并行（见 _load_price_tables）；
+    每张表一到就先建它自己的逐行数据，两张都到后再建跨表索引与自动分类。
+    progress：见 LOAD_STAGES。
     """
+    # 延迟 import：pricing_engine 依赖 loader
+    from backend.engine.core.pricing_engine import PRICE_COLS
+
     data_dir = Path(data_dir)
-    runtime_dir = data_dir.parent
-    mapping_dir = runtime_dir / "mapping"
+    france_path, sys_path, map_fr_path, map_sys_path = _source_paths(data_dir)
+    timings: Dict[str, float] = {}
 
-    france_path = _pick_existing(
-        data_dir / "FrancePrice.xlsx",
-        data_dir / "FrancePrice.xls",
+    # mapping 先读（很小）：规则引用的列要进价格表的投影
+    t0 = time.perf_counter()
+    map_fr = pd.read_csv(map_fr_path)
+    map_sys = pd.read_csv(map_sys_path)
+    map_fr_program = compile_mapping(map_fr)
+    map_sys_program = compile_mapping(map_sys)
+    mapping_fields = _mapping_fields(map_fr_program, map_sys_program)
+    timings["mapping"] = time.perf_counter() - t0
+    if progress is not None:
+        progress("mapping")
+
+    jobs = []
+    for source, path in (("france", france_path), ("sys", sys_path)):
+        schema = price_sheet_schema(source, mapping_fields)
+        jobs.append((source, path, schema, _price_table_fingerprint(path, schema)))
+
+    tables: Dict[str, PriceTableLoad] = {}
+    rows: Dict[str, RowTable] = {}
+    model_keys: Dict[str, List[Tuple[str, ...]]] = {}
+    for source, table, seconds in _load_price_tables(jobs, workers):
+        timings[source] = seconds
+        t0 = time.perf_counter()
+        tables[source] = table
+        rows[source] = build_row_table(table[0], PRICE_COLS)
+        model_keys[source] = build_row_model_keys(table[0])
+        timings[f"{source}_rows"] = time.perf_counter() - t0
+        if progress is not None:
+            progress(source)
+
+    france_df, fr_idx_raw, fr_idx_base, fr_idx_lower, fr_fp, fr_snapshot_hit = tables["france"]
+    sys_df, sys_idx_raw, sys_idx_base, sys_idx_lower, sys_fp, sys_snapshot_hit = tables["sys"]
+
+    t0 = time.perf_counter()
+    bundle = DataBundle(
+        france_df=france_df,
+        sys_df=sys_df,
+        map_fr=map_fr,
+        map_sys=map_sys,
+        map_fr_program=map_fr_program,
+        map_sys_program=map_sys_program,
+        france_price_path=france_path,
+        sys_price_path=sys_path,
+        map_fr_path=map_fr_path,
+        map_sys_path=map_sys_path,
+        fr_idx_raw=fr_idx_raw,
+        fr_idx_base=fr_idx_base,
+        sys_idx_raw=sys_idx_raw,
+        sys_idx_base=sys_idx_base,
+        fr_idx_lower=fr_idx_lower,
+        sys_idx_lower=sys_idx_lower,
+        fr_snapshot_hit=fr_snapshot_hit,
+        sys_snapshot_hit=sys_snapshot_hit,
+        fr_fingerprint=fr_fp,
+        sys_fingerprint=sys_fp,
+        model_search=build_model_search_index([("france", france_df), ("sys", sys_df)]),
+        fr_model_keys=model_keys["france"],
+        sys_model_keys=model_keys["sys"],
+        keyword_candidates=build_keyword_candidate_index(france_df, sys_df),
+        fr_rows=rows["france"],
+        sys_rows=rows["sys"],
     )
+    _attach_external_model_index(bundle)
+    timings["indexes"] = time.perf_counter() - t0
+    if progress is not None:
+        progress("indexes")
+
+    t0 = time.perf_counter()
+    _attach_auto_classification(bundle, data_dir, {"france": fr_fp, "sys": sys_fp})
+    timings["classification"] = time.perf_counter() - t0
+    if progress is not None:
+        progress("classification")
+    bundle.load_timings = {k: round(v, 4) for k, v in timings.items()}
+    return bundle
+
+
+def _price_table_unchanged(old_fp: Optional[Dict[str, Any]], fingerprint: Dict[str, Any]) -> bool:
+    """内容（sha256）与读表 schema 都没变：整表沿用旧 DataFrame / 索引。"""
+    return (
+        old_fp is not None
+        and old_fp.get("sha256") == fingerprint["sha256"]
+        and old_fp.get("schema") == fingerprint["schema"]
+    )
+
 
-    sys_path = _pick_existing(
-        data_dir / "SysPrice.xls",
-        data_dir / "SysPrice.xlsx",
+def _diff_price_table_load(
+    source: str,
+    loaded: PriceTableLoad,
+    old_df: pd.DataFrame,
+    old_indexes: Tuple[Dict[str, int], Dict[str, int], Dict[str, int]],
+) -> Optional[Tuple[pd.DataFrame, Tuple[Dict[str, int], Dict[str, int], Dict[str, int]], Dict[str, Any], bool, TableDiff, Set[str]]]:
+    """
+    新读入的价格表与旧版本逐行对比。
+    返回 (df, (idx_raw, idx_base, idx_lower), fingerprint, snapshot_hit, diff, affected_bases)；
+    列结构变化（无法增量）时返回 None。
+    """
+    df, idx_raw, idx_base, idx_lower, fingerprint, snapshot_hit = loaded
+    if list(df.columns) != list(old_df.columns):
+        return None
+    pn_col = _pick_pn_column(df)
+    old_texts, _ = _pn_texts(old_df[_pick_pn_column(old_df)])
+    new_texts, _ = _pn_texts(df[pn_col])
+    diff = diff_price_table(source, old_df, old_texts, df, new_texts)
+    new_indexes = (idx_raw, idx_base, idx_lower)
+    affected = affected_base_keys(
+        diff,
+        normalize_base=normalize_pn_base,
+        old_indexes=old_indexes,
+        new_indexes=new_indexes,
     )
+    return df, new_indexes, fingerprint, snapshot_hit, diff, affected
 
-    map_fr_path = mapping_dir / "productline_map_france_full.csv"
-    map_sys_path = mapping_dir / "productline_map_sys_full.csv"
-    if not map_fr_path.exists():
-        raise FileNotFoundError(f"mapping file missing: {map_fr_path}")
-    if not map_sys_path.exists():
-        raise FileNotFoundError(f"mapping file missing: {map_sys_path}")
 
-    france_df = _read_excel_any(france_path)
-    sys_df = _read_excel_any(sys_path)
-    map_fr = pd.read_csv(map_fr_path)
-    map_sys = pd.read_csv(map_sys_path)
+def load_all_data_delta(
+    previous: Optional[DataBundle], data_dir: Path, workers: int = 1
+) -> Tuple[DataBundle, CatalogDiff]:
+    """
+    增量 reload：新价格表与 previous 按 PN + 整行哈希逐行对比，
+    只对新增 / 变化的行重算逐行派生数据（RowRecord、型号 key、自动分类），其余行沿用旧结果；
+    型号检索 / 关键词候选 / External Model 索引在其读取的列没有变化时整份沿用。
+    结果与 load_all_data(data_dir) 一致；mapping 或表头变化等无法增量的情况直接走 load_all_data。
+    返回 (bundle, diff)，diff.affected_bases 为结果可能变化的查询 base key。
+    workers：两张表都需要重新解析时的并行进程数（同 load_all_data）。
+    """
+    # 延迟 import：pricing_engine 依赖 loader
+    from backend.engine.core.pricing_engine import PRICE_COLS
 
-    fr_idx_raw, fr_idx_base = _build_index(france_df)
-    sys_idx_raw, sys_idx_base = _build_index(sys_df)
+    data_dir = Path(data_dir)
+    if previous is None or previous.fr_rows is None or previous.sys_rows is None:
+        return load_all_data(data_dir, workers), full_reload_diff("no previous data")
 
-    return DataBundle(
+    france_path, sys_path, map_fr_path, map_sys_path = _source_paths(data_dir)
+    t0 = time.perf_counter()
+    map_fr = pd.read_csv(map_fr_path)
+    map_sys = pd.read_csv(map_sys_path)
+    if not (map_fr.equals(previous.map_fr) and map_sys.equals(previous.map_sys)):
+        return load_all_data(data_dir, workers), full_reload_diff("mapping changed")
+
+    mapping_fields = _mapping_fields(previous.map_fr_program, previous.map_sys_program)
+    old_tables = {
+        "france": (
+            previous.france_df,
+            previous.fr_fingerprint,
+            (previous.fr_idx_raw, previous.fr_idx_base, previous.fr_idx_lower),
+        ),
+        "sys": (
+            previous.sys_df,
+            previous.sys_fingerprint,
+            (previous.sys_idx_raw, previous.sys_idx_base, previous.sys_idx_lower),
+        ),
+    }
+    timings: Dict[str, float] = {"mapping": time.perf_counter() - t0}
+    loaded: Dict[str, Any] = {}
+    jobs = []
+    for source, path in (("france", france_path), ("sys", sys_path)):
+        schema = price_sheet_schema(source, mapping_fields)
+        fingerprint = _price_table_fingerprint(path, schema)
+        old_df, old_fp, old_indexes = old_tables[source]
+        if _price_table_unchanged(old_fp, fingerprint):
+            loaded[source] = (old_df, old_indexes, fingerprint, True, unchanged_table_diff(source, len(old_df)), set())
+        else:
+            jobs.append((source, path, schema, fingerprint))
+    for source, table, seconds in _load_price_tables(jobs, workers):
+        timings[source] = seconds
+        old_df, _old_fp, old_indexes = old_tables[source]
+        loaded[source] = _diff_price_table_load(source, table, old_df, old_indexes)
+    if loaded["france"] is None or loaded["sys"] is None:
+        return load_all_data(data_dir, workers), full_reload_diff("price table columns changed")
+
+    france_df, (fr_idx_raw, fr_idx_base, fr_idx_lower), fr_fp, fr_snapshot_hit, fr_diff, fr_affected = loaded["france"]
+    sys_df, (sys_idx_raw, sys_idx_base, sys_idx_lower), sys_fp, sys_snapshot_hit, sys_diff, sys_affected = loaded["sys"]
+    prev_pos = (fr_diff.prev_pos, sys_diff.prev_pos)
+
+    t0 = time.perf_counter()
+    reused: List[str] = []
+    models_touched = fr_diff.columns_touched(model_index_columns(france_df, source="france")) or (
+        sys_diff.columns_touched(model_index_columns(sys_df, source="sys"))
+    )
+    model_search = previous.model_search
+    keyword_candidates = previous.keyword_candidates
+    if models_touched or model_search is None:
+        model_search = build_model_search_index([("france", france_df), ("sys", sys_df)])
+    else:
+        reused.append("model_search")
+    if models_touched or keyword_candidates is None:
+        keyword_candidates = build_keyword_candidate_index(france_df, sys_df)
+    else:
+        reused.append("keyword_candidates")
+
+    bundle = DataBundle(
         france_df=france_df,
         sys_df=sys_df,
-        map_fr=map_fr,
-        map_sys=map_sys,
+        map_fr=previous.map_fr,
+        map_sys=previous.map_sys,
+        map_fr_program=previous.map_fr_program,
+        map_sys_program=previous.map_sys_program,
         france_price_path=france_path,
         sys_price_path=sys_path,
         map_fr_path=map_fr_path,
@@ -216,7 +917,42 @@ def load_all_data(data_dir: Path) -> DataBundle:
         fr_idx_base=fr_idx_base,
         sys_idx_raw=sys_idx_raw,
         sys_idx_base=sys_idx_base,
+        fr_idx_lower=fr_idx_lower,
+        sys_idx_lower=sys_idx_lower,
+        fr_snapshot_hit=fr_snapshot_hit,
+        sys_snapshot_hit=sys_snapshot_hit,
+        fr_fingerprint=fr_fp,
+        sys_fingerprint=sys_fp,
+        model_search=model_search,
+        fr_model_keys=build_row_model_keys(france_df, previous.fr_model_keys, fr_diff.prev_pos),
+        sys_model_keys=build_row_model_keys(sys_df, previous.sys_model_keys, sys_diff.prev_pos),
+        keyword_candidates=keyword_candidates,
+    )
+    external_touched = fr_diff.columns_touched(
+        external_index_columns(france_df, source="france", price_cols=PRICE_COLS)
+    ) or sys_diff.columns_touched(external_index_columns(sys_df, source="sys", price_cols=PRICE_COLS))
+    if external_touched or previous.external_models is None:
+        _attach_external_model_index(bundle)
+    else:
+        bundle.external_models = previous.external_models
+        reused.append("external_models")
+    attach_row_tables(bundle, previous, prev_pos)
+    timings["indexes"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    _attach_auto_classification(bundle, data_dir, {"france": fr_fp, "sys": sys_fp}, previous, prev_pos)
+    timings["classification"] = time.perf_counter() - t0
+    bundle.load_timings = {k: round(v, 4) for k, v in timings.items()}
+
+    diff = CatalogDiff(
+        mode="delta",
+        reason=None,
+        france=fr_diff,
+        sys=sys_diff,
+        affected_bases=frozenset(fr_affected | sys_affected),
+        reused=tuple(reused),
     )
+    return bundle, diff
 
 
 def parse_pn_list_file(path: Path) -> List[str]:
@@ -0,0 +1,133 @@
+# backend/engine/core/metrics.py
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+
+# Prometheus 文本格式（/metrics 的 Content-Type）
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 接口 / 整单耗时（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# compute_one 单个阶段（秒）：多为微秒级
+STAGE_BUCKETS = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1,
+)
+
+Labels = Tuple[str, ...]
+
+
+def _format_value(v: float) -> str:
+    if math.isnan(v):
+        return "NaN"
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    if float(v).is_integer() and abs(v) < 1e15:
+        return str(int(v))
+    return repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(pairs: Iterable[Tuple[str, str]]) -> str:
+    body = ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs)
+    return "{" + body + "}" if body else ""
+
+
+def metric_lines(
+    name: str,
+    kind: str,
+    help_text: str,
+    samples: Iterable[Tuple[Mapping[str, str], Optional[float]]],
+) -> List[str]:
+    """
+    一个指标族的文本：# HELP / # TYPE 加上每个 (labels, value) 样本；value 为 None 的样本跳过。
+    用于采集时现取的 gauge / counter（如 DataBundle 行数、QueryResultCache.stats()）。
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if value is None:
+            continue
+        lines.append(f"{name}{_label_text(labels.items())} {_format_value(float(value))}")
+    return lines
+
+
+class Counter:
+    """只增计数器，按 labelnames 顺序传 label 值；线程安全。"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return metric_lines(
+            self.name,
+            "counter",
+            self.help_text,
+            ((dict(zip(self.labelnames, labels)), v) for labels, v in items),
+        )
+
+
+class Histogram:
+    """
+    累积分桶直方图（le 上界含等号，末尾 +Inf），按 labelnames 顺序传 label 值；线程安全。
+    每组 label 存 [各桶计数..., +Inf 计数] 与 sum，render 时再累加成 Prometheus 的累计桶。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        self._lock = threading.Lock()
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0.0
+            counts[i] += 1
+            self._sums[labels] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, list(counts), self._sums[labels]) for labels, counts in self._counts.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total in items:
+            pairs = list(zip(self.labelnames, labels))
+            acc = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                acc += n
+                le = _label_text(pairs + [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{le} {acc}")
+            lines.append(f"{self.name}_sum{_label_text(pairs)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_label_text(pairs)} {acc}")
+        return lines
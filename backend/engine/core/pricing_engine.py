@@ -3,13 +3,24 @@ from __future__ import annotations
 
 import math
 import re
-from typing import Any, Dict, List, Optional, Set, Tuple
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
-from backend.engine.core.classifier import classify_category_and_price_group, detect_series
-from backend.engine.core.loader import DataBundle, normalize_pn_base, normalize_pn_raw
+from backend.engine.core.classifier import (
+    MappingProgram,
+    classify_category_and_price_group,
+    detect_series,
+)
+from backend.engine.core.keyword_index import merge_model_keys, row_model_keys
+from backend.engine.core.loader import DataBundle, attach_row_tables, normalize_pn_base, normalize_pn_raw
+from backend.engine.core.row_store import RowLike, RowRecord, RowTable, row_text
 from backend.engine.core.pricing_rules import DDP_RULES, PRICE_RULES
+from backend.engine.core.rule_set import RuleRegistry, RuleSet, build_rule_set
 
 
 PRICE_COLS = [
@@ -23,21 +34,57 @@ PRICE_COLS = [
 ]
 
 # =========================
-# Sys FOB Adjust（涨价系数）
+# 当前生效的规则（RuleSet 只读快照）
 # =========================
-# 仅在“使用 Sys 计算 FOB 且 France FOB 缺失”时生效。
-# 默认值可为空；通过 /api/admin/uplift（前端 Adjust 列）可热更新。
-UPLIFT_PCT_BY_LINE: Dict[str, float] = {}
-# 关键词涨价规则（叠加在 Sys FOB Adjust 之后）：
-# [{"keyword":"ASC","pct":0.15,"enabled":True}, ...]
-KEYWORD_UPLIFT_RULES: List[Dict[str, Any]] = []
+# 初始为 pricing_rules 中的 DDP_RULES / PRICE_RULES，以及空的：
+#   - Sys FOB Adjust（uplift_pct_by_line）：仅在“使用 Sys 计算 FOB 且 France FOB 缺失”时生效，
+#     通过 /api/admin/uplift（前端 Adjust 列）热更新
+#   - 关键词涨价（keyword_uplift_rules，叠加在 Sys FOB Adjust 之后）：
+#     [{"keyword":"ASC","pct":0.15,"enabled":True}, ...]
+# 修改规则一律走 RULES.update(...)（整版替换，generation + 1）。
+RULES = RuleRegistry(
+    build_rule_set(
+        0,
+        ddp_rules=DDP_RULES,
+        price_rules=PRICE_RULES,
+        uplift_pct_by_line={},
+        keyword_uplift_rules=[],
+    )
+)
+
+
+def current_rules() -> RuleSet:
+    return RULES.current
+
+
+class StageTimer:
+    """
+    单次 compute_one 的分阶段耗时（秒）：mark(stage) 把上次 mark / reset 以来的时间累加到 stage，
+    reset() 丢弃不属于任何阶段的间隔。
+    阶段：index_lookup / base_fallback / classification / series_detection / rule_pick / fob_ddp；
+    未经过的阶段不出现在 seconds 里（如分类命中 loader 预计算时没有 series_detection）。
+    """
+
+    __slots__ = ("seconds", "_t")
+
+    def __init__(self) -> None:
+        self.seconds: Dict[str, float] = {}
+        self._t = time.perf_counter()
+
+    def reset(self) -> None:
+        self._t = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + (now - self._t)
+        self._t = now
 
 
 def _detect_uplift_line_key(
     category: str,
     series_display: str,
-    france_row: Optional[pd.Series],
-    sys_row: Optional[pd.Series],
+    france_row: Optional[RowLike],
+    sys_row: Optional[RowLike],
 ) -> str:
     """
     识别“涨价产品线 key”，用于 Sys FOB 阶段的 uplift。
@@ -53,8 +100,9 @@ def _detect_uplift_line_key(
     # France 信息
     if france_row is not None:
         for col in ("Series", "系列", "External Model", "Internal Model", "Description"):
-            if col in france_row and pd.notna(france_row[col]):
-                big_parts.append(str(france_row[col]))
+            v = row_text(france_row, col)
+            if v is not None:
+                big_parts.append(v)
 
     # Sys 信息
     if sys_row is not None:
@@ -65,8 +113,9 @@ def _detect_uplift_line_key(
             "Internal Model",
             "First Product Line",
         ):
-            if col in sys_row and pd.notna(sys_row[col]):
-                big_parts.append(str(sys_row[col]))
+            v = row_text(sys_row, col)
+            if v is not None:
+                big_parts.append(v)
 
     big = " ".join(big_parts).upper()
     cat_up = (category or "").strip().upper()
@@ -130,8 +179,9 @@ def _pick_sys_uplift(
     effective_price_group: str,
     price_rule_key: Optional[str],
     series_display: str,
-    france_row: Optional[pd.Series],
-    sys_row: Optional[pd.Series],
+    france_row: Optional[RowLike],
+    sys_row: Optional[RowLike],
+    rules: RuleSet,
 ) -> Tuple[str, float]:
     """
     选择 Sys FOB uplift（仅 Sys 反算 FOB 场景）。
@@ -162,7 +212,7 @@ def _pick_sys_uplift(
     _push(legacy_key)
 
     for k in candidates:
-        pct = _to_float(UPLIFT_PCT_BY_LINE.get(k))
+        pct = _to_float(rules.uplift_pct_by_line.get(k))
         if pct is None or pct <= 0:
             continue
         return k, pct
@@ -170,43 +220,6 @@ def _pick_sys_uplift(
     return "", 0.0
 
 
-def _keyword_matches_model_text(keyword: str, model_text: str) -> bool:
-    kw = str(keyword or "").strip().upper()
-    if not kw:
-        return False
-    text = str(model_text or "").strip().upper()
-    if not text:
-        return False
-
-    # 型号关键词只在型号段前缀上匹配，避免 BASIC -> ASI 这类误命中。
-    for segment in re.split(r"[^A-Z0-9]+", text):
-        if not segment:
-            continue
-        if segment.startswith(kw):
-            return True
-        if segment.startswith(f"DHI{kw}") or segment.startswith(f"DH{kw}"):
-            return True
-    return False
-
-
-def _collect_keyword_model_values(
-    france_row: Optional[pd.Series],
-    sys_row: Optional[pd.Series],
-) -> List[str]:
-    parts: List[str] = []
-    if france_row is not None:
-        for col in ("External Model", "Internal Model"):
-            if col in france_row and pd.notna(france_row[col]):
-                parts.append(str(france_row[col]))
-
-    if sys_row is not None:
-        for col in ("External Model", "Internal Model"):
-            if col in sys_row and pd.notna(sys_row[col]):
-                parts.append(str(sys_row[col]))
-
-    return parts
-
-
 def _pick_sys_keyword_uplift(
     *,
     category: str,
@@ -214,44 +227,23 @@ def _pick_sys_keyword_uplift(
     effective_price_group: str,
     price_rule_key: Optional[str],
     series_display: str,
-    france_row: Optional[pd.Series],
-    sys_row: Optional[pd.Series],
+    france_row: Optional[RowLike],
+    sys_row: Optional[RowLike],
+    rules: RuleSet,
+    model_keys: Optional[Tuple[str, ...]] = None,
 ) -> Tuple[List[str], float]:
     """
     关键词涨价（仅 Sys 反算 FOB 场景）：
-    - 仅在 Internal Model / External Model 中做型号关键词匹配
+    - 仅在 Internal Model / External Model 中做型号关键词匹配（型号段前缀，含 DH / DHI 前缀变体）
     - 命中的 pct 做叠加（相加）
+    model_keys：loader 预切好的 France + Sys 行型号 key；未提供时从两行现切。
     """
-    if not KEYWORD_UPLIFT_RULES:
+    matcher = rules.keyword_matcher
+    if not matcher.rules:
         return [], 0.0
-
-    model_values = _collect_keyword_model_values(france_row, sys_row)
-    hits: List[str] = []
-    total_pct = 0.0
-    seen: Set[str] = set()
-
-    for rule in KEYWORD_UPLIFT_RULES:
-        if not isinstance(rule, dict):
-            continue
-        if rule.get("enabled", True) is False:
-            continue
-
-        kw = str(rule.get("keyword") or "").strip()
-        pct = _to_float(rule.get("pct"))
-        if not kw or pct is None or pct <= 0:
-            continue
-
-        kw_up = kw.upper()
-        if not any(_keyword_matches_model_text(kw_up, model_text) for model_text in model_values):
-            continue
-
-        if kw_up in seen:
-            continue
-        seen.add(kw_up)
-        total_pct += pct
-        hits.append(kw)
-
-    return hits, total_pct
+    if model_keys is None:
+        model_keys = merge_model_keys((row_model_keys(france_row), row_model_keys(sys_row)))
+    return matcher.pick(model_keys)
 
 
 def _to_float(v) -> Optional[float]:
@@ -270,10 +262,14 @@ def _to_float(v) -> Optional[float]:
         return None
 
 
-def compute_ddp_a_from_fob(fob: Optional[float], category: str) -> Optional[float]:
+def compute_ddp_a_from_fob(
+    fob: Optional[float],
+    category: str,
+    rules: Optional[RuleSet] = None,
+) -> Optional[float]:
     if fob is None or fob <= 0:
         return None
-    rule = DDP_RULES.get(category)
+    rule = (rules or current_rules()).ddp_rules.get(category)
     if not rule:
         return None
     ddp = fob
@@ -282,7 +278,11 @@ def compute_ddp_a_from_fob(fob: Optional[float], category: str) -> Optional[floa
     return ddp
 
 
-def pick_price_rule_with_key(price_group: str, series_key: str) -> Tuple[Optional[Dict], Optional[str]]:
+def pick_price_rule_with_key(
+    price_group: str,
+    series_key: str,
+    rules: Optional[RuleSet] = None,
+) -> Tuple[Optional[Mapping[str, Any]], Optional[str]]:
     """
     根据 price_group (大类) + series_key 在 PRICE_RULES 中选择一条规则，并返回“命中的 key”。
 
@@ -293,36 +293,12 @@ def pick_price_rule_with_key(price_group: str, series_key: str) -> Tuple[Optiona
       - 精确匹配到某个子规则：返回该子规则 key
       - 未命中任何子规则：若存在 _default_，返回 "_default_"
       - price_group 不存在：返回 (None, None)
+    查找走 RuleSet 预编译的 price_resolver（大写 key 精确表 + 包含匹配候选 + 结果 memo）。
     """
-    cat_rule = PRICE_RULES.get(price_group)
-    if not cat_rule:
-        return None, None
-
-    s_key_up = (series_key or "").strip().upper()
-    if s_key_up:
-        # 先尝试精确匹配（不区分大小写）
-        for k, v in cat_rule.items():
-            if k == "_default_":
-                continue
-            if str(k).strip().upper() == s_key_up:
-                return v, k
-
-        # 再尝试包含匹配
-        for k, v in cat_rule.items():
-            if k == "_default_":
-                continue
-            k_up = str(k).strip().upper()
-            if k_up in s_key_up or s_key_up in k_up:
-                return v, k
-
-    # 默认规则
-    if "_default_" in cat_rule:
-        return cat_rule.get("_default_"), "_default_"
-
-    return None, None
+    return (rules or current_rules()).price_resolver.pick(price_group, series_key)
 
 
-def compute_channel_prices(ddp_a: float, rule: Dict) -> Dict[str, Optional[float]]:
+def compute_channel_prices(ddp_a: float, rule: Mapping[str, Any]) -> Dict[str, Optional[float]]:
     """
     ddp_a → 各渠道价（reseller / gold / silver / ivory(installer) / msrp）
     返回不 round 的原始浮点数，显示格式在 formatter 里统一控制。
@@ -360,12 +336,14 @@ def compute_channel_prices(ddp_a: float, rule: Dict) -> Dict[str, Optional[float
     }
 
 
-def _all_prices_present(fr_row: Optional[pd.Series]) -> bool:
+def _all_prices_present(fr_row: Optional[RowLike]) -> bool:
     """
     只有 France 行存在且 7 个价格都非空时才认为“全部原始价格齐全”。
     """
     if fr_row is None:
         return False
+    if isinstance(fr_row, RowRecord):
+        return all(v is not None for v in fr_row.prices)
     for col in PRICE_COLS:
         if col not in fr_row or _to_float(fr_row[col]) is None:
             return False
@@ -433,11 +411,17 @@ def strict_price_group_default(category: Optional[str]) -> Optional[str]:
     return str(pol.get("default") or "").strip() or None
 
 
+# category -> 允许的 price_group（大写）
+_STRICT_PRICE_GROUP_ALLOWED: Dict[str, frozenset] = {
+    k: frozenset(str(x).strip().upper() for x in (pol.get("allowed") or set()))
+    for k, pol in _STRICT_PRICE_GROUP_POLICY.items()
+}
+
+
 def is_strict_price_group_compatible(category: Optional[str], price_group: Optional[str]) -> bool:
-    pol = _STRICT_PRICE_GROUP_POLICY.get(_norm_upper_text(category))
-    if not pol:
+    allowed = _STRICT_PRICE_GROUP_ALLOWED.get(_norm_upper_text(category))
+    if allowed is None:
         return True
-    allowed = {str(x).strip().upper() for x in (pol.get("allowed") or set())}
     return _norm_upper_text(price_group) in allowed
 
 
@@ -458,6 +442,10 @@ def _sanitize_price_group_for_category(
     return pg, False
 
 
+_EAS_ALIASES_NORM: Tuple[str, ...] = tuple(a for a in (_norm_key(x) for x in _EAS_ALIASES) if a)
+
+
+@lru_cache(maxsize=4096)
 def _series_implies_eas(series_key: str, series_display: str) -> bool:
     sk = _norm_key(series_key)
     sd = _norm_key(series_display)
@@ -475,15 +463,19 @@ def _series_implies_eas(series_key: str, series_display: str) -> bool:
         return True
 
     # 兜底：别名表
-    for a in _EAS_ALIASES:
-        au = _norm_key(a)
-        if au and (au == sk or au == sd or au in sk or au in sd):
+    for au in _EAS_ALIASES_NORM:
+        if au == sk or au == sd or au in sk or au in sd:
             return True
 
     return False
 
 
-def resolve_price_group_for_rules(price_group: str, series_key: str, series_display: str) -> str:
+def resolve_price_group_for_rules(
+    price_group: str,
+    series_key: str,
+    series_display: str,
+    rules: Optional[RuleSet] = None,
+) -> str:
     """
     返回用于 PRICE_RULES 的大类 key（effective_price_group）。
 
@@ -496,20 +488,21 @@ def resolve_price_group_for_rules(price_group: str, series_key: str, series_disp
     """
     pg = (price_group or "").strip()
     sk = (series_key or "").strip()
+    price_rules = (rules or current_rules()).price_rules
 
     if _series_implies_eas(sk, series_display):
         return "EAS"
 
-    if sk and sk in PRICE_RULES:
+    if sk and sk in price_rules:
         return sk
 
-    if pg and pg in PRICE_RULES:
+    if pg and pg in price_rules:
         return pg
 
     return pg
 
 
-def _choose_sys_base_price_from_sys(sys_row: pd.Series) -> Tuple[Optional[float], str, Optional[str]]:
+def _choose_sys_base_price_from_sys(sys_row: RowLike) -> Tuple[Optional[float], str, Optional[str]]:
     """
     新规则（无交互）：
       - Sales Type in {DISTRIBUTION, SMB} -> Min Price
@@ -530,19 +523,22 @@ def _choose_sys_base_price_from_sys(sys_row: pd.Series) -> Tuple[Optional[float]
     return None, sales, None
 
 
-def _compute_fob_from_basis_price(
-    basis_price: float,
+def _pick_basis_uplifts(
     *,
     category: str,
     price_group: str,
     effective_price_group: str,
     price_rule_key: Optional[str],
     series_display: str,
-    france_row: Optional[pd.Series],
-    sys_row: Optional[pd.Series],
-) -> Tuple[float, Optional[str], float, List[str]]:
-    fob = basis_price * 0.9
-
+    france_row: Optional[RowLike],
+    sys_row: Optional[RowLike],
+    rules: RuleSet,
+    model_keys: Optional[Tuple[str, ...]] = None,
+) -> Tuple[Optional[str], float, float, List[str]]:
+    """
+    底价反算 FOB 时要叠加的两层涨价：
+    返回 (uplift_key, uplift_pct, kw_pct, kw_hits)；未命中的一层 pct 为 0.0（uplift_key 为 None）。
+    """
     uplift_key, uplift_pct = _pick_sys_uplift(
         category=category,
         price_group=price_group,
@@ -551,11 +547,11 @@ def _compute_fob_from_basis_price(
         series_display=series_display,
         france_row=france_row,
         sys_row=sys_row,
+        rules=rules,
     )
-    if uplift_pct and uplift_pct > 0:
-        fob = fob * (1 + uplift_pct)
-    else:
+    if not (uplift_pct and uplift_pct > 0):
         uplift_key = None
+        uplift_pct = 0.0
 
     kw_hits, kw_pct = _pick_sys_keyword_uplift(
         category=category,
@@ -565,14 +561,22 @@ def _compute_fob_from_basis_price(
         series_display=series_display,
         france_row=france_row,
         sys_row=sys_row,
+        rules=rules,
+        model_keys=model_keys,
     )
+    return uplift_key, uplift_pct, kw_pct, kw_hits
+
+
+def _fob_from_basis_price(basis_price: float, uplift_pct: float, kw_pct: float) -> float:
+    fob = basis_price * 0.9
+    if uplift_pct > 0:
+        fob = fob * (1 + uplift_pct)
     if kw_pct > 0:
         fob = fob * (1 + kw_pct)
+    return fob
 
-    return fob, uplift_key, kw_pct, kw_hits
 
-
-def _fallback_recorder_category(fr_row: Optional[pd.Series], sys_row: Optional[pd.Series]) -> Tuple[str, Optional[str]]:
+def _fallback_recorder_category(fr_row: Optional[RowLike], sys_row: Optional[RowLike]) -> Tuple[str, Optional[str]]:
     """
     pricing_engine 级别的兜底：
     当 mapping / classifier 仍返回 UNKNOWN 时，基于型号/字段文本强制识别录像机大类，
@@ -584,13 +588,15 @@ def _fallback_recorder_category(fr_row: Optional[pd.Series], sys_row: Optional[p
 
     if fr_row is not None:
         for col in ("Internal Model", "External Model", "Series", "系列", "Description", "Second Product Line"):
-            if col in fr_row and pd.notna(fr_row[col]):
-                parts.append(str(fr_row[col]))
+            v = row_text(fr_row, col)
+            if v is not None:
+                parts.append(v)
 
     if sys_row is not None:
         for col in ("Internal Model", "External Model", "Second Product Line", "Catelog Name", "First Product Line"):
-            if col in sys_row and pd.notna(sys_row[col]):
-                parts.append(str(sys_row[col]))
+            v = row_text(sys_row, col)
+            if v is not None:
+                parts.append(v)
 
     big = " ".join(parts).upper()
 
@@ -610,8 +616,8 @@ def _fallback_recorder_category(fr_row: Optional[pd.Series], sys_row: Optional[p
 
 
 def build_original_values(
-    fr_row: Optional[pd.Series],
-    sys_row: Optional[pd.Series],
+    fr_row: Optional[RowLike],
+    sys_row: Optional[RowLike],
 ) -> Dict[str, object]:
     """
     构造基础输出字段：
@@ -665,35 +671,42 @@ def build_original_values(
     return data
 
 
-def compute_prices_for_part(
-    part_no: str,
-    france_row: Optional[pd.Series],
-    sys_row: Optional[pd.Series],
-    france_map: pd.DataFrame,
-    sys_map: pd.DataFrame,
-    force_category: Optional[str] = None,
-    force_price_group: Optional[str] = None,
-    force_series_key: Optional[str] = None,
-    force_full_recalc: bool = False,
-    manual_sys_basis_price_used: Optional[float] = None,
-    manual_fob: Optional[float] = None,
-) -> Dict:
+# (category, price_group, series_display, series_key)
+AutoClassification = Tuple[str, Optional[str], str, str]
+
+
+def classify_auto(
+    france_row: Optional[RowLike],
+    sys_row: Optional[RowLike],
+    france_map: Union[pd.DataFrame, MappingProgram],
+    sys_map: Union[pd.DataFrame, MappingProgram],
+) -> AutoClassification:
     """
-    输出 result dict：
-      - final_values / calculated_fields / category / price_group / series_display / series_key / pricing_rule_name
-      - sys_sales_type: 本 PN 在 Sys 中的 Sales Type（规范化后的）
-      - sys_basis_field: 本次 Sys FOB 计算若发生，用的是哪列（Min Price / Area Price）
-      - sys_basis_price: 该层级在 Sys 表对应底价
-      - sys_basis_price_used: 本次是否实际用于反算 FOB（仅 France FOB 缺失时）
-      - sys_uplift_key: 本次 Sys FOB uplift 命中的 key（若未命中则 None）
-      - sys_keyword_uplift_pct / sys_keyword_uplift_hits: 关键词叠加涨价命中信息
+    无 force_* 时的自动分类链路（compute_prices_for_part 的 1) ~ 2) 步）。
+    只依赖行内容与 mapping，loader 会对每行预计算一次（见 build_auto_classification）。
     """
-    if manual_sys_basis_price_used is not None and manual_fob is not None:
-        raise ValueError("manual_sys_basis_price_used and manual_fob are mutually exclusive")
-    force_recalc_all = bool(
-        force_full_recalc or manual_sys_basis_price_used is not None or manual_fob is not None
+    return _classify_with_overrides(
+        france_row,
+        sys_row,
+        france_map,
+        sys_map,
+        force_category=None,
+        force_price_group=None,
+        force_series_key=None,
     )
 
+
+def _classify_with_overrides(
+    france_row: Optional[RowLike],
+    sys_row: Optional[RowLike],
+    france_map: Union[pd.DataFrame, MappingProgram],
+    sys_map: Union[pd.DataFrame, MappingProgram],
+    *,
+    force_category: Optional[str],
+    force_price_group: Optional[str],
+    force_series_key: Optional[str],
+    timer: Optional[StageTimer] = None,
+) -> AutoClassification:
     # 1) 产品线 & 价格组
     category, price_group = classify_category_and_price_group(
         france_row, sys_row, france_map, sys_map
@@ -717,11 +730,81 @@ def compute_prices_for_part(
     # 自动分类时，强约束类目禁止跨线 price_group（例如 ACCESS CONTROL 被误配到 WIFI相机）
     if not force_price_group:
         price_group, _ = _sanitize_price_group_for_category(category, price_group)
+    if timer is not None:
+        timer.mark("classification")
 
     # 2) Series（展示 + 给 PRICE_RULES 选子规则用）
     series_display, series_key = detect_series(france_row, sys_row, price_group)
     if force_series_key:
         series_key = str(force_series_key).strip()
+    if timer is not None:
+        timer.mark("series_detection")
+
+    return category, price_group, series_display, series_key
+
+
+@dataclass
+class _PricePlan:
+    """
+    需要补价的 PN 在 5) 步之后的状态：分类、原始值、底价和涨价系数都已确定，
+    只剩纯算术（单个查询走标量，compute_batch 走 NumPy 向量）。
+    """
+    result: Dict[str, Any]
+    category: str
+    price_rule: Optional[Mapping[str, Any]]
+    force_recalc_all: bool
+    set_fob: bool                 # FOB 是否由本次计算/手填写回
+    fob: Optional[float]          # 不由底价反算时的 FOB（France 原值 / manual_fob）
+    basis_price: Optional[float]  # 由底价反算 FOB 时的底价；None 表示不反算
+    uplift_pct: float             # 0.0 表示不叠加
+    kw_pct: float
+    ddp_existing: Optional[float]
+
+
+def _plan_prices_for_part(
+    part_no: str,
+    france_row: Optional[RowLike],
+    sys_row: Optional[RowLike],
+    france_map: Union[pd.DataFrame, MappingProgram],
+    sys_map: Union[pd.DataFrame, MappingProgram],
+    force_category: Optional[str] = None,
+    force_price_group: Optional[str] = None,
+    force_series_key: Optional[str] = None,
+    force_full_recalc: bool = False,
+    manual_sys_basis_price_used: Optional[float] = None,
+    manual_fob: Optional[float] = None,
+    auto_classification: Optional[AutoClassification] = None,
+    model_keys: Optional[Tuple[str, ...]] = None,
+    rules: Optional[RuleSet] = None,
+    timer: Optional[StageTimer] = None,
+) -> Union[Dict, _PricePlan]:
+    """
+    compute_prices_for_part 的 1) ~ 5) 步：无需计算时直接返回 result dict，
+    否则返回 _PricePlan（只剩 FOB / DDP / 渠道价的算术）。
+    timer：记录 classification / series_detection / rule_pick 阶段耗时（compute_one 传入）。
+    """
+    if manual_sys_basis_price_used is not None and manual_fob is not None:
+        raise ValueError("manual_sys_basis_price_used and manual_fob are mutually exclusive")
+    if rules is None:
+        rules = current_rules()
+    force_recalc_all = bool(
+        force_full_recalc or manual_sys_basis_price_used is not None or manual_fob is not None
+    )
+
+    if auto_classification is not None and not (force_category or force_price_group or force_series_key):
+        # 1) ~ 2) 直接读 loader 预计算结果
+        category, price_group, series_display, series_key = auto_classification
+    else:
+        category, price_group, series_display, series_key = _classify_with_overrides(
+            france_row,
+            sys_row,
+            france_map,
+            sys_map,
+            force_category=force_category,
+            force_price_group=force_price_group,
+            force_series_key=force_series_key,
+            timer=timer,
+        )
 
     # 3) 原始值（France 优先，France 不存在则从 Sys 补基础字段）
     final_values = build_original_values(france_row, sys_row)
@@ -735,12 +818,16 @@ def compute_prices_for_part(
         sys_basis_price, sys_sales_type, sys_basis_field = _choose_sys_base_price_from_sys(sys_row)
 
     # ===== 预计算：本次会使用的 PRICE_RULES 规则名字（即使最终不需要补全渠道价，也可输出供核对）=====
-    effective_price_group = resolve_price_group_for_rules(price_group, series_key, series_display)
-    price_rule_dict, price_rule_key = pick_price_rule_with_key(effective_price_group, series_key)
+    if timer is not None:
+        timer.reset()
+    effective_price_group = resolve_price_group_for_rules(price_group, series_key, series_display, rules)
+    price_rule_dict, price_rule_key = pick_price_rule_with_key(effective_price_group, series_key, rules)
     if price_rule_key is None:
         pricing_rule_name = "PRICE_RULES:NOTFOUND"
     else:
         pricing_rule_name = f"PRICE_RULES['{effective_price_group}']['{price_rule_key}']"
+    if timer is not None:
+        timer.mark("rule_pick")
 
     # 3.5) 无法识别产品线 → 不做任何自动计算
     if category is None or category == "UNKNOWN":
@@ -790,8 +877,11 @@ def compute_prices_for_part(
             "sys_keyword_uplift_hits": [],
         }
 
-    # 5) 需要补全：先找 FOB
+    # 5) 需要补全：先找 FOB（底价反算只在这里定参数，算术在 _finish_price_plan 之前统一做）
     fob = _to_float(final_values.get("FOB C(EUR)"))
+    basis_price: Optional[float] = None
+    uplift_pct = 0.0
+    set_fob = False
 
     used_sys = False
     used_sys_basis_field: Optional[str] = None
@@ -802,28 +892,15 @@ def compute_prices_for_part(
     manual_override_field: Optional[str] = None
 
     if manual_sys_basis_price_used is not None and manual_sys_basis_price_used > 0:
-        fob, used_sys_uplift_key, used_sys_keyword_uplift_pct, used_sys_keyword_uplift_hits = (
-            _compute_fob_from_basis_price(
-                manual_sys_basis_price_used,
-                category=category,
-                price_group=price_group,
-                effective_price_group=effective_price_group,
-                price_rule_key=price_rule_key,
-                series_display=series_display,
-                france_row=france_row,
-                sys_row=sys_row,
-            )
-        )
-        final_values["FOB C(EUR)"] = fob
-        calculated_fields.add("FOB C(EUR)")
+        basis_price = manual_sys_basis_price_used
+        set_fob = True
         used_sys = True
         used_sys_basis_field = sys_basis_field or "Manual Input"
         used_sys_basis_price = manual_sys_basis_price_used
         manual_override_field = "sys_basis_price_used"
     elif manual_fob is not None and manual_fob > 0:
         fob = manual_fob
-        final_values["FOB C(EUR)"] = fob
-        calculated_fields.add("FOB C(EUR)")
+        set_fob = True
         manual_override_field = "fob"
     # 只在 France 缺失 FOB 时，才允许从 Sys 计算 FOB（不改你原逻辑）
     elif (fob is None or fob <= 0) and sys_row is not None:
@@ -831,58 +908,32 @@ def compute_prices_for_part(
         sys_sales_type = sales_norm
         sys_basis_price = base_price
         if base_price is not None and base_price > 0:
-            fob, used_sys_uplift_key, used_sys_keyword_uplift_pct, used_sys_keyword_uplift_hits = (
-                _compute_fob_from_basis_price(
-                    base_price,
-                    category=category,
-                    price_group=price_group,
-                    effective_price_group=effective_price_group,
-                    price_rule_key=price_rule_key,
-                    series_display=series_display,
-                    france_row=france_row,
-                    sys_row=sys_row,
-                )
-            )
-            final_values["FOB C(EUR)"] = fob
-            calculated_fields.add("FOB C(EUR)")
+            basis_price = base_price
+            set_fob = True
             used_sys = True
             used_sys_basis_field = basis_field  # Min Price / Area Price
             used_sys_basis_price = base_price
 
-    # 6) DDP A：如果 France 没写，就用 FOB + DDP_RULES 算
-    ddp_existing = _to_float(final_values.get("DDP A(EUR)"))
-    if force_recalc_all:
-        ddp_a = compute_ddp_a_from_fob(fob, category)
-        if ddp_a is not None:
-            final_values["DDP A(EUR)"] = ddp_a
-            calculated_fields.add("DDP A(EUR)")
-    elif ddp_existing is not None and ddp_existing > 0:
-        ddp_a = ddp_existing
-    else:
-        ddp_a = compute_ddp_a_from_fob(fob, category)
-        if ddp_a is not None:
-            final_values["DDP A(EUR)"] = ddp_a
-            calculated_fields.add("DDP A(EUR)")
-
-    # 7) 渠道价：如果某列缺失且有 DDP + 价格组规则，就计算补全
-    if ddp_a is not None:
-        if price_rule_dict is not None:
-            channel_prices = compute_channel_prices(ddp_a, price_rule_dict)
-            for col in PRICE_COLS:
-                if col == "FOB C(EUR)":
-                    continue
-                if col not in channel_prices:
-                    continue
-                if force_recalc_all:
-                    if channel_prices[col] is not None:
-                        final_values[col] = channel_prices[col]
-                        calculated_fields.add(col)
-                    continue
-                if _to_float(final_values.get(col)) is None:
-                    final_values[col] = channel_prices[col]
-                    calculated_fields.add(col)
+    if basis_price is not None:
+        if timer is not None:
+            timer.reset()
+        used_sys_uplift_key, uplift_pct, used_sys_keyword_uplift_pct, used_sys_keyword_uplift_hits = (
+            _pick_basis_uplifts(
+                category=category,
+                price_group=price_group,
+                effective_price_group=effective_price_group,
+                price_rule_key=price_rule_key,
+                series_display=series_display,
+                france_row=france_row,
+                sys_row=sys_row,
+                rules=rules,
+                model_keys=model_keys,
+            )
+        )
+        if timer is not None:
+            timer.mark("rule_pick")
 
-    return {
+    result = {
         "final_values": final_values,
         "calculated_fields": calculated_fields,
         "category": category,
@@ -903,87 +954,257 @@ def compute_prices_for_part(
         "manual_sys_basis_price_input": manual_sys_basis_price_used,
         "manual_fob_input": manual_fob,
     }
+    return _PricePlan(
+        result=result,
+        category=category,
+        price_rule=price_rule_dict,
+        force_recalc_all=force_recalc_all,
+        set_fob=set_fob,
+        fob=fob,
+        basis_price=basis_price,
+        uplift_pct=uplift_pct,
+        kw_pct=used_sys_keyword_uplift_pct,
+        ddp_existing=_to_float(final_values.get("DDP A(EUR)")),
+    )
 
 
-# ======================================================================
-# Server-side matching helpers (exact/base + base fallback fill)
-# ======================================================================
+def _price_plan_fob(plan: _PricePlan) -> Optional[float]:
+    if plan.basis_price is None:
+        return plan.fob
+    return _fob_from_basis_price(plan.basis_price, plan.uplift_pct, plan.kw_pct)
+
+
+def _price_plan_uses_calc_ddp(plan: _PricePlan) -> bool:
+    """6) France 已写 DDP A 且非强制重算时沿用原值，否则用 FOB + DDP_RULES 算出的值。"""
+    if plan.force_recalc_all:
+        return True
+    return not (plan.ddp_existing is not None and plan.ddp_existing > 0)
 
-def _pick_pn_col(df: pd.DataFrame) -> str:
+
+def _finish_price_plan(
+    plan: _PricePlan,
+    fob: Optional[float],
+    ddp_calc: Optional[float],
+    channel_prices: Optional[Dict[str, Optional[float]]] = None,
+) -> Dict:
     """
-    在不同表里 PN 列名可能不同：
-      - France: Part No.
-      - Sys:   Part Num / Part No.
-    这里做一个尽量稳的选择。
+    把算好的 FOB / DDP 写回 plan.result，并按 7) 的规则补渠道价。
+    channel_prices 未提供时现算（compute_batch 会传入向量化结果）。
     """
-    candidates = [
-        "Part No.",
-        "Part No",
-        "PartNum",
-        "Part Num",
-        "PN",
-        "P/N",
-        "PartNumber",
-        "Part Number",
-    ]
-    cols = list(df.columns)
-    # 先精确命中
-    for c in candidates:
-        if c in cols:
-            return c
-    # 再做不区分大小写的近似
-    low = {str(c).strip().lower(): c for c in cols}
-    for c in candidates:
-        k = c.strip().lower()
-        if k in low:
-            return low[k]
-    # 兜底：第一列
-    return cols[0]
+    result = plan.result
+    final_values = result["final_values"]
+    calculated_fields = result["calculated_fields"]
+
+    if plan.set_fob:
+        final_values["FOB C(EUR)"] = fob
+        calculated_fields.add("FOB C(EUR)")
+
+    # 6) DDP A：如果 France 没写，就用 FOB + DDP_RULES 算
+    if _price_plan_uses_calc_ddp(plan):
+        ddp_a = ddp_calc
+        if ddp_a is not None:
+            final_values["DDP A(EUR)"] = ddp_a
+            calculated_fields.add("DDP A(EUR)")
+    else:
+        ddp_a = plan.ddp_existing
 
+    # 7) 渠道价：如果某列缺失且有 DDP + 价格组规则，就计算补全
+    if ddp_a is not None and plan.price_rule is not None:
+        if channel_prices is None:
+            channel_prices = compute_channel_prices(ddp_a, plan.price_rule)
+        for col in PRICE_COLS:
+            if col == "FOB C(EUR)":
+                continue
+            if col not in channel_prices:
+                continue
+            if plan.force_recalc_all:
+                if channel_prices[col] is not None:
+                    final_values[col] = channel_prices[col]
+                    calculated_fields.add(col)
+                continue
+            if _to_float(final_values.get(col)) is None:
+                final_values[col] = channel_prices[col]
+                calculated_fields.add(col)
+
+    return result
+
+
+def compute_prices_for_part(
+    part_no: str,
+    france_row: Optional[RowLike],
+    sys_row: Optional[RowLike],
+    france_map: Union[pd.DataFrame, MappingProgram],
+    sys_map: Union[pd.DataFrame, MappingProgram],
+    force_category: Optional[str] = None,
+    force_price_group: Optional[str] = None,
+    force_series_key: Optional[str] = None,
+    force_full_recalc: bool = False,
+    manual_sys_basis_price_used: Optional[float] = None,
+    manual_fob: Optional[float] = None,
+    auto_classification: Optional[AutoClassification] = None,
+    model_keys: Optional[Tuple[str, ...]] = None,
+) -> Dict:
+    """
+    输出 result dict：
+      - final_values / calculated_fields / category / price_group / series_display / series_key / pricing_rule_name
+      - sys_sales_type: 本 PN 在 Sys 中的 Sales Type（规范化后的）
+      - sys_basis_field: 本次 Sys FOB 计算若发生，用的是哪列（Min Price / Area Price）
+      - sys_basis_price: 该层级在 Sys 表对应底价
+      - sys_basis_price_used: 本次是否实际用于反算 FOB（仅 France FOB 缺失时）
+      - sys_uplift_key: 本次 Sys FOB uplift 命中的 key（若未命中则 None）
+      - sys_keyword_uplift_pct / sys_keyword_uplift_hits: 关键词叠加涨价命中信息
+
+    auto_classification：预计算好的 classify_auto 结果；仅在没有任何 force_* 时使用。
+    model_keys：预切好的 France + Sys 行型号 key（关键词涨价匹配用）；未提供时从两行现切。
+    """
+    rules = current_rules()
+    plan = _plan_prices_for_part(
+        part_no,
+        france_row,
+        sys_row,
+        france_map,
+        sys_map,
+        force_category=force_category,
+        force_price_group=force_price_group,
+        force_series_key=force_series_key,
+        force_full_recalc=force_full_recalc,
+        manual_sys_basis_price_used=manual_sys_basis_price_used,
+        manual_fob=manual_fob,
+        auto_classification=auto_classification,
+        model_keys=model_keys,
+        rules=rules,
+    )
+    if not isinstance(plan, _PricePlan):
+        return plan
+    fob = _price_plan_fob(plan)
+    return _finish_price_plan(plan, fob, compute_ddp_a_from_fob(fob, plan.category, rules))
+
+
+# ======================================================================
+# Server-side matching helpers (exact/base + base fallback fill)
+# ======================================================================
 
 def _find_row_with_fallback(
-    df: pd.DataFrame,
+    rows: RowTable,
     idx_raw: Dict[str, int],
     idx_base: Dict[str, int],
     key_raw: str,
     key_base: str,
-) -> Tuple[Optional[pd.Series], str, Optional[str]]:
+) -> Tuple[Optional[RowRecord], str, Optional[str], Optional[int]]:
     """
-    返回 (row, mode, matched_pn)
+    返回 (row, mode, matched_pn, row_pos)
       mode: exact | base | none
     """
     if key_raw and key_raw in idx_raw:
-        i = idx_raw[key_raw]
-        try:
-            row = df.iloc[int(i)]
-            # matched_pn：尽量用表中 PN 列
-            pn_col = _pick_pn_col(df)
-            matched = str(row.get(pn_col)) if pn_col in row else key_raw
-            return row, "exact", matched
-        except Exception:
-            return None, "none", None
-
-    if key_base and key_base in idx_base:
-        i = idx_base[key_base]
-        try:
-            row = df.iloc[int(i)]
-            pn_col = _pick_pn_col(df)
-            matched = str(row.get(pn_col)) if pn_col in row else key_base
-            return row, "base", matched
-        except Exception:
-            return None, "none", None
-
-    return None, "none", None
+        i, mode, key = idx_raw[key_raw], "exact", key_raw
+    elif key_base and key_base in idx_base:
+        i, mode, key = idx_base[key_base], "base", key_base
+    else:
+        return None, "none", None, None
+
+    try:
+        row = rows[int(i)]
+    except Exception:
+        return None, "none", None, None
+    # matched_pn：尽量用表中 PN 列
+    pn_col = rows.pn_col
+    matched = str(row.get(pn_col)) if pn_col in row else key
+    return row, mode, matched, int(i)
+
+
+def _lookup_auto_classification(
+    data: DataBundle,
+    fr_pos: Optional[int],
+    sys_pos: Optional[int],
+) -> Optional[AutoClassification]:
+    """
+    取 loader 预计算的自动分类；行配对与预计算时不一致则返回 None（由调用方现算）。
+    """
+    if fr_pos is not None:
+        if data.fr_auto_class is None or data.fr_auto_class_sys_pos is None:
+            return None
+        if data.fr_auto_class_sys_pos[fr_pos] != sys_pos:
+            return None
+        return data.fr_auto_class[fr_pos]
+    if sys_pos is not None and data.sys_auto_class is not None:
+        return data.sys_auto_class[sys_pos]
+    return None
+
+
+def build_auto_classification(
+    data: DataBundle,
+    previous: Optional[DataBundle] = None,
+    prev_pos: Optional[Tuple[Sequence[Optional[int]], Sequence[Optional[int]]]] = None,
+) -> Tuple[List[AutoClassification], List[Optional[int]], List[AutoClassification]]:
+    """
+    对每一行预计算 classify_auto：
+      - France 第 i 行：与按其自身 PN（exact -> base）命中的 Sys 行配对
+      - Sys 第 j 行：France 无行时单独分类
+    返回 (fr_auto_class, fr_auto_class_sys_pos, sys_auto_class)；相同结果共用同一个 tuple。
+    previous / prev_pos：增量 reload（mapping 不变）时，prev_pos = (France, Sys) 每行内容未变时的旧行号；
+    Sys 行未变即沿用旧结果，France 行还要求配对的 Sys 行仍是旧配对的那一行且未变。
+    """
+    fr_map = data.map_fr_program if data.map_fr_program is not None else data.map_fr
+    sys_map = data.map_sys_program if data.map_sys_program is not None else data.map_sys
+    if data.fr_rows is None or data.sys_rows is None:
+        attach_row_tables(data)
+    fr_records = data.fr_rows.records
+    sys_records = data.sys_rows.records
+    interned: Dict[AutoClassification, AutoClassification] = {}
+
+    def _intern(v: AutoClassification) -> AutoClassification:
+        return interned.setdefault(v, v)
+
+    fr_prev: Sequence[Optional[int]] = [None] * len(fr_records)
+    sys_prev: Sequence[Optional[int]] = [None] * len(sys_records)
+    if (
+        previous is not None
+        and prev_pos is not None
+        and previous.fr_auto_class is not None
+        and previous.fr_auto_class_sys_pos is not None
+        and previous.sys_auto_class is not None
+    ):
+        fr_prev, sys_prev = prev_pos
+
+    sys_auto_class = [
+        previous.sys_auto_class[o] if o is not None else _intern(classify_auto(None, r, fr_map, sys_map))
+        for r, o in zip(sys_records, sys_prev)
+    ]
+
+    fr_pn_col = data.fr_rows.pn_col
+    fr_auto_class: List[AutoClassification] = []
+    fr_auto_class_sys_pos: List[Optional[int]] = []
+    for r, o in zip(fr_records, fr_prev):
+        pn = r.get(fr_pn_col)
+        key_raw = normalize_pn_raw(pn)
+        key_base = normalize_pn_base(pn)
+        sys_pos: Optional[int] = None
+        if key_raw and key_raw in data.sys_idx_raw:
+            sys_pos = int(data.sys_idx_raw[key_raw])
+        elif key_base and key_base in data.sys_idx_base:
+            sys_pos = int(data.sys_idx_base[key_base])
+        fr_auto_class_sys_pos.append(sys_pos)
+        if o is not None:
+            sys_o = sys_prev[sys_pos] if sys_pos is not None else None
+            if (sys_pos is None or sys_o is not None) and previous.fr_auto_class_sys_pos[o] == sys_o:
+                fr_auto_class.append(previous.fr_auto_class[o])
+                continue
+        sys_row = sys_records[sys_pos] if sys_pos is not None else None
+        fr_auto_class.append(_intern(classify_auto(r, sys_row, fr_map, sys_map)))
+
+    return fr_auto_class, fr_auto_class_sys_pos, sys_auto_class
 
 
 def _fill_missing_prices_from_base(
-    df: pd.DataFrame,
-    row: Optional[pd.Series],
+    rows: RowTable,
+    row: Optional[RowRecord],
     base_key_raw: str,
-) -> Tuple[Optional[pd.Series], bool, Optional[str]]:
+    idx_lower: Optional[Dict[str, int]] = None,
+) -> Tuple[Optional[RowRecord], bool, Optional[str]]:
     """
     当输入 PN 带 -xxxx 后缀导致 exact 行缺价时，
     用 base PN 的行把缺失的价格列补齐（只补 PRICE_COLS 中缺失者）。
+    idx_lower：loader 预建的 lower PN -> 行号索引；未提供时退回整表扫描。
     返回 (patched_row, changed, fallback_pn)
     """
     if row is None:
@@ -991,35 +1212,61 @@ def _fill_missing_prices_from_base(
     if not base_key_raw:
         return row, False, None
 
-    pn_col = _pick_pn_col(df)
-    try:
-        series_pn = df[pn_col].astype(str).str.strip().str.lower()
-    except Exception:
-        return row, False, None
-
-    hits = df[series_pn == str(base_key_raw).strip().lower()]
-    if hits.empty:
+    pn_col = rows.pn_col
+    key_lower = str(base_key_raw).strip().lower()
+    base_row: Optional[RowRecord] = None
+    if idx_lower is not None:
+        i = idx_lower.get(key_lower)
+        if i is None:
+            return row, False, None
+        base_row = rows[int(i)]
+    elif pn_col is not None:
+        for r in rows.records:
+            if str(r.get(pn_col)).strip().lower() == key_lower:
+                base_row = r
+                break
+    if base_row is None:
         return row, False, None
 
-    base_row = hits.iloc[0]
-
-    patched = row.copy()
-    changed = False
-    for c in PRICE_COLS:
-        if _to_float(patched.get(c)) is None:
-            v = base_row.get(c)
-            if _to_float(v) is not None:
-                patched[c] = v
-                changed = True
+    updates: Dict[str, Any] = {}
+    for c, v, base_v in zip(PRICE_COLS, row.prices, base_row.prices):
+        if v is None and base_v is not None:
+            updates[c] = base_row[c]
+    patched = row.with_values(updates) if updates else row
 
     fb_pn = str(base_row.get(pn_col)) if pn_col in base_row else base_key_raw
-    return patched, changed, fb_pn
+    return patched, bool(updates), fb_pn
 
 
 # ======================================================================
 # Public server API functions
 # ======================================================================
-def compute_one(
+@dataclass
+class _QueryContext:
+    """compute_one 在进入定价前解析出的行匹配 / fallback / 覆盖参数。"""
+    pn: str
+    fr_row: Optional[RowRecord]
+    sys_row: Optional[RowRecord]
+    fr_mode: str
+    sys_mode: str
+    fr_matched: Optional[str]
+    sys_matched: Optional[str]
+    warnings: List[str]
+    used_fb: bool
+    fb_from: Optional[str]
+    used_fr_fb: bool
+    used_sys_fb: bool
+    force_category_norm: Optional[str]
+    force_price_group_norm: Optional[str]
+    force_series_key_norm: Optional[str]
+    force_full_recalc: bool
+    manual_sys_basis_price_used: Optional[float]
+    manual_fob: Optional[float]
+    auto_classification: Optional[AutoClassification]
+    model_keys: Optional[Tuple[str, ...]]
+
+
+def _resolve_query(
     data: DataBundle,
     pn: str,
     force_category: Optional[str] = None,
@@ -1028,19 +1275,25 @@ def compute_one(
     force_full_recalc: bool = False,
     manual_sys_basis_price_used: Optional[float] = None,
     manual_fob: Optional[float] = None,
-) -> Dict[str, Any]:
+    timer: Optional[StageTimer] = None,
+) -> Union[Dict[str, Any], _QueryContext]:
     """
-    server API：单个 PN 查询
+    匹配 France / Sys 行并做去后缀补价；两边都没有时直接返回 not_found 结果。
+    timer：记录 index_lookup / base_fallback / classification（查预计算）阶段耗时。
     """
     key_raw = normalize_pn_raw(pn)
     key_base = normalize_pn_base(pn)
 
-    fr_row, fr_mode, fr_matched = _find_row_with_fallback(
-        data.france_df, data.fr_idx_raw, data.fr_idx_base, key_raw, key_base
+    if data.fr_rows is None or data.sys_rows is None:
+        attach_row_tables(data)
+    fr_row, fr_mode, fr_matched, fr_pos = _find_row_with_fallback(
+        data.fr_rows, data.fr_idx_raw, data.fr_idx_base, key_raw, key_base
     )
-    sys_row, sys_mode, sys_matched = _find_row_with_fallback(
-        data.sys_df, data.sys_idx_raw, data.sys_idx_base, key_raw, key_base
+    sys_row, sys_mode, sys_matched, sys_pos = _find_row_with_fallback(
+        data.sys_rows, data.sys_idx_raw, data.sys_idx_base, key_raw, key_base
     )
+    if timer is not None:
+        timer.mark("index_lookup")
 
     warnings: List[str] = []
 
@@ -1054,16 +1307,18 @@ def compute_one(
 
     if key_base and key_base != key_raw:
         fr_row, used_fr_fb, fr_fb_pn = _fill_missing_prices_from_base(
-            data.france_df, fr_row, key_base
+            data.fr_rows, fr_row, key_base, data.fr_idx_lower
         )
         sys_row, used_sys_fb, sys_fb_pn = _fill_missing_prices_from_base(
-            data.sys_df, sys_row, key_base
+            data.sys_rows, sys_row, key_base, data.sys_idx_lower
         )
 
         used_fb = bool(used_fr_fb or used_sys_fb)
         if used_fb:
             fb_from = str(fr_fb_pn or sys_fb_pn or key_base)
             warnings.append(f"price_fallback_from_base_pn={fb_from}")
+        if timer is not None:
+            timer.mark("base_fallback")
 
     force_category_norm = str(force_category).strip() if force_category else None
     force_price_group_norm = str(force_price_group).strip() if force_price_group else None
@@ -1084,20 +1339,77 @@ def compute_one(
     if fr_row is None and sys_row is None and allow_manual_without_source:
         warnings.append("manual_recompute_without_source_rows")
 
-    result = compute_prices_for_part(
-        pn,
-        fr_row,
-        sys_row,
-        data.map_fr,
-        data.map_sys,
-        force_category=force_category_norm,
-        force_price_group=force_price_group_norm,
-        force_series_key=force_series_key_norm,
+    auto_classification: Optional[AutoClassification] = None
+    if not (force_category_norm or force_price_group_norm or force_series_key_norm):
+        if timer is not None:
+            timer.reset()
+        auto_classification = _lookup_auto_classification(data, fr_pos, sys_pos)
+        if timer is not None and auto_classification is not None:
+            timer.mark("classification")
+
+    # 去后缀补价只补价格列，型号列与命中行一致，可直接用预切好的 key
+    model_keys: Optional[Tuple[str, ...]] = None
+    if data.fr_model_keys is not None and data.sys_model_keys is not None:
+        model_keys = merge_model_keys(
+            (
+                data.fr_model_keys[fr_pos] if fr_pos is not None else (),
+                data.sys_model_keys[sys_pos] if sys_pos is not None else (),
+            )
+        )
+
+    return _QueryContext(
+        pn=pn,
+        fr_row=fr_row,
+        sys_row=sys_row,
+        fr_mode=fr_mode,
+        sys_mode=sys_mode,
+        fr_matched=fr_matched,
+        sys_matched=sys_matched,
+        warnings=warnings,
+        used_fb=used_fb,
+        fb_from=fb_from,
+        used_fr_fb=used_fr_fb,
+        used_sys_fb=used_sys_fb,
+        force_category_norm=force_category_norm,
+        force_price_group_norm=force_price_group_norm,
+        force_series_key_norm=force_series_key_norm,
         force_full_recalc=bool(force_full_recalc),
         manual_sys_basis_price_used=manual_sys_basis_price_used,
         manual_fob=manual_fob,
+        auto_classification=auto_classification,
+        model_keys=model_keys,
     )
-    result["final_values"]["Part No."] = pn  # 强制覆盖为用户输入
+
+
+def _plan_query(
+    data: DataBundle,
+    ctx: _QueryContext,
+    rules: RuleSet,
+    timer: Optional[StageTimer] = None,
+) -> Union[Dict, _PricePlan]:
+    return _plan_prices_for_part(
+        ctx.pn,
+        ctx.fr_row,
+        ctx.sys_row,
+        data.map_fr_program if data.map_fr_program is not None else data.map_fr,
+        data.map_sys_program if data.map_sys_program is not None else data.map_sys,
+        force_category=ctx.force_category_norm,
+        force_price_group=ctx.force_price_group_norm,
+        force_series_key=ctx.force_series_key_norm,
+        force_full_recalc=ctx.force_full_recalc,
+        manual_sys_basis_price_used=ctx.manual_sys_basis_price_used,
+        manual_fob=ctx.manual_fob,
+        auto_classification=ctx.auto_classification,
+        model_keys=ctx.model_keys,
+        rules=rules,
+        timer=timer,
+    )
+
+
+def _wrap_query_result(ctx: _QueryContext, result: Dict) -> Dict[str, Any]:
+    """compute_prices_for_part 的 result → server API 返回结构。"""
+    warnings = ctx.warnings
+    result["final_values"]["Part No."] = ctx.pn  # 强制覆盖为用户输入
 
     # Black 型号提醒（不影响计算，只做可追溯 warning）
     internal = result.get("final_values", {}).get("Internal Model")
@@ -1107,7 +1419,7 @@ def compute_one(
             warnings.append("internal_model_contains_black_check_white_variant")
 
     return {
-        "pn": pn,
+        "pn": ctx.pn,
         "status": "ok",
         "final_values": result["final_values"],
         "calculated_fields": sorted(list(result.get("calculated_fields") or [])),
@@ -1125,29 +1437,29 @@ def compute_one(
             "sys_uplift_key": result.get("sys_uplift_key"),
             "sys_keyword_uplift_pct": result.get("sys_keyword_uplift_pct"),
             "sys_keyword_uplift_hits": result.get("sys_keyword_uplift_hits"),
-            "fr_match_mode": fr_mode,
-            "sys_match_mode": sys_mode,
-            "fr_matched_pn": fr_matched,
-            "sys_matched_pn": sys_matched,
+            "fr_match_mode": ctx.fr_mode,
+            "sys_match_mode": ctx.sys_mode,
+            "fr_matched_pn": ctx.fr_matched,
+            "sys_matched_pn": ctx.sys_matched,
 
             # 新增：fallback 可追溯信息（对并发/审计很关键）
-            "used_price_fallback": used_fb,
-            "fallback_base_pn": fb_from,
-            "used_fr_fallback": bool(used_fr_fb),
-            "used_sys_fallback": bool(used_sys_fb),
+            "used_price_fallback": ctx.used_fb,
+            "fallback_base_pn": ctx.fb_from,
+            "used_fr_fallback": bool(ctx.used_fr_fb),
+            "used_sys_fallback": bool(ctx.used_sys_fb),
             "manual_override": bool(
-                force_category_norm
-                or force_price_group_norm
-                or manual_sys_basis_price_used is not None
-                or manual_fob is not None
+                ctx.force_category_norm
+                or ctx.force_price_group_norm
+                or ctx.manual_sys_basis_price_used is not None
+                or ctx.manual_fob is not None
             ),
-            "forced_category": force_category_norm,
-            "forced_price_group": force_price_group_norm,
-            "forced_series_key": force_series_key_norm,
+            "forced_category": ctx.force_category_norm,
+            "forced_price_group": ctx.force_price_group_norm,
+            "forced_series_key": ctx.force_series_key_norm,
             "force_full_recalc": bool(
-                force_full_recalc
-                or manual_sys_basis_price_used is not None
-                or manual_fob is not None
+                ctx.force_full_recalc
+                or ctx.manual_sys_basis_price_used is not None
+                or ctx.manual_fob is not None
             ),
             "manual_override_field": result.get("manual_override_field"),
             "manual_sys_basis_price_input": result.get("manual_sys_basis_price_input"),
@@ -1157,16 +1469,183 @@ def compute_one(
     }
 
 
+def compute_one(
+    data: DataBundle,
+    pn: str,
+    force_category: Optional[str] = None,
+    force_price_group: Optional[str] = None,
+    force_series_key: Optional[str] = None,
+    force_full_recalc: bool = False,
+    manual_sys_basis_price_used: Optional[float] = None,
+    manual_fob: Optional[float] = None,
+    rules: Optional[RuleSet] = None,
+    timer: Optional[StageTimer] = None,
+) -> Dict[str, Any]:
+    """
+    server API：单个 PN 查询
+    rules：本次使用的规则快照（如预览用的 RuleSet.replace(...)）；None 表示当前生效规则。
+    timer：传入时记录各阶段耗时（见 StageTimer，/metrics 用）。
+    """
+    ctx = _resolve_query(
+        data,
+        pn,
+        force_category=force_category,
+        force_price_group=force_price_group,
+        force_series_key=force_series_key,
+        force_full_recalc=force_full_recalc,
+        manual_sys_basis_price_used=manual_sys_basis_price_used,
+        manual_fob=manual_fob,
+        timer=timer,
+    )
+    if not isinstance(ctx, _QueryContext):
+        return ctx
+
+    if rules is None:
+        rules = current_rules()
+    if timer is not None:
+        timer.reset()
+    plan = _plan_query(data, ctx, rules, timer)
+    if isinstance(plan, _PricePlan):
+        if timer is not None:
+            timer.reset()
+        fob = _price_plan_fob(plan)
+        result = _finish_price_plan(plan, fob, compute_ddp_a_from_fob(fob, plan.category, rules))
+        if timer is not None:
+            timer.mark("fob_ddp")
+    else:
+        result = plan
+    return _wrap_query_result(ctx, result)
+
+
+_CHANNEL_RULE_KEYS = ("reseller", "gold", "silver", "ivory", "msrp_on_installer")
+
+
+def _nan_to_none(v: float) -> Optional[float]:
+    return None if math.isnan(v) else float(v)
+
+
+def _finish_price_plans(plans: List[_PricePlan], rules: RuleSet) -> List[Dict]:
+    """
+    _finish_price_plan 的批量版：FOB / DDP A / 渠道价按列做 NumPy 运算。
+    逐元素的乘除顺序与标量路径一致（缺失项按 ×1.0 对齐），结果逐位相同；
+    某条规则会出现 1 - pct == 0 的行退回标量路径（与 compute_one 一样抛错）。
+    """
+    n = len(plans)
+    if n == 0:
+        return []
+    nan = float("nan")
+
+    basis = np.array([nan if p.basis_price is None else p.basis_price for p in plans], dtype=float)
+    fob_given = np.array([nan if p.fob is None else p.fob for p in plans], dtype=float)
+    up_factor = np.array([1 + p.uplift_pct if p.uplift_pct > 0 else 1.0 for p in plans], dtype=float)
+    kw_factor = np.array([1 + p.kw_pct if p.kw_pct > 0 else 1.0 for p in plans], dtype=float)
+
+    # DDP_RULES：按 category 展开成系数矩阵，不足位数补 1.0
+    ddp_rules = [rules.ddp_rules.get(p.category) or () for p in plans]
+    width = max((len(r) for r in ddp_rules), default=0)
+    ddp_factor = np.ones((n, width), dtype=float)
+    for i, rule in enumerate(ddp_rules):
+        for j, pct in enumerate(rule):
+            ddp_factor[i, j] = 1 + pct
+    has_ddp_rule = np.array([bool(r) for r in ddp_rules], dtype=bool)
+
+    uses_calc = np.array([_price_plan_uses_calc_ddp(p) for p in plans], dtype=bool)
+    ddp_existing = np.array([nan if p.ddp_existing is None else p.ddp_existing for p in plans], dtype=float)
+
+    has_price_rule = np.array([p.price_rule is not None for p in plans], dtype=bool)
+    pct = {
+        k: np.array(
+            [
+                nan if p.price_rule is None or p.price_rule.get(k) is None else p.price_rule.get(k)
+                for p in plans
+            ],
+            dtype=float,
+        )
+        for k in _CHANNEL_RULE_KEYS
+    }
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fob = np.where(np.isnan(basis), fob_given, basis * 0.9 * up_factor * kw_factor)
+
+        ddp = fob.copy()
+        for j in range(width):
+            ddp = ddp * ddp_factor[:, j]
+        ddp_calc = np.where(has_ddp_rule & (fob > 0), ddp, nan)
+        ddp_a = np.where(uses_calc, ddp_calc, ddp_existing)
+
+        reseller = np.where(np.isnan(pct["reseller"]), ddp_a, ddp_a / (1 - pct["reseller"]))
+        gold = ddp_a / (1 - pct["gold"])
+        silver = ddp_a / (1 - pct["silver"])
+        ivory = ddp_a / (1 - pct["ivory"])
+        msrp = ivory / (1 - pct["msrp_on_installer"])
+
+    with_channel = has_price_rule & ~np.isnan(ddp_a)
+    zero_div = with_channel & (
+        (pct["reseller"] == 1)
+        | (pct["gold"] == 1)
+        | (pct["silver"] == 1)
+        | (pct["ivory"] == 1)
+        | (~np.isnan(ivory) & (pct["msrp_on_installer"] == 1))
+    )
+
+    out: List[Dict] = []
+    for i, plan in enumerate(plans):
+        fob_i = _nan_to_none(fob[i])
+        ddp_calc_i = _nan_to_none(ddp_calc[i])
+        if zero_div[i]:
+            out.append(_finish_price_plan(plan, fob_i, ddp_calc_i))
+            continue
+        channel_prices: Optional[Dict[str, Optional[float]]] = None
+        if with_channel[i]:
+            channel_prices = {
+                "DDP A(EUR)": float(ddp_a[i]),
+                "Suggested Reseller(EUR)": float(reseller[i]),
+                "Gold(EUR)": _nan_to_none(gold[i]),
+                "Silver(EUR)": _nan_to_none(silver[i]),
+                "Ivory(EUR)": _nan_to_none(ivory[i]),
+                "MSRP(EUR)": _nan_to_none(msrp[i]),
+            }
+        out.append(_finish_price_plan(plan, fob_i, ddp_calc_i, channel_prices))
+    return out
+
+
+def compute_batch(
+    data: DataBundle,
+    pns: List[str],
+    rules: Optional[RuleSet] = None,
+) -> List[Dict[str, Any]]:
+    """
+    批量版 compute_one（无 force_* / manual 覆盖），整批使用同一个规则快照，结果与
+    [compute_one(data, pn, rules=rules) for pn in pns] 逐位相同：
+      - 行匹配 / 分类 / 规则与底价选择仍逐 PN 解析
+      - FOB / DDP A / 渠道价的算术集中成 NumPy 数组运算（_finish_price_plans）
+    """
+    if rules is None:
+        rules = current_rules()
+    out: List[Optional[Dict[str, Any]]] = [None] * len(pns)
+    pending: List[Tuple[int, _QueryContext, _PricePlan]] = []
+    for i, pn in enumerate(pns):
+        ctx = _resolve_query(data, pn)
+        if not isinstance(ctx, _QueryContext):
+            out[i] = ctx
+            continue
+        plan = _plan_query(data, ctx, rules)
+        if isinstance(plan, _PricePlan):
+            pending.append((i, ctx, plan))
+        else:
+            out[i] = _wrap_query_result(ctx, plan)
+
+    finished = _finish_price_plans([plan for _, _, plan in pending], rules)
+    for (i, ctx, _), result in zip(pending, finished):
+        out[i] = _wrap_query_result(ctx, result)
+    return out  # type: ignore[return-value]
+
+
 def compute_many(data: DataBundle, pns: List[str], level: str) -> List[Dict[str, Any]]:
     """
-    batch：按输入 PN 顺序返回
+    batch：按输入 PN 顺序返回（空 PN 跳过）
     level: country | country_customer（此处仅透传给导出层；计算逻辑不依赖 level）
     """
     _ = level
-    out: List[Dict[str, Any]] = []
-    for pn in pns:
-        s = str(pn).strip()
-        if not s:
-            continue
-        out.append(compute_one(data, s))
-    return out
+    clean = [s for s in (str(pn).strip() for pn in pns) if s]
+    return compute_batch(data, clean)
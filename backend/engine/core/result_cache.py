@@ -0,0 +1,132 @@
+# backend/engine/core/result_cache.py
+from __future__ import annotations
+
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class QueryResultCache:
+    """
+    query_one 结果的 LRU 缓存：
+      - key 含 (data_generation, rules_generation)，数据 reload / 规则变更后旧条目不会再命中；
+        遇到新版本时整表清空，及时释放内存；比当前更旧的版本（仍在用旧数据的 job 等）不读不写；
+        数据增量更新时改用 rebase_data_generation，只删受影响的条目
+      - max_entries / max_bytes 任一超限即淘汰最久未用的条目（<= 0 关闭缓存）
+      - 条目只存一份 pickle 后的冻结副本（bytes，按其大小计入 max_bytes）；命中时反序列化出新 dict，
+        调用方改写 put 的入参或 get 的返回值都不影响缓存
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[bytes, int]]" = OrderedDict()
+        self._generation: Optional[Tuple[int, int]] = None
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidated = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def _sync_generation_locked(self, generation: Tuple[int, int]) -> bool:
+        """切到 generation；generation 比当前旧时返回 False（不清空当前条目）。"""
+        cur = self._generation
+        if cur == generation:
+            return True
+        if cur is not None and generation[0] <= cur[0] and generation[1] <= cur[1]:
+            return False
+        self._entries.clear()
+        self._bytes = 0
+        self._generation = generation
+        return True
+
+    def get(self, generation: Tuple[int, int], key: Hashable) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            if not self._sync_generation_locked(generation):
+                return None
+            hit = self._entries.get(key)
+            if hit is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            blob = hit[0]
+        return pickle.loads(blob)
+
+    def put(self, generation: Tuple[int, int], key: Hashable, value: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:  # noqa: BLE001
+            return  # 含不可序列化对象的结果不缓存
+        size = sys.getsizeof(blob)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if not self._sync_generation_locked(generation):
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (blob, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self._bytes -= dropped
+                self.evictions += 1
+
+    def rebase_data_generation(
+        self,
+        old_data_generation: int,
+        new_data_generation: int,
+        drop: Callable[[Hashable], bool],
+    ) -> int:
+        """
+        数据增量更新：当前条目属于 old_data_generation 时，只删除 drop(key) 为真的条目，
+        其余条目改记到 new_data_generation 下继续命中。返回删除条数。
+        """
+        with self._lock:
+            cur = self._generation
+            if cur is None or cur[0] != old_data_generation:
+                return 0
+            dropped = [k for k in self._entries if drop(k)]
+            for k in dropped:
+                _, size = self._entries.pop(k)
+                self._bytes -= size
+            self._generation = (new_data_generation, cur[1])
+            self.invalidated += len(dropped)
+            return len(dropped)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._generation = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / total) if total else None,
+                "evictions": self.evictions,
+                "invalidated": self.invalidated,
+                "data_generation": self._generation[0] if self._generation else None,
+                "rules_generation": self._generation[1] if self._generation else None,
+            }
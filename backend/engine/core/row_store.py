@@ -0,0 +1,164 @@
+# backend/engine/core/row_store.py
+from __future__ import annotations
+
+import math
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from backend.engine.core.search_index import pick_col
+
+
+# 定价匹配用的 PN 列候选（France: Part No.；Sys: Part Num / Part No.）
+ROW_PN_COLS = ("Part No.", "Part No", "PartNum", "Part Num", "PN", "P/N", "PartNumber", "Part Number")
+
+
+def parse_price(v: Any) -> Optional[float]:
+    """与 pricing_engine._to_float 一致。"""
+    if v is None:
+        return None
+    try:
+        if isinstance(v, str):
+            v = v.strip()
+            if not v:
+                return None
+        f = float(v)
+        if math.isnan(f):
+            return None
+        return f
+    except Exception:  # noqa: BLE001
+        return None
+
+
+def _cell_text(v: Any) -> Optional[str]:
+    """非空单元格 -> str(v)；NaN / None -> None（等价于 pd.notna 判断后再 str）。"""
+    if v is None:
+        return None
+    if isinstance(v, str):
+        return v
+    try:
+        if pd.isna(v):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return str(v)
+
+
+class RowRecord(Mapping):
+    """
+    价格表的一行（替代 df.iloc[i] 得到的 pd.Series）：
+      - values：按列顺序的原始值，cols 为整表共用的 列名 -> 下标
+      - prices：price_cols（即 PRICE_COLS）预解析的 float，缺失或无法解析为 None
+      - text(col)：对应列的 str 值（空值为 None），首次访问时整行转好并缓存
+    只读；去后缀补价用 with_values 派生新行。
+    """
+
+    __slots__ = ("values", "cols", "price_cols", "prices", "_texts")
+
+    def __init__(self, values: Tuple[Any, ...], cols: Dict[Any, int], price_cols: Tuple[str, ...]):
+        self.values = values
+        self.cols = cols
+        self.price_cols = price_cols
+        self.prices: Tuple[Optional[float], ...] = tuple(
+            parse_price(values[cols[c]]) if c in cols else None for c in price_cols
+        )
+        self._texts: Optional[Tuple[Optional[str], ...]] = None
+
+    def __getitem__(self, col: str) -> Any:
+        return self.values[self.cols[col]]
+
+    def __contains__(self, col: object) -> bool:
+        return col in self.cols
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.cols)
+
+    def __len__(self) -> int:
+        return len(self.cols)
+
+    def get(self, col: str, default: Any = None) -> Any:
+        i = self.cols.get(col)
+        return default if i is None else self.values[i]
+
+    def text(self, col: str) -> Optional[str]:
+        i = self.cols.get(col)
+        if i is None:
+            return None
+        texts = self._texts
+        if texts is None:
+            texts = self._texts = tuple(_cell_text(v) for v in self.values)
+        return texts[i]
+
+    def with_values(self, updates: Mapping[str, Any]) -> "RowRecord":
+        """返回替换了部分列（列必须已存在）的新行。"""
+        values = list(self.values)
+        for col, v in updates.items():
+            values[self.cols[col]] = v
+        return RowRecord(tuple(values), self.cols, self.price_cols)
+
+
+# 分类 / 定价函数接受的行：RowRecord（服务内）或 pd.Series / dict（兼容旧调用）
+RowLike = Union[RowRecord, pd.Series, Mapping]
+
+
+def row_text(row: RowLike, col: str) -> Optional[str]:
+    """
+    行里某列的文本：RowRecord 取其缓存的 str；
+    pd.Series / dict 走原来的 `col in row and pd.notna(row[col])` 判断。
+    """
+    if isinstance(row, RowRecord):
+        return row.text(col)
+    if col in row and pd.notna(row[col]):
+        return str(row[col])
+    return None
+
+
+@dataclass(frozen=True)
+class RowTable:
+    """一张价格表的全部 RowRecord（下标与 DataFrame 行号一致）；pn_col 为 PN 列名。"""
+    records: List[RowRecord]
+    pn_col: Optional[str]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, i: int) -> RowRecord:
+        return self.records[i]
+
+
+def build_row_table(
+    df: pd.DataFrame,
+    price_cols: Sequence[str],
+    previous: Optional[RowTable] = None,
+    prev_pos: Optional[Sequence[Optional[int]]] = None,
+) -> RowTable:
+    """
+    load 时把 DataFrame 转成按行的 RowRecord（值与 df.iloc[i] 一致，但为 Python 原生类型）。
+    previous / prev_pos：增量 reload 时 prev_pos[i] 为第 i 行内容未变时的旧行号，直接沿用旧 RowRecord，
+    只转换其余行（两版列不同时整表重建）。
+    """
+    cols: Dict[Any, int] = {}
+    for i, c in enumerate(df.columns):
+        cols.setdefault(c, i)
+    price_cols = tuple(price_cols)
+    pn_col = pick_col(df, ROW_PN_COLS)
+
+    if previous is not None and prev_pos is not None and previous.records:
+        old = previous.records[0]
+        if old.cols == cols and old.price_cols == price_cols:
+            todo = [i for i, o in enumerate(prev_pos) if o is None]
+            fresh = iter(build_row_table(df.iloc[todo], price_cols).records) if todo else iter(())
+            records = [
+                previous.records[o] if o is not None else next(fresh)
+                for o in prev_pos
+            ]
+            return RowTable(records=records, pn_col=pn_col)
+
+    column_values = [df.iloc[:, i].tolist() for i in range(len(df.columns))]
+    records = [
+        RowRecord(tuple(vals), cols, price_cols)
+        for vals in zip(*column_values)
+    ] if column_values else []
+    return RowTable(records=records, pn_col=pn_col)
@@ -0,0 +1,241 @@
+# backend/engine/core/rule_set.py
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from backend.engine.core.keyword_index import KeywordMatcher, compile_keyword_rules
+
+
+def _freeze(obj: Any) -> Any:
+    """dict -> 只读 MappingProxyType，list / tuple -> tuple（递归）。"""
+    if isinstance(obj, Mapping):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+
+def thaw(obj: Any) -> Any:
+    """_freeze 的逆操作：得到可修改、可 JSON 序列化的普通 dict / list。"""
+    if isinstance(obj, Mapping):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, tuple):
+        return [thaw(v) for v in obj]
+    return obj
+
+
+_DEFAULT_RULE_KEY = "_default_"
+
+
+class _PriceGroupRules:
+    """一个 price_group 下的子规则，预先按 key 大写建好精确表和包含匹配候选。"""
+
+    __slots__ = ("exact", "contains", "default")
+
+    def __init__(self, group_rules: Mapping[str, Any]):
+        self.exact: Dict[str, Tuple[Any, Any]] = {}
+        contains: List[Tuple[str, Any, Any]] = []
+        for k, v in group_rules.items():
+            if k == _DEFAULT_RULE_KEY:
+                continue
+            k_up = str(k).strip().upper()
+            self.exact.setdefault(k_up, (v, k))
+            contains.append((k_up, v, k))
+        self.contains: Tuple[Tuple[str, Any, Any], ...] = tuple(contains)
+        self.default: Optional[Tuple[Any, str]] = (
+            (group_rules.get(_DEFAULT_RULE_KEY), _DEFAULT_RULE_KEY) if _DEFAULT_RULE_KEY in group_rules else None
+        )
+
+    def pick(self, series_key: Optional[str]) -> Tuple[Optional[Any], Optional[str]]:
+        s_key_up = (series_key or "").strip().upper()
+        if s_key_up:
+            hit = self.exact.get(s_key_up)
+            if hit is not None:
+                return hit
+            for k_up, v, k in self.contains:
+                if k_up in s_key_up or s_key_up in k_up:
+                    return v, k
+        if self.default is not None:
+            return self.default
+        return None, None
+
+
+class PriceRuleResolver:
+    """
+    price_rules 编译后的子规则选择器（随 RuleSet 一起构建）：
+      - 每个 price_group：大写 key 精确表 + 按原顺序的包含匹配候选 + _default_
+      - (price_group, series_key) -> (rule, key) 结果 memo
+    """
+
+    _MEMO_LIMIT = 4096
+
+    def __init__(self, price_rules: Mapping[str, Mapping[str, Any]]):
+        self._groups: Dict[Any, Optional[_PriceGroupRules]] = {
+            g: (_PriceGroupRules(v) if v else None) for g, v in price_rules.items()
+        }
+        self._memo: Dict[Tuple[Any, Any], Tuple[Optional[Any], Optional[str]]] = {}
+
+    def pick(self, price_group: str, series_key: Optional[str]) -> Tuple[Optional[Any], Optional[str]]:
+        memo_key = (price_group, series_key)
+        hit = self._memo.get(memo_key)
+        if hit is not None:
+            return hit
+        group = self._groups.get(price_group)
+        out = group.pick(series_key) if group is not None else (None, None)
+        if len(self._memo) >= self._MEMO_LIMIT:
+            self._memo.clear()
+        self._memo[memo_key] = out
+        return out
+
+
+@dataclass(frozen=True)
+class RuleSet:
+    """
+    一版完整的定价规则（只读快照）：
+      - ddp_rules：category -> DDP A 系数
+      - price_rules：price_group -> {series_key | _default_: 渠道价系数}
+      - uplift_pct_by_line：Sys 反算 FOB 的产品线涨价（Adjust）
+      - keyword_uplift_rules：关键词叠加涨价 [{"keyword", "pct", "enabled"}]
+    keyword_matcher / price_resolver 为对应规则预编译的查找表。
+    一次计算从头到尾只读同一个 RuleSet，不会看到更新到一半的规则。
+    """
+    generation: int
+    ddp_rules: Mapping[str, Tuple[float, ...]]
+    price_rules: Mapping[str, Mapping[str, Mapping[str, Any]]]
+    uplift_pct_by_line: Mapping[str, Any]
+    keyword_uplift_rules: Tuple[Mapping[str, Any], ...]
+    keyword_matcher: KeywordMatcher = field(repr=False, compare=False)
+    price_resolver: PriceRuleResolver = field(repr=False, compare=False)
+
+    def __reduce__(self) -> Tuple[Any, Tuple[Any, ...]]:
+        # MappingProxyType 不能 pickle：按原始规则重建（批量分片把规则快照传给子进程用）
+        return (
+            _rebuild_rule_set,
+            (
+                self.generation,
+                thaw(self.ddp_rules),
+                thaw(self.price_rules),
+                thaw(self.uplift_pct_by_line),
+                thaw(self.keyword_uplift_rules),
+            ),
+        )
+
+    def replace(
+        self,
+        *,
+        ddp_rules: Optional[Mapping[str, Sequence[float]]] = None,
+        price_rules: Optional[Mapping[str, Mapping[str, Mapping[str, Any]]]] = None,
+        uplift_pct_by_line: Optional[Mapping[str, Any]] = None,
+        keyword_uplift_rules: Optional[Sequence[Mapping[str, Any]]] = None,
+    ) -> "RuleSet":
+        """
+        派生一份改了部分规则的 RuleSet（None = 沿用当前值；generation 不变，不登记到 registry），
+        用于预览等“假设规则这样改”的计算。
+        """
+        return build_rule_set(
+            self.generation,
+            ddp_rules=self.ddp_rules if ddp_rules is None else ddp_rules,
+            price_rules=self.price_rules if price_rules is None else price_rules,
+            uplift_pct_by_line=self.uplift_pct_by_line if uplift_pct_by_line is None else uplift_pct_by_line,
+            keyword_uplift_rules=self.keyword_uplift_rules if keyword_uplift_rules is None else keyword_uplift_rules,
+            base=self,
+        )
+
+
+def build_rule_set(
+    generation: int,
+    *,
+    ddp_rules: Mapping[str, Sequence[float]],
+    price_rules: Mapping[str, Mapping[str, Mapping[str, Any]]],
+    uplift_pct_by_line: Mapping[str, Any],
+    keyword_uplift_rules: Sequence[Mapping[str, Any]],
+    base: Optional[RuleSet] = None,
+) -> RuleSet:
+    """
+    深拷贝并冻结传入的规则；调用方之后再改原对象不会影响快照。
+    base：与其共用未改动部分（同一对象）及其编译结果。
+    """
+    if base is not None and keyword_uplift_rules is base.keyword_uplift_rules:
+        keyword_rules, keyword_matcher = base.keyword_uplift_rules, base.keyword_matcher
+    else:
+        keyword_rules = _freeze(list(keyword_uplift_rules))
+        keyword_matcher = compile_keyword_rules(keyword_rules)
+    if base is not None and price_rules is base.price_rules:
+        frozen_price_rules, price_resolver = base.price_rules, base.price_resolver
+    else:
+        frozen_price_rules = _freeze(price_rules)
+        price_resolver = PriceRuleResolver(frozen_price_rules)
+    return RuleSet(
+        generation=int(generation),
+        ddp_rules=base.ddp_rules if base is not None and ddp_rules is base.ddp_rules else _freeze(ddp_rules),
+        price_rules=frozen_price_rules,
+        uplift_pct_by_line=(
+            base.uplift_pct_by_line
+            if base is not None and uplift_pct_by_line is base.uplift_pct_by_line
+            else _freeze(uplift_pct_by_line)
+        ),
+        keyword_uplift_rules=keyword_rules,
+        keyword_matcher=keyword_matcher,
+        price_resolver=price_resolver,
+    )
+
+
+def _rebuild_rule_set(
+    generation: int,
+    ddp_rules: Mapping[str, Sequence[float]],
+    price_rules: Mapping[str, Mapping[str, Mapping[str, Any]]],
+    uplift_pct_by_line: Mapping[str, Any],
+    keyword_uplift_rules: Sequence[Mapping[str, Any]],
+) -> RuleSet:
+    return build_rule_set(
+        generation,
+        ddp_rules=ddp_rules,
+        price_rules=price_rules,
+        uplift_pct_by_line=uplift_pct_by_line,
+        keyword_uplift_rules=keyword_uplift_rules,
+    )
+
+
+class RuleRegistry:
+    """
+    当前生效规则的登记处（copy-on-write）：
+      - current：读者直接取引用，不加锁
+      - update(...)：在旧快照基础上构建新 RuleSet，generation + 1，一次引用替换生效
+    """
+
+    def __init__(self, initial: RuleSet):
+        self._current = initial
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> RuleSet:
+        return self._current
+
+    @property
+    def generation(self) -> int:
+        return self._current.generation
+
+    def update(
+        self,
+        *,
+        ddp_rules: Optional[Mapping[str, Sequence[float]]] = None,
+        price_rules: Optional[Mapping[str, Mapping[str, Mapping[str, Any]]]] = None,
+        uplift_pct_by_line: Optional[Mapping[str, Any]] = None,
+        keyword_uplift_rules: Optional[Sequence[Mapping[str, Any]]] = None,
+    ) -> RuleSet:
+        """None 表示该类规则保持不变；返回新的当前快照。"""
+        with self._lock:
+            cur = self._current
+            new = build_rule_set(
+                cur.generation + 1,
+                ddp_rules=cur.ddp_rules if ddp_rules is None else ddp_rules,
+                price_rules=cur.price_rules if price_rules is None else price_rules,
+                uplift_pct_by_line=cur.uplift_pct_by_line if uplift_pct_by_line is None else uplift_pct_by_line,
+                keyword_uplift_rules=cur.keyword_uplift_rules if keyword_uplift_rules is None else keyword_uplift_rules,
+                base=cur,
+            )
+            self._current = new
+            return new
@@ -0,0 +1,288 @@
+# backend/engine/core/search_index.py
+from __future__ import annotations
+
+import bisect
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import pandas as pd
+
+
+PN_COL_CANDIDATES = ("Part No.", "Part No", "Part Num", "PN", "P/N", "Part Number", "PartNumber")
+
+# 命中等级 -> 分数（与 /api/models/search 返回的 match_score 一致）
+MATCH_SCORES = {"exact": 300, "prefix": 200, "contains": 100}
+
+_MODEL_FIELDS = (("internal_model", ("Internal Model",)), ("external_model", ("External Model", "ExternalModel")))
+
+
+def norm_optional_text(v: Any) -> Optional[str]:
+    if v is None:
+        return None
+    s = str(v).strip()
+    return s or None
+
+
+def normalize_model_text(v: Any) -> str:
+    """型号检索的规范化：大写，只保留 A-Z0-9。"""
+    s = str(v or "").strip().upper()
+    if not s:
+        return ""
+    return re.sub(r"[^A-Z0-9]+", "", s)
+
+
+def pick_col(df: Any, candidates: Sequence[str]) -> Optional[str]:
+    """
+    与 app 层 _pick_col 一致：先精确匹配，再不区分大小写匹配，都没有时退回第一列。
+    """
+    if df is None:
+        return None
+    cols = list(getattr(df, "columns", []))
+    if not cols:
+        return None
+    low_map = {str(c).strip().lower(): c for c in cols}
+    for c in candidates:
+        if c in cols:
+            return c
+    for c in candidates:
+        cc = str(c).strip().lower()
+        if cc in low_map:
+            return low_map[cc]
+    return cols[0]
+
+
+def _trigrams(s: str) -> Set[str]:
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+@dataclass(frozen=True)
+class ModelEntry:
+    """价格表中一行的一个型号字段（Internal / External Model）。"""
+    row: int       # 全局行序号（France 在前，Sys 在后）
+    pn: str
+    field: str     # internal_model | external_model
+    raw: str
+    source: str    # france | sys
+
+
+@dataclass(frozen=True)
+class ModelSearchIndex:
+    """
+    load 时建立的型号检索索引：
+      - norms：去重后的规范化型号，升序（前缀用 bisect）
+      - postings[i]：norms[i] 对应的 entries 下标（按原表顺序）
+      - trigrams：三字母片段 -> 含该片段的 norms 下标（包含匹配先取交集再校验）
+    """
+    norms: List[str]
+    postings: List[List[int]]
+    trigrams: Dict[str, List[int]]
+    entries: List[ModelEntry]
+
+    def match_norms(self, query_norm: str) -> List[Tuple[int, str]]:
+        """返回 [(norm 下标, exact|prefix|contains)]。"""
+        if not query_norm:
+            return []
+        hits: Dict[int, str] = {}
+
+        lo = bisect.bisect_left(self.norms, query_norm)
+        for i in range(lo, len(self.norms)):
+            s = self.norms[i]
+            if not s.startswith(query_norm):
+                break
+            hits[i] = "exact" if s == query_norm else "prefix"
+
+        if len(query_norm) >= 3:
+            grams = sorted(_trigrams(query_norm), key=lambda g: len(self.trigrams.get(g, ())))
+            cand: Optional[Set[int]] = None
+            for g in grams:
+                ids = self.trigrams.get(g)
+                if not ids:
+                    cand = set()
+                    break
+                cand = set(ids) if cand is None else cand.intersection(ids)
+                if not cand:
+                    break
+            candidates = cand or set()
+        else:
+            candidates = range(len(self.norms))
+
+        for i in candidates:
+            if i not in hits and query_norm in self.norms[i]:
+                hits[i] = "contains"
+        return sorted(hits.items())
+
+    def search(self, query_norm: str) -> Dict[str, Dict[str, Any]]:
+        """
+        PN -> 命中信息（score / match_type / matched_fields / sources / *_raw），
+        聚合规则与逐行扫描一致：按原表顺序回放每一行的命中字段。
+        """
+        scored: List[Tuple[int, int, str]] = []
+        for i, match_type in self.match_norms(query_norm):
+            score = MATCH_SCORES[match_type]
+            for e in self.postings[i]:
+                scored.append((e, score, match_type))
+        scored.sort()
+
+        seen: Dict[str, Dict[str, Any]] = {}
+        k = 0
+        while k < len(scored):
+            row = self.entries[scored[k][0]].row
+            matches: List[Tuple[ModelEntry, int, str]] = []
+            while k < len(scored) and self.entries[scored[k][0]].row == row:
+                e, score, match_type = scored[k]
+                matches.append((self.entries[e], score, match_type))
+                k += 1
+
+            best_entry, best_score, best_type = max(matches, key=lambda x: (x[1], x[0].field))
+            _ = best_entry
+            pn = matches[0][0].pn
+            item = seen.get(pn)
+            if item is None:
+                item = {
+                    "pn": pn,
+                    "score": best_score,
+                    "match_type": best_type,
+                    "matched_fields": set(),
+                    "sources": set(),
+                    "internal_model_raw": None,
+                    "external_model_raw": None,
+                }
+                seen[pn] = item
+            if best_score > int(item.get("score") or 0):
+                item["score"] = best_score
+                item["match_type"] = best_type
+
+            item["sources"].add(matches[0][0].source)
+            for entry, _score, _match_type in matches:
+                item["matched_fields"].add(entry.field)
+                key = "internal_model_raw" if entry.field == "internal_model" else "external_model_raw"
+                if not item.get(key):
+                    item[key] = entry.raw
+        return seen
+
+
+def build_model_search_index(sources: Sequence[Tuple[str, pd.DataFrame]]) -> ModelSearchIndex:
+    """sources: [("france", france_df), ("sys", sys_df)]，顺序即检索结果的聚合顺序。"""
+    entries: List[ModelEntry] = []
+    by_norm: Dict[str, List[int]] = {}
+    row_base = 0
+    for source, df in sources:
+        if df is None or getattr(df, "empty", True):
+            continue
+        pn_col = pick_col(df, PN_COL_CANDIDATES)
+        cols = [(name, pick_col(df, cands)) for name, cands in _MODEL_FIELDS]
+        cols = [(name, col) for name, col in cols if col]
+        if not pn_col or not cols:
+            continue
+        pn_values = df[pn_col].tolist()
+        field_values = [(name, df[col].tolist()) for name, col in cols]
+        for r, pn_v in enumerate(pn_values):
+            pn = norm_optional_text(pn_v)
+            if not pn:
+                continue
+            for name, values in field_values:
+                raw = norm_optional_text(values[r])
+                norm = normalize_model_text(raw)
+                if not norm:
+                    continue
+                by_norm.setdefault(norm, []).append(len(entries))
+                entries.append(ModelEntry(row=row_base + r, pn=pn, field=name, raw=raw, source=source))
+        row_base += len(pn_values)
+
+    norms = sorted(by_norm)
+    postings = [by_norm[s] for s in norms]
+    trigrams: Dict[str, List[int]] = {}
+    for i, s in enumerate(norms):
+        for g in _trigrams(s):
+            trigrams.setdefault(g, []).append(i)
+    return ModelSearchIndex(norms=norms, postings=postings, trigrams=trigrams, entries=entries)
+
+
+def _to_float_soft(v: Any) -> Optional[float]:
+    try:
+        if v is None:
+            return None
+        f = float(v)
+        if not math.isfinite(f):
+            return None
+        return f
+    except Exception:
+        return None
+
+
+@dataclass(frozen=True)
+class ExternalModelIndex:
+    """
+    External Model 聚类索引（key 为 strip + upper 后的 External Model）：
+      - pns：France 在前、Sys 在后，按 raw PN key 去重后的 PN 列表
+      - anchors：France 中第一条价格列全部为正数的行 -> (anchor_pn, {price_col: price})
+    """
+    pns: Dict[str, List[str]]
+    anchors: Dict[str, Tuple[Optional[str], Dict[str, float]]]
+
+    def cluster_pns(self, external_model: str) -> List[str]:
+        return list(self.pns.get(str(external_model).strip().upper(), ()))
+
+    def anchor(self, external_model: str) -> Tuple[Optional[str], Optional[Dict[str, float]]]:
+        hit = self.anchors.get(str(external_model).strip().upper())
+        if hit is None:
+            return None, None
+        return hit[0], dict(hit[1])
+
+
+def build_external_model_index(
+    france_df: pd.DataFrame,
+    sys_df: pd.DataFrame,
+    *,
+    price_cols: Sequence[str],
+    pn_key: Callable[[Any], str],
+) -> ExternalModelIndex:
+    """pn_key：PN 去重用的规范化函数（loader.normalize_pn_raw）。"""
+    pns: Dict[str, List[str]] = {}
+    seen: Dict[str, Set[str]] = {}
+    anchors: Dict[str, Tuple[Optional[str], Dict[str, float]]] = {}
+
+    for source, df in (("france", france_df), ("sys", sys_df)):
+        if df is None:
+            continue
+        pn_col = pick_col(df, PN_COL_CANDIDATES)
+        ext_col = pick_col(df, ("External Model", "ExternalModel"))
+        if not pn_col or not ext_col:
+            continue
+        pn_values = df[pn_col].tolist()
+        ext_values = df[ext_col].tolist()
+        price_values: Optional[List[List[Any]]] = None
+        if source == "france":
+            price_values = [df[c].tolist() if c in df.columns else [None] * len(df) for c in price_cols]
+
+        for r, (pn_v, ext_v) in enumerate(zip(pn_values, ext_values)):
+            em = norm_optional_text(ext_v)
+            if not em:
+                continue
+            em_up = em.upper()
+            part = norm_optional_text(pn_v)
+
+            if price_values is not None and em_up not in anchors:
+                prices: Dict[str, float] = {}
+                for c, values in zip(price_cols, price_values):
+                    f = _to_float_soft(values[r])
+                    if f is None or f <= 0:
+                        break
+                    prices[c] = f
+                else:
+                    anchors[em_up] = (part, prices)
+
+            if not part:
+                continue
+            key = pn_key(part)
+            if not key:
+                continue
+            keys = seen.setdefault(em_up, set())
+            if key in keys:
+                continue
+            keys.add(key)
+            pns.setdefault(em_up, []).append(part)
+
+    return ExternalModelIndex(pns=pns, anchors=anchors)
@@ -1,6 +1,8 @@
 # backend/engine/engine.py
 from __future__ import annotations
 
+import copy
+import threading
 import time
 from datetime import datetime, timezone
 from dataclasses import dataclass
@@ -9,24 +11,46 @@ from typing import Any, Dict, List, Optional, Tuple
 
 import pandas as pd
 
+from backend.engine.core.catalog_delta import DIFF_PN_LIMIT, CatalogDiff, full_reload_diff
 from backend.engine.core.loader import (
+    LOAD_STAGES,
     DataBundle,
     load_all_data,
+    load_all_data_delta,
+    normalize_pn_base,
+    normalize_pn_raw,
     parse_pn_list_file,
+    source_signature,
 )
+from backend.engine.core.metrics import STAGE_BUCKETS, Counter, Histogram, metric_lines
 from backend.engine.core.pricing_engine import (
+    StageTimer,
+    compute_batch,
     compute_one,
     compute_many,
+    current_rules,
 )
 from backend.engine.core.formatter import (
     build_export_frames,
     write_export_xlsx,
 )
+from backend.engine.core.result_cache import QueryResultCache
 
 
 @dataclass(frozen=True)
 class EngineConfig:
     runtime_dir: Path
+    # 整表预计算价格簿：load 后对两张表所有 PN 预先定价，无 override 的查询直接查表
+    price_book: bool = False
+    # query_one 结果 LRU：条目数 / 字节上限（任一 <= 0 关闭）
+    query_cache_size: int = 2048
+    query_cache_max_bytes: int = 64 * 1024 * 1024
+    # 轮询 runtime/data、runtime/mapping 的间隔（秒）：价格表 / mapping 变化后自动后台 reload（<= 0 关闭）
+    data_watch_seconds: float = 0.0
+    # reload 时与当前数据逐行对比，只重算 / 失效变化的部分（False 则每次整份重建）
+    delta_reload: bool = True
+    # 两张价格表都要重新解析时并行的进程数（<= 1 顺序解析）
+    load_workers: int = 1
 
     @property
     def data_dir(self) -> Path:
@@ -45,27 +69,440 @@ class EngineConfig:
         return self.runtime_dir / "logs"
 
 
+@dataclass(frozen=True)
+class PriceBook:
+    """
+    整表预计算结果：raw PN key -> compute_one 结果（无 override）。
+    只对构建时的 data + rules_generation 有效。
+    """
+    data: DataBundle
+    rules_generation: int
+    results: Dict[str, Dict[str, Any]]
+    built_at: float
+    build_seconds: float
+
+
+# 价格簿构建每批 PN 数；每批之间检查规则 / 数据是否已变化
+_PRICE_BOOK_CHUNK = 500
+
+
 class PricingEngine:
     """
-    薄 class：持有 DataBundle（大表 + 索引 + 映射），服务启动时 load 一次。
+    薄 class：持有 DataBundle（大表 + 索引 + 映射），服务启动时 load 一次；
+    之后 reload_data() / 文件轮询在后台构建新 DataBundle，建好后整份引用替换。
     """
 
     def __init__(self, cfg: EngineConfig):
         self.cfg = cfg
+        # 当前数据：只做整份引用替换，读者取一次引用后全程用同一份（bundle.generation 为其版本号）
         self.data: Optional[DataBundle] = None
-        self._loaded_at: Optional[float] = None
+
+        # 数据 reload：同一时间只有一个构建线程；构建中再次请求则结束后再跑一轮
+        self._reload_lock = threading.Lock()
+        self._reload_thread: Optional[threading.Thread] = None
+        self._reload_pending = False
+        self._reload_full = False
+        self._reload_count = 0
+        self._reload_failures = 0
+        self._reload_started_at: Optional[float] = None
+        self._reload_finished_at: Optional[float] = None
+        self._reload_error: Optional[str] = None
+        # 最近一次成功 reload 的差异摘要及其失效的缓存条数
+        self._last_diff: Optional[CatalogDiff] = None
+        self._last_diff_seconds: Optional[float] = None
+        self._last_diff_invalidated: Dict[str, Any] = {}
+        # 当前数据（或最近一次失败的 reload）读取时的源文件签名；轮询发现不同即 reload
+        self._source_signature: Optional[tuple] = None
+        self._watch_thread: Optional[threading.Thread] = None
+        # 首份数据换入时 set（start_load 后台加载期间查询接口据此返回 503）
+        self._ready = threading.Event()
+        # 当前（或最近一次）整份构建已完成的阶段（loader.LOAD_STAGES），readiness() 展示进度
+        self._load_stages_done: List[str] = []
+
+        # 规则以 RuleSet 快照整版替换（pricing_engine.RULES），读取不加锁；
+        # rules_lock 只用于串行化“读旧规则 -> 改 -> 替换 -> 落盘”的写操作。
+        self.rules_lock = threading.RLock()
+        self._price_book: Optional[PriceBook] = None
+        self._book_lock = threading.Lock()
+        self._book_thread: Optional[threading.Thread] = None
+        self._book_dirty = False
+        self._query_cache = QueryResultCache(cfg.query_cache_size, cfg.query_cache_max_bytes)
+
+        # /metrics：query_one 实际计算时的分阶段耗时、价格簿命中
+        self._compute_seconds = Histogram(
+            "dahua_pricing_compute_one_seconds",
+            "compute_one wall time for queries that missed price book and result cache.",
+            buckets=STAGE_BUCKETS,
+        )
+        self._compute_stage_seconds = Histogram(
+            "dahua_pricing_compute_stage_seconds",
+            "compute_one time per stage (series_detection only when classification is not precomputed).",
+            ("stage",),
+            buckets=STAGE_BUCKETS,
+        )
+        self._price_book_lookups = Counter(
+            "dahua_pricing_price_book_lookups_total",
+            "Price book lookups while the book is valid for current data and rules.",
+            ("result",),
+        )
 
     def load(self) -> None:
+        """启动时同步加载（失败直接抛出），并按配置启动文件轮询。"""
         self.cfg.data_dir.mkdir(parents=True, exist_ok=True)
-        t0 = time.time()
-        self.data = load_all_data(self.cfg.data_dir)
-        self._loaded_at = time.time()
-        _ = t0  # keep
+        signature = source_signature(self.cfg.data_dir)
+        data, diff = self._load_bundle(None)
+        self._swap_data(data, diff, None)
+        self._source_signature = signature
         # 不做 print；API 层需要 meta() 获取信息
+        self._start_data_watcher()
+
+    def start_load(self) -> None:
+        """
+        后台加载（立即返回）：走 reload_data 的构建线程，进度见 readiness()。
+        失败时保持未就绪，错误见 reload_status()；文件再次变化（需开启轮询）或 reload_data() 时重试。
+        """
+        self.cfg.data_dir.mkdir(parents=True, exist_ok=True)
+        self.reload_data()
+        self._start_data_watcher()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """阻塞到首份数据就绪（或超时），返回是否就绪。"""
+        return self._ready.wait(timeout)
+
+    def readiness(self) -> Dict[str, Any]:
+        data = self.data
+        done = list(self._load_stages_done)
+        running = self._reload_thread is not None
+        started_at = self._reload_started_at
+        if data is not None:
+            stage = "ready"
+        elif running:
+            stage = next((s for s in LOAD_STAGES if s not in done), LOAD_STAGES[-1])
+        else:
+            stage = "failed" if self._reload_error else "pending"
+        return {
+            "ready": data is not None,
+            "stage": stage,
+            "stages": list(LOAD_STAGES),
+            "stages_done": done,
+            "progress_percent": round(len(done) * 100.0 / len(LOAD_STAGES), 2),
+            "started_at_epoch": started_at,
+            "elapsed_seconds": (time.time() - started_at) if (running and started_at is not None) else None,
+            "last_error": self._reload_error,
+            "data_generation": data.generation if data is not None else 0,
+            "loaded_at_epoch": data.loaded_at if data is not None else None,
+        }
+
+    # =========================
+    # 数据 reload（原子替换 DataBundle）
+    # =========================
+
+    @property
+    def data_generation(self) -> int:
+        data = self.data
+        return data.generation if data is not None else 0
+
+    def _load_bundle(self, previous: Optional[DataBundle]) -> Tuple[DataBundle, CatalogDiff]:
+        """previous 非 None 且开启 delta_reload 时增量构建（见 load_all_data_delta）。"""
+        t0 = time.time()
+        self._load_stages_done = []
+        if previous is not None and self.cfg.delta_reload:
+            data, diff = load_all_data_delta(previous, self.cfg.data_dir, self.cfg.load_workers)
+        else:
+            data = load_all_data(self.cfg.data_dir, self.cfg.load_workers, progress=self._load_stages_done.append)
+            diff = full_reload_diff("initial load" if previous is None else "full reload requested")
+        data.loaded_at = time.time()
+        data.load_seconds = data.loaded_at - t0
+        return data, diff
+
+    def _swap_data(self, data: DataBundle, diff: CatalogDiff, previous: Optional[DataBundle]) -> None:
+        # 新 bundle 在替换前已完整构建；旧 bundle 由仍持有它的请求 / job 用完后自然释放。
+        # 整份重建：结果 LRU 与价格簿按 generation / bundle 身份判断，替换后自动失效。
+        # 增量：只删 / 重算 diff.affected_bases 涉及的 PN，其余缓存结果沿用到新版本。
+        delta = diff.mode == "delta" and previous is not None
+        book = self._patch_price_book(previous, data, diff) if delta else None
+        invalidated: Dict[str, Any] = {"query_cache": None, "price_book": None}
+        with self._reload_lock:
+            data.generation = self.data_generation + 1
+            if delta and previous is self.data:
+                affected = diff.affected_bases
+                invalidated["query_cache"] = self._query_cache.rebase_data_generation(
+                    previous.generation,
+                    data.generation,
+                    lambda key: normalize_pn_base(key[0]) in affected,
+                )
+            self.data = data
+            if book is not None:
+                self._price_book, invalidated["price_book"] = book
+            self._last_diff = diff
+            self._last_diff_seconds = data.load_seconds
+            self._last_diff_invalidated = invalidated
+        self._ready.set()
+        if self.cfg.price_book and (book is None or book[0].rules_generation != current_rules().generation):
+            self._schedule_price_book_build()
+
+    def _patch_price_book(
+        self, previous: DataBundle, data: DataBundle, diff: CatalogDiff
+    ) -> Optional[Tuple[PriceBook, int]]:
+        """
+        增量 reload：旧价格簿对 previous 有效时，沿用未受影响 PN 的结果，只重算受影响 / 新增的 PN。
+        返回 (新价格簿, 重算条数)；旧价格簿不可用时返回 None（改为整表重建）。
+        """
+        book = self._price_book
+        rules = current_rules()
+        if not self.cfg.price_book or book is None or book.data is not previous:
+            return None
+        if book.rules_generation != rules.generation:
+            return None
+        t0 = time.time()
+        affected = diff.affected_bases
+        keys: List[str] = list(dict.fromkeys(list(data.fr_idx_raw or {}) + list(data.sys_idx_raw or {})))
+        results: Dict[str, Dict[str, Any]] = {}
+        todo: List[str] = []
+        for k in keys:
+            hit = book.results.get(k)
+            if hit is not None and normalize_pn_base(k) not in affected:
+                results[k] = hit
+            else:
+                todo.append(k)
+        for start in range(0, len(todo), _PRICE_BOOK_CHUNK):
+            chunk = todo[start:start + _PRICE_BOOK_CHUNK]
+            results.update(zip(chunk, compute_batch(data, chunk, rules=rules)))
+        t1 = time.time()
+        patched = PriceBook(
+            data=data,
+            rules_generation=rules.generation,
+            results=results,
+            built_at=t1,
+            build_seconds=t1 - t0,
+        )
+        return patched, len(todo)
+
+    def reload_data(self, wait: bool = False, full: bool = False) -> Dict[str, Any]:
+        """
+        后台重新读取价格表 / mapping，建好新 DataBundle（索引、派生表）后一次替换。
+        默认与当前数据逐行对比增量构建（EngineConfig.delta_reload）；full=True 强制整份重建。
+        构建期间查询继续用旧数据；失败时保留旧数据，错误见 reload_status()。
+        wait=True：等构建线程（含排队的下一轮）结束再返回。
+        """
+        with self._reload_lock:
+            self._reload_full = self._reload_full or bool(full)
+            if self._reload_thread is not None:
+                self._reload_pending = True
+            else:
+                self._reload_pending = False
+                self._reload_thread = threading.Thread(
+                    target=self._reload_worker,
+                    daemon=True,
+                    name="data-reload",
+                )
+                self._reload_thread.start()
+            thread = self._reload_thread
+        if wait:
+            thread.join()
+        return self.reload_status()
+
+    def _reload_worker(self) -> None:
+        while True:
+            self._reload_started_at = time.time()
+            # 先取签名再读文件：读的过程中文件又被替换，下一次轮询仍能发现
+            signature = source_signature(self.cfg.data_dir)
+            with self._reload_lock:
+                full, self._reload_full = self._reload_full, False
+            try:
+                previous = self.data
+                data, diff = self._load_bundle(None if full else previous)
+                if full:
+                    diff = full_reload_diff("full reload requested")
+                self._swap_data(data, diff, previous)
+                self._reload_error = None
+                # start_load 的首次加载不计入 reload 次数
+                if previous is not None:
+                    self._reload_count += 1
+            except Exception as e:  # noqa: BLE001
+                self._reload_error = f"{type(e).__name__}: {e}"
+                self._reload_failures += 1
+            # 失败也记下签名：同一份坏文件不反复重试，等文件再次变化
+            self._source_signature = signature
+            self._reload_finished_at = time.time()
+            with self._reload_lock:
+                if not self._reload_pending:
+                    self._reload_thread = None
+                    return
+                self._reload_pending = False
+
+    def reload_status(self) -> Dict[str, Any]:
+        data = self.data
+        return {
+            "running": self._reload_thread is not None,
+            "data_generation": data.generation if data is not None else 0,
+            "reload_count": self._reload_count,
+            "failure_count": self._reload_failures,
+            "last_started_at_epoch": self._reload_started_at,
+            "last_finished_at_epoch": self._reload_finished_at,
+            "last_error": self._reload_error,
+            "watch_seconds": self.cfg.data_watch_seconds if self.cfg.data_watch_seconds > 0 else None,
+            "last_diff": self.last_data_diff(limit=0),
+        }
+
+    def last_data_diff(self, limit: int = DIFF_PN_LIMIT) -> Optional[Dict[str, Any]]:
+        """最近一次换入数据的差异摘要（新增 / 删除 / 变化行数，各列出至多 limit 个 PN）。"""
+        diff = self._last_diff
+        if diff is None:
+            return None
+        out = diff.summary(limit)
+        if limit <= 0:
+            for side in ("france", "sys"):
+                if out.get(side):
+                    for k in ("added_pns", "removed_pns", "changed_pns"):
+                        out[side].pop(k, None)
+        out["load_seconds"] = self._last_diff_seconds
+        out["invalidated"] = dict(self._last_diff_invalidated)
+        return out
+
+    def _start_data_watcher(self) -> None:
+        if self.cfg.data_watch_seconds <= 0 or self._watch_thread is not None:
+            return
+        self._watch_thread = threading.Thread(
+            target=self._watch_worker,
+            daemon=True,
+            name="data-watch",
+        )
+        self._watch_thread.start()
+
+    def _watch_worker(self) -> None:
+        pending: Optional[tuple] = None
+        while True:
+            time.sleep(self.cfg.data_watch_seconds)
+            if self._reload_thread is not None:
+                continue
+            try:
+                signature = source_signature(self.cfg.data_dir)
+            except Exception:  # noqa: BLE001
+                continue
+            if signature == self._source_signature:
+                pending = None
+            elif signature == pending:
+                # 连续两次轮询一致才 reload：文件还在复制时 size / mtime 会继续变化
+                pending = None
+                self.reload_data()
+            else:
+                pending = signature
+
+    # =========================
+    # 规则版本 & 价格簿
+    # =========================
+
+    @property
+    def rules_generation(self) -> int:
+        return current_rules().generation
+
+    def notify_rules_changed(self) -> int:
+        """
+        规则替换后调用（/api/admin/* PUT、reload-rules）：
+        旧价格簿按 generation 立即失效，后台重建。
+        """
+        gen = current_rules().generation
+        if self.cfg.price_book and self.data is not None:
+            self._schedule_price_book_build()
+        return gen
+
+    def _schedule_price_book_build(self) -> None:
+        with self._book_lock:
+            if self._book_thread is not None:
+                # 正在构建：构建线程结束后会再跑一轮
+                self._book_dirty = True
+                return
+            self._book_dirty = False
+            self._book_thread = threading.Thread(
+                target=self._price_book_worker,
+                daemon=True,
+                name="price-book-build",
+            )
+            self._book_thread.start()
+
+    def _price_book_worker(self) -> None:
+        while True:
+            try:
+                self._build_price_book()
+            except Exception:  # noqa: BLE001
+                # 构建失败不影响服务：查询继续走 compute_one
+                pass
+            with self._book_lock:
+                if not self._book_dirty:
+                    self._book_thread = None
+                    return
+                self._book_dirty = False
+
+    def _build_price_book(self) -> None:
+        data = self.data
+        if data is None:
+            return
+        rules = current_rules()
+        t0 = time.time()
+
+        keys: List[str] = list(dict.fromkeys(list(data.fr_idx_raw or {}) + list(data.sys_idx_raw or {})))
+        results: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(keys), _PRICE_BOOK_CHUNK):
+            if rules is not current_rules() or data is not self.data:
+                return  # 规则 / 数据已变化，本轮作废
+            chunk = keys[start:start + _PRICE_BOOK_CHUNK]
+            results.update(zip(chunk, compute_batch(data, chunk, rules=rules)))
+
+        with self._book_lock:
+            if rules is not current_rules() or data is not self.data:
+                return
+            t1 = time.time()
+            self._price_book = PriceBook(
+                data=data,
+                rules_generation=rules.generation,
+                results=results,
+                built_at=t1,
+                build_seconds=t1 - t0,
+            )
+
+    def _lookup_price_book(self, pn: str, data: DataBundle) -> Optional[Dict[str, Any]]:
+        book = self._price_book
+        if book is None or book.data is not data or book.rules_generation != current_rules().generation:
+            return None
+        hit = book.results.get(normalize_pn_raw(pn))
+        if hit is None:
+            self._price_book_lookups.inc("miss")
+            return None
+        self._price_book_lookups.inc("hit")
+        # 结果与输入 PN 的关系只体现在 pn / Part No. 两处；其余共享的嵌套对象复制一份，防止调用方改写价格簿
+        out = copy.deepcopy(hit)
+        out["pn"] = pn
+        out["final_values"]["Part No."] = pn
+        return out
+
+    def _price_book_meta(self) -> Dict[str, Any]:
+        book = self._price_book
+        gen = current_rules().generation
+        ready = bool(
+            book is not None
+            and book.data is self.data
+            and book.rules_generation == gen
+        )
+        return {
+            "enabled": bool(self.cfg.price_book),
+            "ready": ready,
+            "building": self._book_thread is not None,
+            "rules_generation": gen,
+            "book_rules_generation": book.rules_generation if book is not None else None,
+            "entries": len(book.results) if book is not None else 0,
+            "built_at_epoch": book.built_at if book is not None else None,
+            "build_seconds": book.build_seconds if book is not None else None,
+        }
 
     def meta(self) -> Dict[str, Any]:
-        if self.data is None:
-            return {"loaded": False}
+        data = self.data
+        if data is None:
+            return {"loaded": False, "data_reload": self.reload_status()}
 
         def _mtime_epoch(path: Optional[Path]) -> Optional[float]:
             if path is None:
@@ -83,24 +520,98 @@ class PricingEngine:
             except Exception:
                 return None
 
-        country_epoch = _mtime_epoch(self.data.france_price_path)
-        sys_epoch = _mtime_epoch(self.data.sys_price_path)
+        country_epoch = _mtime_epoch(data.france_price_path)
+        sys_epoch = _mtime_epoch(data.sys_price_path)
         return {
             "loaded": True,
-            "loaded_at_epoch": self._loaded_at,
+            "loaded_at_epoch": data.loaded_at,
+            "load_seconds": data.load_seconds,
+            "load_timings": dict(data.load_timings or {}),
+            "load_workers": self.cfg.load_workers,
+            "france_snapshot_hit": bool(data.fr_snapshot_hit),
+            "sys_snapshot_hit": bool(data.sys_snapshot_hit),
             "data_dir": str(self.cfg.data_dir),
-            "france_price_file": str(self.data.france_price_path) if self.data.france_price_path else None,
-            "sys_price_file": str(self.data.sys_price_path) if self.data.sys_price_path else None,
+            "france_price_file": str(data.france_price_path) if data.france_price_path else None,
+            "sys_price_file": str(data.sys_price_path) if data.sys_price_path else None,
             "country_data_updated_at_epoch": country_epoch,
             "country_data_updated_at_iso": _epoch_to_iso(country_epoch),
             "sys_data_updated_at_epoch": sys_epoch,
             "sys_data_updated_at_iso": _epoch_to_iso(sys_epoch),
-            "map_fr_file": str(self.data.map_fr_path) if self.data.map_fr_path else None,
-            "map_sys_file": str(self.data.map_sys_path) if self.data.map_sys_path else None,
-            "rows_france": int(self.data.france_df.shape[0]),
-            "rows_sys": int(self.data.sys_df.shape[0]),
+            "map_fr_file": str(data.map_fr_path) if data.map_fr_path else None,
+            "map_sys_file": str(data.map_sys_path) if data.map_sys_path else None,
+            "rows_france": int(data.france_df.shape[0]),
+            "rows_sys": int(data.sys_df.shape[0]),
+            "data_generation": data.generation,
+            "data_reload": self.reload_status(),
+            "rules_generation": current_rules().generation,
+            "price_book": self._price_book_meta(),
+            "query_cache": self._query_cache.stats(),
         }
 
+    def metrics_lines(self) -> List[str]:
+        """/metrics 中引擎部分：数据规模与加载耗时、reload、缓存命中、compute_one 分阶段耗时。"""
+        data = self.data
+        status = self.reload_status()
+        cache = self._query_cache.stats()
+        book_hits = self._price_book_lookups.value("hit")
+        book_total = book_hits + self._price_book_lookups.value("miss")
+        timings = (data.load_timings or {}) if data is not None else {}
+
+        lines = metric_lines(
+            "dahua_pricing_ready", "gauge", "1 once the first DataBundle is loaded.",
+            [({}, 1 if data is not None else 0)],
+        )
+        lines += metric_lines(
+            "dahua_pricing_data_generation", "gauge", "Generation of the current DataBundle.",
+            [({}, status["data_generation"])],
+        )
+        lines += metric_lines(
+            "dahua_pricing_data_rows", "gauge", "Rows in the current price tables.",
+            [
+                ({"table": "france"}, int(data.france_df.shape[0]) if data is not None else None),
+                ({"table": "sys"}, int(data.sys_df.shape[0]) if data is not None else None),
+            ],
+        )
+        lines += metric_lines(
+            "dahua_pricing_data_load_seconds", "gauge", "Build time of the current DataBundle.",
+            [({}, data.load_seconds if data is not None else None)],
+        )
+        lines += metric_lines(
+            "dahua_pricing_data_load_stage_seconds", "gauge", "Build time per loader stage of the current DataBundle.",
+            [({"stage": k}, v) for k, v in sorted(timings.items())],
+        )
+        lines += metric_lines(
+            "dahua_pricing_data_loaded_timestamp_seconds", "gauge", "Unix time the current DataBundle was loaded.",
+            [({}, data.loaded_at if data is not None else None)],
+        )
+        lines += metric_lines(
+            "dahua_pricing_data_reloads_total", "counter", "Data reloads after the initial load.",
+            [({"result": "ok"}, status["reload_count"]), ({"result": "failed"}, status["failure_count"])],
+        )
+        lines += metric_lines(
+            "dahua_pricing_query_cache_lookups_total", "counter", "Query result cache lookups.",
+            [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])],
+        )
+        lines += metric_lines(
+            "dahua_pricing_query_cache_entries", "gauge", "Entries in the query result cache.",
+            [({}, cache["entries"])],
+        )
+        lines += metric_lines(
+            "dahua_pricing_query_cache_bytes", "gauge", "Approximate bytes held by the query result cache.",
+            [({}, cache["bytes"])],
+        )
+        lines += self._price_book_lookups.render()
+        lines += metric_lines(
+            "dahua_pricing_cache_hit_ratio", "gauge", "Hit ratio since start, per cache.",
+            [
+                ({"cache": "query"}, cache["hit_ratio"]),
+                ({"cache": "price_book"}, (book_hits / book_total) if book_total else None),
+            ],
+        )
+        lines += self._compute_seconds.render()
+        lines += self._compute_stage_seconds.render()
+        return lines
+
     def query_one(
         self,
         pn: str,
@@ -110,11 +621,50 @@ class PricingEngine:
         force_full_recalc: bool = False,
         manual_sys_basis_price_used: Optional[float] = None,
         manual_fob: Optional[float] = None,
+        data: Optional[DataBundle] = None,
     ) -> Dict[str, Any]:
-        if self.data is None:
+        """
+        依次查：价格簿（仅无 override）-> 结果 LRU -> compute_one。
+        LRU 按 (raw PN key, override, data_generation, rules_generation) 缓存，
+        结果里只有 pn / Part No. 取自输入原文，命中时按本次输入改写。
+        data：在指定的 DataBundle 上计算（调用方先取好的快照）；默认当前数据。
+        """
+        if data is None:
+            data = self.data
+        if data is None:
             raise RuntimeError("engine not loaded")
-        return compute_one(
-            self.data,
+        if (
+            self.cfg.price_book
+            and not (force_category or force_price_group or force_series_key or force_full_recalc)
+            and manual_sys_basis_price_used is None
+            and manual_fob is None
+        ):
+            hit = self._lookup_price_book(pn, data)
+            if hit is not None:
+                return hit
+
+        rules = current_rules()
+        generation = (data.generation, rules.generation)
+        key = (
+            normalize_pn_raw(pn),
+            force_category,
+            force_price_group,
+            force_series_key,
+            bool(force_full_recalc),
+            manual_sys_basis_price_used,
+            manual_fob,
+        )
+        hit = self._query_cache.get(generation, key)
+        if hit is not None:
+            hit["pn"] = pn
+            if "Part No." in hit["final_values"]:
+                hit["final_values"]["Part No."] = pn
+            return hit
+
+        t0 = time.perf_counter()
+        timer = StageTimer()
+        out = compute_one(
+            data,
             pn,
             force_category=force_category,
             force_price_group=force_price_group,
@@ -122,7 +672,35 @@ class PricingEngine:
             force_full_recalc=force_full_recalc,
             manual_sys_basis_price_used=manual_sys_basis_price_used,
             manual_fob=manual_fob,
+            rules=rules,
+            timer=timer,
         )
+        self._compute_seconds.observe(time.perf_counter() - t0)
+        for stage, seconds in timer.seconds.items():
+            self._compute_stage_seconds.observe(seconds, stage)
+        self._query_cache.put(generation, key, out)
+        return out
+
+    def query_many(self, pns: List[str], data: Optional[DataBundle] = None) -> List[Dict[str, Any]]:
+        """
+        等价于 [self.query_one(pn, data=data) for pn in pns]：价格簿命中的直接返回，其余走 compute_batch。
+        """
+        if data is None:
+            data = self.data
+        if data is None:
+            raise RuntimeError("engine not loaded")
+        out: List[Optional[Dict[str, Any]]] = [None] * len(pns)
+        miss: List[int] = []
+        for i, pn in enumerate(pns):
+            hit = self._lookup_price_book(pn, data) if self.cfg.price_book else None
+            if hit is None:
+                miss.append(i)
+            else:
+                out[i] = hit
+        if miss:
+            for i, row in zip(miss, compute_batch(data, [pns[i] for i in miss])):
+                out[i] = row
+        return out  # type: ignore[return-value]
 
     def run_batch(self, input_path: Path, level: str, out_dir: Path) -> Dict[str, Any]:
         """
@@ -131,14 +709,15 @@ class PricingEngine:
         out_dir: /runtime/outputs/{job_id}
         产出文件名统一：Country_import_upload_Model.xlsx
         """
-        if self.data is None:
+        data = self.data
+        if data is None:
             raise RuntimeError("engine not loaded")
 
         # 计算逻辑本身不依赖导出层级；这里统一导出 country 模板
         level_norm = "country"
 
         pns = parse_pn_list_file(input_path)
-        results = compute_many(self.data, pns, level=level_norm)
+        results = compute_many(data, pns, level=level_norm)
 
         # 生成导出 DF
         frames = build_export_frames(results)
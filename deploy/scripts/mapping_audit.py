@@ -13,7 +13,7 @@ REPO_ROOT = Path(__file__).resolve().parents[2]
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
-from backend.engine.core.classifier import apply_mapping
+from backend.engine.core.classifier import apply_mapping, compile_mapping
 from backend.engine.core.pricing_engine import is_strict_price_group_compatible
 from backend.engine.core.pricing_rules import DDP_RULES, PRICE_RULES
 
@@ -65,8 +65,9 @@ def _audit_side(df: pd.DataFrame, mapping: pd.DataFrame, side: str) -> Dict[str,
     first_col = "First Level Product Category" if side == "france" else "First Product Line"
     second_col = "Second Level Product Category" if side == "france" else "Second Product Line"
 
+    program = compile_mapping(mapping)
     for _, row in df.iterrows():
-        cat, pg = apply_mapping(row, mapping)
+        cat, pg = apply_mapping(row, program)
         cat = str(cat or "").strip() or "UNKNOWN"
         pg = str(pg or "").strip() or ""
 
@@ -16,7 +16,7 @@ REPO_ROOT = Path(__file__).resolve().parents[2]
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
-from backend.engine.core.classifier import apply_mapping  # noqa: E402
+from backend.engine.core.classifier import apply_mapping, compile_mapping  # noqa: E402
 
 
 RUNTIME_DIR = Path("/data/dahua_pricing_runtime")
@@ -63,8 +63,9 @@ def load_data() -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]
 
 def teacher_labels(df: pd.DataFrame, mapping: pd.DataFrame) -> List[Tuple[str, str]]:
     out: List[Tuple[str, str]] = []
+    program = compile_mapping(mapping)
     for _, row in df.iterrows():
-        cat, pg = apply_mapping(row, mapping)
+        cat, pg = apply_mapping(row, program)
         out.append((norm(cat), norm(pg)))
     return out
 
@@ -457,7 +457,7 @@ function SingleQuery() {
     if (!silent) setOptionsErr("");
     setOptionsLoading(true);
     let lastErr = "";
-    for (let i = 0; i < 3; i += 1) {
+    for (let i = 0; i < 3; ) {
       try {
         const r = await apiGetJson("/api/query/options");
         setQueryOptions({
@@ -475,7 +475,14 @@ function SingleQuery() {
         return true;
       } catch (e) {
         lastErr = String(e.message || e);
-        await new Promise((resolve) => setTimeout(resolve, 250 * (i + 1)));
+        if (e.status === 503) {
+          // 后台加载价格数据中：按 Retry-After 一直重试，不计入失败次数
+          if (!silent) setOptionsErr(lastErr);
+          await new Promise((resolve) => setTimeout(resolve, (e.retryAfter || 5) * 1000));
+          continue;
+        }
+        i += 1;
+        await new Promise((resolve) => setTimeout(resolve, 250 * i));
       }
     }
     if (!silent) setOptionsErr(lastErr);
@@ -1221,6 +1228,7 @@ function BatchExport() {
   const [err, setErr] = useState("");
   const [jobId, setJobId] = useState("");
   const [job, setJob] = useState(null);
+  const [streamFailed, setStreamFailed] = useState(false);
 
   // 新增：后端 /api/batch 要求必填 level
   const [level, setLevel] = useState("country");
@@ -1240,6 +1248,7 @@ function BatchExport() {
       setJob(r);
       if (r?.job_id) {
         const id = String(r.job_id);
+        setStreamFailed(false);
         setJobId(id);
         await refresh(id);
       }
@@ -1263,15 +1272,41 @@ function BatchExport() {
     }
   }
 
+  const st = String(job?.status || "").toLowerCase();
+  const active = Boolean(jobId) && (!job || st === "queued" || st === "running");
+  const useStream = !streamFailed && typeof EventSource !== "undefined";
+
+  // 进度优先走 SSE（/api/jobs/{id}/events 只推增量）；结束时再取一次完整 state（含 report）
+  useEffect(() => {
+    if (!active || !useStream) return undefined;
+    const es = new EventSource(`/api/jobs/${encodeURIComponent(jobId)}/events`);
+    es.addEventListener("progress", (ev) => {
+      try {
+        const delta = JSON.parse(ev.data);
+        setJob((prev) => ({ ...(prev || {}), job_id: jobId, ...delta }));
+      } catch {
+        // ignore malformed event
+      }
+    });
+    es.addEventListener("done", () => {
+      es.close();
+      refresh(jobId);
+    });
+    es.onerror = () => {
+      es.close();
+      setStreamFailed(true);
+    };
+    return () => es.close();
+  }, [jobId, active, useStream]);
+
+  // SSE 不可用时退回轮询
   useEffect(() => {
-    const st = String(job?.status || "").toLowerCase();
-    const shouldPoll = Boolean(jobId) && (!job || st === "queued" || st === "running");
-    if (!shouldPoll) return undefined;
+    if (!active || useStream) return undefined;
     const tid = setInterval(() => {
       refresh(jobId);
     }, 1200);
     return () => clearInterval(tid);
-  }, [jobId, job]);
+  }, [jobId, active, useStream]);
 
   const downloadUrl = jobId ? `/api/jobs/${encodeURIComponent(jobId)}/download` : "#";
   const canDownload =
@@ -1282,7 +1317,7 @@ function BatchExport() {
   return (
     <Card
       title="BATCH EXPORT"
-      right={<span className="small monoInline">async upload → poll → download xlsx</span>}
+      right={<span className="small monoInline">async upload → progress stream → download xlsx</span>}
     >
       <div className="row wrap">
         <input
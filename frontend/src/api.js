@@ -6,9 +6,17 @@ async function readTextSafe(r) {
   }
 }
 
+// 带上 HTTP 状态码与 Retry-After（秒），调用方据此区分“数据加载中”（503）和其他错误
+async function httpError(method, url, r) {
+  const e = new Error(`${method} ${url} -> ${r.status} ${await readTextSafe(r)}`);
+  e.status = r.status;
+  e.retryAfter = Number(r.headers.get("Retry-After")) || 0;
+  return e;
+}
+
 export async function apiGetJson(url) {
   const r = await fetch(url, { method: "GET" });
-  if (!r.ok) throw new Error(`GET ${url} -> ${r.status} ${await readTextSafe(r)}`);
+  if (!r.ok) throw await httpError("GET", url, r);
   return await r.json();
 }
 
@@ -0,0 +1,142 @@
+# tests/conftest.py
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import pytest
+
+from backend.engine.core.loader import DataBundle, load_all_data
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+MAPPING_NAMES = ("productline_map_france_full.csv", "productline_map_sys_full.csv")
+PRICE_COLS = (
+    "FOB C(EUR)",
+    "DDP A(EUR)",
+    "Suggested Reseller(EUR)",
+    "Gold(EUR)",
+    "Silver(EUR)",
+    "Ivory(EUR)",
+    "MSRP(EUR)",
+)
+
+# (First Level, Second Level, Series, Internal Model)：按仓库 mapping 能识别出 IPC / NVR 的组合
+_FRANCE_KINDS = (
+    ("Network Cameras", "WizSense Series", "IPC2", "DH-IPC-HFW2431S-S-S2"),
+    ("Network Cameras", "WizMind Series", "IPC5 Series", "DH-IPC-HFW5442E-ASE"),
+    ("Network Recorders", "WizSense Series", "NVR4", "DHI-NVR4104HS-P-4KS2"),
+    ("Network Recorders", "Lite Series", "NVR2", "NVR5216-EI"),
+    ("others", "others", None, "BASIC-123"),
+)
+_SYS_KINDS = (
+    ("IPC", "IP Camera for Distributors", "DH-IPC-HDW3841T-ZAS"),
+    ("Storage Product", "NVR", "DHI-NVR608-64-4KS2"),
+    ("Intelligent Building", "Access Control", "DHI-ASI6213S"),
+    ("IPC", "IOT Camera", "DH-IPC-HFW1230S-BLACK"),
+)
+
+
+def _france_prices(i: int) -> Dict[str, Optional[float]]:
+    """按 i 轮换：价格齐全 / 只有 FOB / 缺 FOB（走 Sys 底价）/ 只有 DDP A。"""
+    base = 40.0 + 7.5 * i
+    kind = i % 4
+    prices: Dict[str, Optional[float]] = {c: None for c in PRICE_COLS}
+    if kind == 0:
+        for k, c in enumerate(PRICE_COLS):
+            prices[c] = round(base * (1 + 0.2 * k), 2)
+    elif kind == 1:
+        prices["FOB C(EUR)"] = base
+    elif kind == 3:
+        prices["DDP A(EUR)"] = round(base * 1.3, 2)
+    return prices
+
+
+def france_rows() -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    for i in range(24):
+        first, second, series, model = _FRANCE_KINDS[i % len(_FRANCE_KINDS)]
+        row: Dict[str, Any] = {
+            "Part No.": f"1.0.01.{10 + i}.{10000 + i}",
+            "Internal Model": model,
+            "External Model": f"{model}-EXT{i % 3}",
+            "First Level Product Category": first,
+            "Second Level Product Category": second,
+            "Series": series,
+            "Description": "desc",
+            "Sales Status": "Active",
+        }
+        row.update(_france_prices(i))
+        rows.append(row)
+    # 带后缀的 PN：本行缺价，由 base PN 行补
+    rows.append(dict(rows[0], **{"Part No.": "1.0.01.10.10000-0001", "Gold(EUR)": None, "MSRP(EUR)": None}))
+    rows.append(dict(rows[5], **{"Part No.": "1.0.01.15.10005-0002", "FOB C(EUR)": None}))
+    return rows
+
+
+def sys_rows() -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    # 与 France 共有的 PN（France 缺 FOB 时用 Min / Area Price 反算）
+    for i in range(0, 24, 2):
+        first, second, model = _SYS_KINDS[i % len(_SYS_KINDS)]
+        rows.append(
+            {
+                "Part Num": f"1.0.01.{10 + i}.{10000 + i}",
+                "Internal Model": model,
+                "External Model": f"{model}-EXT{i % 3}",
+                "First Product Line": first,
+                "Second Product Line": second,
+                "Catelog Name": "cat A",
+                "Sales Type": ("SMB", "Distribution", "PROJECT", None)[i % 4],
+                "Min Price": 30.0 + 3.0 * i,
+                "Area Price": 35.0 + 3.0 * i,
+                "Release Status": "Released",
+            }
+        )
+    # 只在 Sys 里的 PN
+    for i in range(16):
+        first, second, model = _SYS_KINDS[i % len(_SYS_KINDS)]
+        rows.append(
+            {
+                "Part Num": f"1.0.02.{20 + i}.{20000 + i}",
+                "Internal Model": model,
+                "External Model": f"{model}-S{i % 2}",
+                "First Product Line": first,
+                "Second Product Line": second,
+                "Catelog Name": None,
+                "Sales Type": ("SMB", "Distribution", "PROJECT", "other")[i % 4],
+                "Min Price": 20.0 + 2.5 * i if i % 5 else None,
+                "Area Price": 25.0 + 2.5 * i,
+                "Release Status": "Released",
+            }
+        )
+    return rows
+
+
+def write_runtime(
+    root: Path,
+    france: Optional[List[Dict[str, Any]]] = None,
+    sys_: Optional[List[Dict[str, Any]]] = None,
+) -> Path:
+    """在 root 下建 data/（两张价格表）与 mapping/（仓库自带 mapping），返回 data 目录。"""
+    data_dir = root / "data"
+    mapping_dir = root / "mapping"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    mapping_dir.mkdir(parents=True, exist_ok=True)
+    for name in MAPPING_NAMES:
+        shutil.copy(REPO_ROOT / "mapping" / name, mapping_dir / name)
+    pd.DataFrame(france if france is not None else france_rows()).to_excel(data_dir / "FrancePrice.xlsx", index=False)
+    pd.DataFrame(sys_ if sys_ is not None else sys_rows()).to_excel(data_dir / "SysPrice.xlsx", index=False)
+    return data_dir
+
+
+@pytest.fixture(scope="session")
+def data_dir(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    return write_runtime(tmp_path_factory.mktemp("runtime"))
+
+
+@pytest.fixture(scope="session")
+def bundle(data_dir: Path) -> DataBundle:
+    return load_all_data(data_dir)
@@ -0,0 +1,118 @@
+# tests/test_compute_batch.py
+from __future__ import annotations
+
+import json
+from typing import Any, List
+
+import pytest
+
+from backend.engine.core.pricing_engine import (
+    _PricePlan,
+    _finish_price_plan,
+    _finish_price_plans,
+    _plan_query,
+    _price_plan_fob,
+    _resolve_query,
+    compute_batch,
+    compute_ddp_a_from_fob,
+    compute_one,
+    current_rules,
+)
+
+
+# 精确 / 后缀（base 补价）/ 小写 / 前后空格 / 仅 Sys / 不存在
+PNS = [
+    "1.0.01.10.10000",
+    "1.0.01.11.10001",
+    "1.0.01.12.10002",
+    "1.0.01.13.10003",
+    "1.0.01.14.10004",
+    "1.0.01.10.10000-0001",
+    "1.0.01.15.10005-0002",
+    "1.0.01.16.10006-9999",
+    "  1.0.01.17.10007  ",
+    "1.0.01.18.10008\t",
+    "1.0.02.20.20000",
+    "1.0.02.21.20001",
+    "1.0.02.25.20005",
+    "1.0.02.30.20010-0003",
+    "9.9.99.99.99999",
+    "",
+]
+
+
+def _canon(rows: Any) -> str:
+    """NaN != NaN，统一转成 JSON 文本再比较。"""
+    return json.dumps(rows, sort_keys=True, default=str)
+
+
+def _all_pns(bundle) -> List[str]:
+    pns = list(PNS)
+    pns += [str(pn).lower() for pn in bundle.france_df["Part No."].tolist()]
+    pns += [str(pn) for pn in bundle.sys_df["Part Num"].tolist()]
+    return pns
+
+
+def _uplift_rules():
+    return current_rules().replace(
+        uplift_pct_by_line={"IPC": 0.05, "NVR": 0.1, "ACCESS CONTROL": 0.2},
+        keyword_uplift_rules=[
+            {"keyword": "IPC-HFW", "pct": 0.15, "enabled": True},
+            {"keyword": "NVR", "pct": 0.05, "enabled": True},
+            {"keyword": "ASI", "pct": 0.3, "enabled": False},
+        ],
+    )
+
+
+@pytest.mark.parametrize("rules_factory", [current_rules, _uplift_rules], ids=["default", "uplift"])
+def test_compute_batch_matches_compute_one(bundle, rules_factory):
+    rules = rules_factory()
+    pns = _all_pns(bundle)
+    batch = compute_batch(bundle, pns, rules=rules)
+    one = [compute_one(bundle, pn, rules=rules) for pn in pns]
+    assert _canon(batch) == _canon(one)
+    assert any(r.get("status") == "ok" and r["calculated_fields"] for r in batch)
+    assert any(r.get("meta", {}).get("used_price_fallback") for r in batch)
+
+
+def test_compute_batch_keeps_input_order_and_duplicates(bundle):
+    pns = ["1.0.01.11.10001", "9.9.99.99.99999", "1.0.01.11.10001", "1.0.02.21.20001"]
+    batch = compute_batch(bundle, pns)
+    assert [r["pn"] for r in batch] == pns
+    assert _canon(batch[0]) == _canon(batch[2])
+
+
+OVERRIDES = [
+    {"force_category": "IPC", "force_price_group": "IPC", "force_full_recalc": True},
+    {"force_category": "NVR", "force_series_key": "X", "force_full_recalc": True},
+    {"force_category": "IPC", "force_price_group": "IPC", "manual_fob": 123.45},
+    {"force_category": "NVR", "force_price_group": "NVR", "manual_sys_basis_price_used": 88.0},
+]
+
+
+def _override_plans(bundle, overrides, rules) -> List[_PricePlan]:
+    plans: List[_PricePlan] = []
+    for pn in _all_pns(bundle):
+        ctx = _resolve_query(bundle, pn, **overrides)
+        if isinstance(ctx, dict):
+            continue
+        plan = _plan_query(bundle, ctx, rules)
+        if isinstance(plan, _PricePlan):
+            plans.append(plan)
+    return plans
+
+
+@pytest.mark.parametrize("overrides", OVERRIDES)
+@pytest.mark.parametrize("rules_factory", [current_rules, _uplift_rules], ids=["default", "uplift"])
+def test_vectorized_finish_matches_scalar_with_overrides(bundle, overrides, rules_factory):
+    """带覆盖参数的 plan 走 _finish_price_plans（NumPy）与逐个 _finish_price_plan 结果一致。"""
+    rules = rules_factory()
+    plans = _override_plans(bundle, overrides, rules)
+    assert plans
+
+    scalar = []
+    for plan in _override_plans(bundle, overrides, rules):
+        fob = _price_plan_fob(plan)
+        scalar.append(_finish_price_plan(plan, fob, compute_ddp_a_from_fob(fob, plan.category, rules)))
+    vector = _finish_price_plans(plans, rules)
+    assert _canon(vector) == _canon(scalar)
@@ -0,0 +1,89 @@
+# tests/test_delta_reload.py
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, List
+
+from backend.engine.core.loader import load_all_data, load_all_data_delta, normalize_pn_base, normalize_pn_raw
+from backend.engine.core.pricing_engine import compute_one
+from backend.engine.engine import EngineConfig, PricingEngine
+
+from tests.conftest import france_rows, sys_rows, write_runtime
+
+
+def _canon(row: Any) -> str:
+    return json.dumps(row, sort_keys=True, default=str)
+
+
+def _query_pns(france: List[dict], sys_: List[dict]) -> List[str]:
+    pns = [r["Part No."] for r in france] + [r["Part Num"] for r in sys_]
+    pns += ["1.0.01.12.10002-0042", "1.0.01.13.10003-0042", "1.0.02.99.99999"]
+    return list(dict.fromkeys(pns))
+
+
+def _mutated_sheets():
+    france, sys_ = france_rows(), sys_rows()
+    france[1]["FOB C(EUR)"] = 999.0                 # 价格变化
+    france[4]["Second Level Product Category"] = "WizMind Series"  # 分类输入变化
+    del france[7]                                   # 删除行
+    france.append(dict(france[2], **{"Part No.": "1.0.01.90.19000"}))  # 新增行
+    sys_[2]["Sales Type"] = "PROJECT"               # Sys 底价层级变化
+    sys_[-1]["Min Price"] = 77.0
+    return france, sys_
+
+
+def test_delta_reload_matches_full_reload_and_invalidates_only_affected(tmp_path: Path):
+    data_dir = write_runtime(tmp_path)
+    engine = PricingEngine(EngineConfig(runtime_dir=tmp_path))
+    engine.load()
+
+    france, sys_ = _mutated_sheets()
+    pns = _query_pns(france_rows() + france, sys_rows())
+    for pn in pns:
+        engine.query_one(pn)
+    cached = {normalize_pn_raw(pn) for pn in pns}
+    assert engine.meta()["query_cache"]["entries"] == len(cached)
+
+    write_runtime(tmp_path, france, sys_)
+    status = engine.reload_data(wait=True)
+    assert status["last_error"] is None
+    assert status["last_diff"]["mode"] == "delta"
+
+    diff = engine._last_diff
+    affected = diff.affected_bases
+    assert normalize_pn_base(france_rows()[1]["Part No."]) in affected
+    assert normalize_pn_base("1.0.01.90.19000") in affected
+    assert normalize_pn_base(sys_[-1]["Part Num"]) in affected
+    expected_dropped = {k for k in cached if normalize_pn_base(k) in affected}
+    assert 0 < len(expected_dropped) < len(cached)
+    assert engine._last_diff_invalidated["query_cache"] == len(expected_dropped)
+
+    # 未受影响的条目在新版本下继续命中，受影响的重新计算
+    stats = engine.meta()["query_cache"]
+    hits0, misses0 = stats["hits"], stats["misses"]
+    assert stats["entries"] == len(cached) - len(expected_dropped)
+
+    full = load_all_data(data_dir)
+    for pn in pns:
+        assert _canon(engine.query_one(pn)) == _canon(compute_one(full, pn)), pn
+
+    stats = engine.meta()["query_cache"]
+    assert stats["hits"] - hits0 == len(cached) - len(expected_dropped)
+    assert stats["misses"] - misses0 == len(expected_dropped)
+
+
+def test_delta_reload_bundle_matches_full_load(tmp_path: Path):
+    data_dir = write_runtime(tmp_path)
+    previous = load_all_data(data_dir)
+    france, sys_ = _mutated_sheets()
+    write_runtime(tmp_path, france, sys_)
+
+    delta, diff = load_all_data_delta(previous, data_dir)
+    full = load_all_data(data_dir)
+    assert diff.mode == "delta"
+    assert delta.fr_idx_raw == full.fr_idx_raw and delta.sys_idx_raw == full.sys_idx_raw
+    assert delta.fr_auto_class == full.fr_auto_class and delta.sys_auto_class == full.sys_auto_class
+    assert delta.fr_model_keys == full.fr_model_keys and delta.sys_model_keys == full.sys_model_keys
+    for pn in _query_pns(france, sys_):
+        assert _canon(compute_one(delta, pn)) == _canon(compute_one(full, pn)), pn
@@ -0,0 +1,112 @@
+# tests/test_job_queue.py
+from __future__ import annotations
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from backend.app.job_queue import JobQueue, QueuedJob
+
+
+def _noop(job_id: str) -> None:
+    pass
+
+
+def _wait_until(cond: Callable[[], bool], timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_submit_position_orders_by_priority_then_fifo(tmp_path: Path) -> None:
+    q = JobQueue(tmp_path / "jobs", _noop)  # 不 start：只看排队顺序
+    assert q.submit("a") == 1
+    assert q.submit("b") == 2
+    assert q.submit("c", priority=5) == 1
+    assert q.submit("d", priority=5) == 2
+    assert q.submit("e", priority=-1) == 5
+
+    assert [q.position(j) for j in ("c", "d", "a", "b", "e")] == [1, 2, 3, 4, 5]
+    assert q.position("missing") is None
+    assert q.stats()["queued"] == 5
+    assert sorted(p.name for p in (tmp_path / "jobs").glob("*.json")) == [f"{j}.json" for j in "abcde"]
+
+
+def test_workers_run_in_priority_fifo_order_and_forget_entries(tmp_path: Path) -> None:
+    jobs_dir = tmp_path / "jobs"
+    order: List[str] = []
+    gate = threading.Event()
+    finished = threading.Event()
+
+    def runner(job_id: str) -> None:
+        if job_id == "first":
+            gate.wait(5)  # 占住唯一的 worker，让后面的 job 全部排队
+        order.append(job_id)
+        if job_id == "boom":
+            raise RuntimeError("runner failure must not kill the worker")
+        if len(order) == 5:
+            finished.set()
+
+    q = JobQueue(jobs_dir, runner, workers=1)
+    q.start()
+    q.submit("first")
+    assert _wait_until(lambda: q.is_running("first"))
+    assert q.position("first") is None
+
+    q.submit("low", priority=-1)
+    q.submit("boom")
+    q.submit("high", priority=3)
+    q.submit("mid")
+    assert q.position("high") == 1
+    gate.set()
+
+    assert finished.wait(5)
+    assert order == ["first", "high", "boom", "mid", "low"]
+    assert _wait_until(lambda: not list(jobs_dir.glob("*.json")) and q.stats()["running"] == 0)
+    assert q.stats() == {"workers": 1, "queued": 0, "running": 0, "running_jobs": []}
+
+
+def test_recover_requeues_leftover_entries_in_original_order(tmp_path: Path) -> None:
+    jobs_dir = tmp_path / "jobs"
+    before = JobQueue(jobs_dir, _noop)
+    before.submit("q1")
+    before.submit("q2", priority=2)
+    before.submit("q3")
+    # 模拟运行到一半时进程退出：entry 已出队但文件还在
+    jobs_dir.joinpath("run.json").write_text(
+        json.dumps({"job_id": "run", "priority": 0, "seq": 99, "enqueued_at": 0.0}), encoding="utf-8"
+    )
+    jobs_dir.joinpath("broken.json").write_text("{not json", encoding="utf-8")
+
+    after = JobQueue(jobs_dir, _noop)
+    assert after.recover() == ["q2", "q1", "q3", "run"]
+    assert [after.position(j) for j in ("q2", "q1", "q3", "run")] == [1, 2, 3, 4]
+
+    # 恢复后新入队的 job 排在残留记录之后（seq 接着上次的最大值）
+    assert after.submit("new") == 5
+    raw = json.loads(jobs_dir.joinpath("new.json").read_text(encoding="utf-8"))
+    assert QueuedJob(**raw).seq == 100
+
+
+def test_recover_runs_leftover_entries_after_restart(tmp_path: Path) -> None:
+    jobs_dir = tmp_path / "jobs"
+    JobQueue(jobs_dir, _noop).submit("left", priority=1)
+
+    done = threading.Event()
+    ran: List[str] = []
+
+    def runner(job_id: str) -> None:
+        ran.append(job_id)
+        done.set()
+
+    q = JobQueue(jobs_dir, runner)
+    assert q.recover() == ["left"]
+    q.start()
+    assert done.wait(5)
+    assert ran == ["left"]
+    assert _wait_until(lambda: not jobs_dir.joinpath("left.json").exists())
@@ -0,0 +1,127 @@
+# tests/test_job_state_store.py
+from __future__ import annotations
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from backend.app.job_queue import JobStateStore
+
+
+class _RecordingStore(JobStateStore):
+    """记录每次落盘的 (job_id, step)，便于断言写了几次、最后写的是哪个快照。"""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.flushed: List[tuple] = []
+
+    def _flush(self, job_id: str, state: Dict[str, Any]) -> None:
+        super()._flush(job_id, state)
+        self.flushed.append((job_id, state.get("step")))
+
+
+def _path_for(root: Path) -> Callable[[str], Path]:
+    return lambda job_id: root / job_id / "state.json"
+
+
+def _on_disk(root: Path, job_id: str) -> Dict[str, Any]:
+    return json.loads((root / job_id / "state.json").read_text(encoding="utf-8"))
+
+
+def _wait_until(cond: Callable[[], bool], timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_throttled_writes_flush_every_n_updates(tmp_path: Path) -> None:
+    store = _RecordingStore(_path_for(tmp_path), flush_interval_ms=60_000, flush_every=3)
+    store.write("j", {"status": "running", "step": 0})
+    for step in range(1, 6):
+        store.write("j", {"status": "running", "step": step}, flush=False)
+
+    # 第 0 步立即落盘；之后每累计 3 次更新写一次
+    assert store.flushed == [("j", 0), ("j", 3)]
+    assert _on_disk(tmp_path, "j")["step"] == 3
+    assert store.read("j")["step"] == 5
+
+
+def test_throttled_writes_flush_after_interval(tmp_path: Path) -> None:
+    store = _RecordingStore(_path_for(tmp_path), flush_interval_ms=400, flush_every=1000)
+    store.write("j", {"status": "running", "step": 0})
+    store.write("j", {"status": "running", "step": 1}, flush=False)
+    assert store.flushed == [("j", 0)]
+
+    time.sleep(0.45)
+    store.write("j", {"status": "running", "step": 2}, flush=False)
+    assert store.flushed == [("j", 0), ("j", 2)]
+    assert _on_disk(tmp_path, "j")["step"] == 2
+
+
+class _NewerFirstLock:
+    """替换某个 job 的写盘锁：名为 old 的线程要等 new 线程写完才能进入，固定出“旧快照后写盘”的竞态。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.newer_done = threading.Event()
+
+    def __enter__(self) -> None:
+        if threading.current_thread().name == "old":
+            assert self.newer_done.wait(5)
+        self._lock.acquire()
+
+    def __exit__(self, *exc: Any) -> None:
+        self._lock.release()
+        if threading.current_thread().name == "new":
+            self.newer_done.set()
+
+
+def test_older_snapshot_never_overwrites_newer_file(tmp_path: Path) -> None:
+    store = _RecordingStore(_path_for(tmp_path))
+    store._io_locks["j"] = _NewerFirstLock()  # type: ignore[assignment]
+    old = threading.Thread(target=store.write, args=("j", {"status": "running", "step": 1}), name="old")
+    new = threading.Thread(target=store.write, args=("j", {"status": "running", "step": 2}), name="new")
+    old.start()
+    assert _wait_until(lambda: store._flush_seq.get("j") == 1)  # old 已拿到序号 1，卡在写盘锁外
+    new.start()
+    old.join(5)
+    new.join(5)
+
+    # new（序号 2）先写盘；old 拿到锁时发现已有更新的版本落盘，直接跳过
+    assert store.flushed == [("j", 2)]
+    assert _on_disk(tmp_path, "j")["step"] == 2
+    assert store.read("j")["step"] == 2
+
+
+def test_read_returns_a_copy(tmp_path: Path) -> None:
+    store = JobStateStore(_path_for(tmp_path))
+    state = {"status": "running", "step": 1}
+    store.write("j", state)
+    state["step"] = 99  # 调用方之后改自己的 dict 不影响已登记的快照
+
+    got = store.read("j")
+    got["status"] = "mutated"
+    assert store.read("j") == {"status": "running", "step": 1}
+    assert store.read("missing") is None
+
+
+def test_finished_jobs_are_served_from_disk(tmp_path: Path) -> None:
+    store = JobStateStore(_path_for(tmp_path), flush_interval_ms=60_000, flush_every=1000)
+    for job_id, status in (("ok", "done"), ("bad", "failed")):
+        store.write(job_id, {"status": "running", "step": 1})
+        store.write(job_id, {"status": "running", "step": 2}, flush=False)
+        store.write(job_id, {"status": status, "step": 3})
+
+        assert job_id not in store._states
+        assert _on_disk(tmp_path, job_id) == {"status": status, "step": 3}
+        assert store.read(job_id) == {"status": status, "step": 3}
+
+    # 结束后同一 job 再写（如重新入队）照常登记并落盘
+    store.write("ok", {"status": "queued", "step": 0})
+    assert store.read("ok") == {"status": "queued", "step": 0}
+    assert _on_disk(tmp_path, "ok") == {"status": "queued", "step": 0}
@@ -0,0 +1,99 @@
+# tests/test_result_cache.py
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from backend.engine.core.result_cache import QueryResultCache
+
+
+def _result(pn: str, fob: float = 10.0) -> Dict[str, Any]:
+    return {"pn": pn, "final_values": {"Part No.": pn, "FOB C(EUR)": fob}, "warnings": ["w"]}
+
+
+def test_newer_generation_clears_entries() -> None:
+    cache = QueryResultCache()
+    cache.put((1, 0), "a", _result("a"))
+    assert cache.get((1, 0), "a") == _result("a")
+
+    # 数据或规则任一侧变新都整表清空
+    assert cache.get((1, 1), "a") is None
+    assert cache.stats()["entries"] == 0
+    cache.put((1, 1), "a", _result("a"))
+    assert cache.get((2, 1), "a") is None
+    stats = cache.stats()
+    assert (stats["entries"], stats["data_generation"], stats["rules_generation"]) == (0, 2, 1)
+
+
+def test_older_generation_neither_reads_nor_writes() -> None:
+    cache = QueryResultCache()
+    cache.put((2, 3), "a", _result("a"))
+
+    assert cache.get((1, 3), "a") is None
+    assert cache.get((2, 2), "a") is None
+    cache.put((1, 3), "b", _result("b"))
+    cache.put((2, 2), "a", _result("a", fob=99.0))
+
+    stats = cache.stats()
+    assert (stats["entries"], stats["data_generation"], stats["rules_generation"]) == (1, 2, 3)
+    assert cache.get((2, 3), "a") == _result("a")
+    assert cache.get((2, 3), "b") is None
+
+
+def test_evicts_least_recently_used_by_entries() -> None:
+    cache = QueryResultCache(max_entries=2)
+    gen = (1, 0)
+    cache.put(gen, "a", _result("a"))
+    cache.put(gen, "b", _result("b"))
+    assert cache.get(gen, "a") is not None  # a 变为最近使用
+    cache.put(gen, "c", _result("c"))
+
+    assert cache.get(gen, "b") is None
+    assert cache.get(gen, "a") is not None
+    assert cache.get(gen, "c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicts_by_bytes_and_skips_oversized_values() -> None:
+    probe = QueryResultCache()
+    probe.put((1, 0), "a", _result("a"))
+    one = probe.stats()["bytes"]
+    assert one > 0
+
+    cache = QueryResultCache(max_entries=100, max_bytes=one * 2 + one // 2)
+    gen = (1, 0)
+    for pn in ("a", "b", "c"):
+        cache.put(gen, pn, _result(pn))
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"]) == (2, 1)
+    assert stats["bytes"] <= cache.max_bytes
+    assert cache.get(gen, "a") is None
+
+    cache.put(gen, "big", {"pn": "big", "blob": "x" * (one * 4)})
+    assert cache.get(gen, "big") is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_disabled_cache_stores_nothing() -> None:
+    cache = QueryResultCache(max_entries=0)
+    cache.put((1, 0), "a", _result("a"))
+    assert cache.get((1, 0), "a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_mutating_stored_or_returned_values_does_not_touch_cache() -> None:
+    cache = QueryResultCache()
+    gen = (1, 0)
+    value = _result("a")
+    cache.put(gen, "a", value)
+    value["final_values"]["FOB C(EUR)"] = -1.0
+    value["warnings"].append("caller")
+
+    hit = cache.get(gen, "a")
+    assert hit == _result("a")
+    hit["pn"] = "A-0001"
+    hit["final_values"]["Part No."] = "A-0001"
+    hit["warnings"].clear()
+
+    again = cache.get(gen, "a")
+    assert again == _result("a")
+    assert again is not hit and again["final_values"] is not hit["final_values"]